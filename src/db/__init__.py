@@ -0,0 +1,16 @@
+from db.pool import (
+    DEFAULT_DATABASE_PATH,
+    ConnectionPool,
+    PoolTimeoutError,
+    PooledConnection,
+    close_db,
+    configure,
+    ensure_schema,
+    execute_write,
+    get_db_connection,
+    get_pool,
+    get_write_queue,
+    init_app,
+)
+from db.profiles import DEFAULT_STORAGE_PROFILE, STORAGE_PROFILES, get_storage_profile
+from db.writer import WriteQueue
@@ -0,0 +1,60 @@
+import re
+import sqlite3
+
+# 中日韓文字：逐字切分後交給 FTS5 unicode61 分詞器，查詢時以片語比對連續的字（migration 0003 使用）
+_CJK_PATTERN = re.compile(
+    '([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\U00020000-\U0002ebef])'
+)
+
+
+def fts_tokens(text):
+    """將文字轉為索引用的分詞字串：每個 CJK 字元前後加上空白，其餘保持原樣"""
+    if not text:
+        return ''
+    return ' '.join(_CJK_PATTERN.sub(r' \1 ', str(text)).split())
+
+
+# trigram 分詞器只能以 3 個字元以上的片語查詢索引
+TRIGRAM_MIN_LENGTH = 3
+
+
+def build_search_query(query):
+    """將使用者輸入轉為 transactions_fts（trigram，見 migration 0015）的查詢條件
+
+    以空白分隔的每個詞都必須出現（AND），以子字串比對，因此 "coff" 可以找到 coffee，
+    "巴克" 可以找到星巴克。3 個字元以上的詞組成 MATCH 語法走 trigram 索引；
+    較短的詞（例如兩個字的中文詞）trigram 無法查詢，改以 LIKE 樣式比對範圍內交易的描述。
+    回傳 (match, like_patterns)，沒有可搜尋的字元時回傳 None。
+    """
+    phrases = []
+    like_patterns = []
+    for term in query.split():
+        if not re.search(r'\w', term):
+            continue
+        if len(term) >= TRIGRAM_MIN_LENGTH:
+            phrases.append('"{}"'.format(term.replace('"', '""')))
+        else:
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            like_patterns.append(f'%{escaped}%')
+    if not phrases and not like_patterns:
+        return None
+    return ' AND '.join(phrases), like_patterns
+
+
+def register_functions(conn):
+    """在連接上註冊 migration 0003 需要的 SQL 函式
+
+    0015 之後的觸發器只使用純 SQL；fts_tokens 只在舊資料庫依序套用 0003 時用到。
+    """
+    conn.create_function('fts_tokens', 1, fts_tokens, deterministic=True)
+
+
+def connect(database, **kwargs):
+    """直接以 sqlite3 開啟資料庫並註冊 fts_tokens，供連接池以外的腳本套用遷移
+
+    升級仍停在 0003 ~ 0014 的舊資料庫時，0003 的回填與觸發器會呼叫 fts_tokens；
+    已套用 0015 的資料庫不需要，一般的 sqlite3 連接即可寫入交易。
+    """
+    conn = sqlite3.connect(database, **kwargs)
+    register_functions(conn)
+    return conn
@@ -0,0 +1,38 @@
+"""熱門查詢的複合索引：交易列表/統計、群組權限檢查、發票號碼查詢"""
+
+STATEMENTS = [
+    # 交易列表 WHERE user_id = ? ORDER BY date DESC, id DESC，統計 WHERE user_id = ? AND date >= ?
+    '''CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+       ON transactions (user_id, date, id)''',
+
+    # 群組權限檢查 WHERE group_id = ? AND user_id = ? AND status = 'active'（含 role 可直接覆蓋查詢）
+    '''CREATE INDEX IF NOT EXISTS idx_group_members_group_user_status
+       ON group_members (group_id, user_id, status, role)''',
+
+    # 用戶的群組列表 WHERE gm.user_id = ? AND gm.status = 'active'
+    '''CREATE INDEX IF NOT EXISTS idx_group_members_user_status
+       ON group_members (user_id, status, group_id, role)''',
+
+    # 用戶的待處理邀請 WHERE invitee_id = ? AND status = 'pending'
+    '''CREATE INDEX IF NOT EXISTS idx_group_invitations_invitee_status
+       ON group_invitations (invitee_id, status)''',
+
+    # InvoiceRecord.exists_by_number WHERE user_id = ? AND invoice_number = ?
+    '''CREATE INDEX IF NOT EXISTS idx_invoice_records_user_number
+       ON invoice_records (user_id, invoice_number)''',
+
+    # 發票列表 WHERE user_id = ? ORDER BY invoice_date DESC, invoice_time DESC
+    '''CREATE INDEX IF NOT EXISTS idx_invoice_records_user_date
+       ON invoice_records (user_id, invoice_date, invoice_time)''',
+
+    '''CREATE INDEX IF NOT EXISTS idx_invoice_items_record
+       ON invoice_items (invoice_record_id)''',
+
+    '''CREATE INDEX IF NOT EXISTS idx_sync_logs_user_created
+       ON sync_logs (user_id, created_at)''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,100 @@
+"""每月統計彙總表：依 (擁有者, 月份, 分類, 類型) 累計收支，由觸發器在交易寫入時增量維護"""
+
+# 每筆交易同時計入用戶 ('user', user_id) 與所屬群組 ('group', group_id)
+_APPLY = '''
+    INSERT INTO monthly_rollups (owner_type, owner_id, month, category, type, income, expense, txn_count)
+    VALUES ('user', {row}.user_id, substr({row}.date, 1, 7), {row}.category, {row}.type,
+            CASE WHEN {row}.amount > 0 THEN {row}.amount ELSE 0 END,
+            CASE WHEN {row}.amount < 0 THEN -{row}.amount ELSE 0 END, 1)
+    ON CONFLICT (owner_type, owner_id, month, category, type) DO UPDATE SET
+        income = income + excluded.income,
+        expense = expense + excluded.expense,
+        txn_count = txn_count + 1;
+
+    INSERT INTO monthly_rollups (owner_type, owner_id, month, category, type, income, expense, txn_count)
+    SELECT 'group', {row}.group_id, substr({row}.date, 1, 7), {row}.category, {row}.type,
+           CASE WHEN {row}.amount > 0 THEN {row}.amount ELSE 0 END,
+           CASE WHEN {row}.amount < 0 THEN -{row}.amount ELSE 0 END, 1
+    WHERE {row}.group_id IS NOT NULL
+    ON CONFLICT (owner_type, owner_id, month, category, type) DO UPDATE SET
+        income = income + excluded.income,
+        expense = expense + excluded.expense,
+        txn_count = txn_count + 1;
+'''
+
+_REVERT = '''
+    UPDATE monthly_rollups SET
+        income = income - CASE WHEN {row}.amount > 0 THEN {row}.amount ELSE 0 END,
+        expense = expense - CASE WHEN {row}.amount < 0 THEN -{row}.amount ELSE 0 END,
+        txn_count = txn_count - 1
+    WHERE month = substr({row}.date, 1, 7) AND category = {row}.category AND type = {row}.type
+      AND ((owner_type = 'user' AND owner_id = {row}.user_id)
+           OR (owner_type = 'group' AND owner_id = {row}.group_id));
+
+    DELETE FROM monthly_rollups
+    WHERE txn_count <= 0 AND month = substr({row}.date, 1, 7) AND category = {row}.category AND type = {row}.type
+      AND ((owner_type = 'user' AND owner_id = {row}.user_id)
+           OR (owner_type = 'group' AND owner_id = {row}.group_id));
+'''
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS monthly_rollups (
+           owner_type TEXT NOT NULL,
+           owner_id INTEGER NOT NULL,
+           month TEXT NOT NULL,
+           category TEXT NOT NULL,
+           type TEXT NOT NULL,
+           income REAL NOT NULL DEFAULT 0,
+           expense REAL NOT NULL DEFAULT 0,
+           txn_count INTEGER NOT NULL DEFAULT 0,
+           PRIMARY KEY (owner_type, owner_id, month, category, type)
+       ) WITHOUT ROWID''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_insert
+        AFTER INSERT ON transactions
+        BEGIN {_APPLY.format(row='NEW')} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_delete
+        AFTER DELETE ON transactions
+        BEGIN {_REVERT.format(row='OLD')} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_update
+        AFTER UPDATE OF user_id, group_id, amount, category, date, type ON transactions
+        BEGIN {_REVERT.format(row='OLD')} {_APPLY.format(row='NEW')} END''',
+]
+
+
+# 由交易表計算彙總（與觸發器的計算方式一致）
+AGGREGATE_SQL = '''
+    SELECT 'user' as owner_type, user_id as owner_id, substr(date, 1, 7) as month, category, type,
+           SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) as income,
+           SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) as expense,
+           COUNT(*) as txn_count
+    FROM transactions
+    GROUP BY user_id, month, category, type
+    UNION ALL
+    SELECT 'group', group_id, substr(date, 1, 7) as month, category, type,
+           SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END),
+           SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END),
+           COUNT(*)
+    FROM transactions
+    WHERE group_id IS NOT NULL
+    GROUP BY group_id, month, category, type
+'''
+
+
+def upgrade(conn):
+    # 早期建立的資料庫（例如專案附帶的 database.db）transactions 沒有 group_id 欄位
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(transactions)')}
+    if 'group_id' not in columns:
+        conn.execute('ALTER TABLE transactions ADD COLUMN group_id INTEGER REFERENCES groups (id)')
+
+    for statement in STATEMENTS:
+        conn.execute(statement)
+
+    # 回填既有交易
+    conn.execute('DELETE FROM monthly_rollups')
+    conn.execute(f'''
+        INSERT INTO monthly_rollups (owner_type, owner_id, month, category, type, income, expense, txn_count)
+        {AGGREGATE_SQL}
+    ''')
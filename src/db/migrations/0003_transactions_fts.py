@@ -0,0 +1,44 @@
+"""交易描述全文檢索 (FTS5)
+
+tokens 欄位存放 fts_tokens(description) 的結果（中文逐字切分），
+scope 欄位存放 'u<user_id> g<group_id>'，讓用戶/群組範圍的過濾在索引內完成。
+fts_tokens 由 db.fts.register_functions 註冊在每個連接池連接上。
+"""
+
+_INSERT = '''
+    INSERT INTO transactions_fts (rowid, tokens, scope)
+    VALUES (NEW.id, fts_tokens(NEW.description),
+            'u' || NEW.user_id || COALESCE(' g' || NEW.group_id, ''));
+'''
+
+_DELETE = '''
+    DELETE FROM transactions_fts WHERE rowid = OLD.id;
+'''
+
+STATEMENTS = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+           tokens, scope, tokenize = 'unicode61', detail = 'full'
+       )''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_insert
+        AFTER INSERT ON transactions
+        BEGIN {_INSERT} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_delete
+        AFTER DELETE ON transactions
+        BEGIN {_DELETE} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_update
+        AFTER UPDATE OF description, user_id, group_id ON transactions
+        BEGIN {_DELETE} {_INSERT} END''',
+
+    # 回填既有交易
+    '''INSERT INTO transactions_fts (rowid, tokens, scope)
+       SELECT id, fts_tokens(description), 'u' || user_id || COALESCE(' g' || group_id, '')
+       FROM transactions''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
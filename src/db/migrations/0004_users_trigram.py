@@ -0,0 +1,42 @@
+"""用戶姓名/帳號的 FTS5 trigram 索引，加速 '%關鍵字%' 子字串搜尋（關鍵字需至少 3 個字元）"""
+
+_INSERT = '''
+    INSERT INTO users_fts (rowid, full_name, username)
+    VALUES (NEW.id, NEW.full_name, NEW.username);
+'''
+
+_DELETE = '''
+    INSERT INTO users_fts (users_fts, rowid, full_name, username)
+    VALUES ('delete', OLD.id, OLD.full_name, OLD.username);
+'''
+
+STATEMENTS = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+           full_name, username,
+           content = 'users', content_rowid = 'id', tokenize = 'trigram'
+       )''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_users_fts_insert
+        AFTER INSERT ON users
+        BEGIN {_INSERT} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_users_fts_delete
+        AFTER DELETE ON users
+        BEGIN {_DELETE} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_users_fts_update
+        AFTER UPDATE OF full_name, username ON users
+        BEGIN {_DELETE} {_INSERT} END''',
+
+    # 完全相符的姓名查詢
+    '''CREATE INDEX IF NOT EXISTS idx_users_full_name
+       ON users (full_name)''',
+
+    # 回填既有用戶
+    '''INSERT INTO users_fts (users_fts) VALUES ('rebuild')''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
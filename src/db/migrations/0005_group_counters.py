@@ -0,0 +1,99 @@
+"""群組反正規化計數：member_count / transaction_count / last_activity_at，由觸發器增量維護
+
+群組列表 (Group.get_user_groups) 因此不再需要逐列的 COUNT 子查詢。
+時間沿用模型以 datetime.now() 寫入的本地時間格式。
+"""
+
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+COLUMNS = {
+    'member_count': 'INTEGER NOT NULL DEFAULT 0',
+    'transaction_count': 'INTEGER NOT NULL DEFAULT 0',
+    'last_activity_at': 'TIMESTAMP',
+}
+
+# 重新計算全部群組的計數，供回填與校正使用
+RECOUNT = f'''
+    UPDATE groups SET
+        member_count = (
+            SELECT COUNT(*) FROM group_members gm
+            WHERE gm.group_id = groups.id AND gm.status = 'active'
+        ),
+        transaction_count = (
+            SELECT COUNT(*) FROM transactions t WHERE t.group_id = groups.id
+        ),
+        last_activity_at = COALESCE(
+            (SELECT MAX(t.created_at) FROM transactions t WHERE t.group_id = groups.id),
+            (SELECT MAX(gm.joined_at) FROM group_members gm WHERE gm.group_id = groups.id),
+            groups.created_at
+        )
+'''
+
+TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_group_members_count_insert
+        AFTER INSERT ON group_members
+        WHEN NEW.status = 'active'
+        BEGIN
+            UPDATE groups SET member_count = member_count + 1, last_activity_at = {_NOW}
+            WHERE id = NEW.group_id;
+        END''',
+
+    '''CREATE TRIGGER IF NOT EXISTS trg_group_members_count_delete
+        AFTER DELETE ON group_members
+        WHEN OLD.status = 'active'
+        BEGIN
+            UPDATE groups SET member_count = member_count - 1
+            WHERE id = OLD.group_id;
+        END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_group_members_count_update
+        AFTER UPDATE OF status, group_id ON group_members
+        WHEN OLD.status IS NOT NEW.status OR OLD.group_id IS NOT NEW.group_id
+        BEGIN
+            UPDATE groups SET member_count = member_count - 1
+            WHERE id = OLD.group_id AND OLD.status = 'active';
+            UPDATE groups SET member_count = member_count + 1, last_activity_at = {_NOW}
+            WHERE id = NEW.group_id AND NEW.status = 'active';
+        END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_group_count_insert
+        AFTER INSERT ON transactions
+        WHEN NEW.group_id IS NOT NULL
+        BEGIN
+            UPDATE groups SET transaction_count = transaction_count + 1, last_activity_at = {_NOW}
+            WHERE id = NEW.group_id;
+        END''',
+
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_group_count_delete
+        AFTER DELETE ON transactions
+        WHEN OLD.group_id IS NOT NULL
+        BEGIN
+            UPDATE groups SET transaction_count = transaction_count - 1
+            WHERE id = OLD.group_id;
+        END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_group_count_update
+        AFTER UPDATE ON transactions
+        WHEN OLD.group_id IS NOT NULL OR NEW.group_id IS NOT NULL
+        BEGIN
+            UPDATE groups SET transaction_count = transaction_count - 1
+            WHERE id = OLD.group_id AND OLD.group_id IS NOT NEW.group_id;
+            UPDATE groups SET transaction_count = transaction_count + 1
+            WHERE id = NEW.group_id AND OLD.group_id IS NOT NEW.group_id;
+            UPDATE groups SET last_activity_at = {_NOW}
+            WHERE id = NEW.group_id;
+        END''',
+]
+
+
+def upgrade(conn):
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(groups)')}
+    for column, definition in COLUMNS.items():
+        if column not in existing:
+            conn.execute(f'ALTER TABLE groups ADD COLUMN {column} {definition}')
+
+    for statement in TRIGGERS:
+        conn.execute(statement)
+
+    # 回填既有群組
+    conn.execute(RECOUNT)
@@ -0,0 +1,12 @@
+"""群組交易動態索引：依 transactions.group_id 查詢並以 (date, id) 做 keyset 分頁"""
+
+STATEMENTS = [
+    # WHERE group_id = ? ORDER BY date DESC, id DESC 以及 (date, id) < (?, ?) 的游標定位
+    '''CREATE INDEX IF NOT EXISTS idx_transactions_group_date
+       ON transactions (group_id, date, id)''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,139 @@
+"""群組分帳：分攤明細 (group_ledger) 與每位成員的累計餘額 (group_balances)
+
+group_ledger 每一列代表「payer 替 user 墊付 amount」：
+- kind = 'split'：群組支出的分攤，transaction_id 指向原交易
+- kind = 'payment'：成員之間的還款，payer 為付款人，user 為收款人
+group_balances 由觸發器增量維護，paid - owed 即為成員淨額（正數為應收）。
+原交易刪除、改金額、改付款人或移出群組時，觸發器同步調整對應的分攤。
+"""
+
+from datetime import datetime
+
+_APPLY = '''
+    INSERT INTO group_balances (group_id, user_id, paid, owed)
+    VALUES ({row}.group_id, {row}.payer_id, {row}.amount, 0)
+    ON CONFLICT (group_id, user_id) DO UPDATE SET paid = paid + excluded.paid;
+
+    INSERT INTO group_balances (group_id, user_id, paid, owed)
+    VALUES ({row}.group_id, {row}.user_id, 0, {row}.amount)
+    ON CONFLICT (group_id, user_id) DO UPDATE SET owed = owed + excluded.owed;
+'''
+
+_REVERT = '''
+    UPDATE group_balances SET paid = paid - {row}.amount
+    WHERE group_id = {row}.group_id AND user_id = {row}.payer_id;
+
+    UPDATE group_balances SET owed = owed - {row}.amount
+    WHERE group_id = {row}.group_id AND user_id = {row}.user_id;
+'''
+
+
+def _equal_shares(amount, member_ids):
+    """平均分攤 amount（元），以分計算，除不盡的零頭依序分給前面的成員，回傳 [(user_id, 元)]
+
+    遷移只依賴當時的資料格式（此時金額仍以元儲存，0010 才改為整數分），不引用模型程式碼。
+    """
+    total_cents = abs(int(round(float(amount) * 100)))
+    base, remainder = divmod(total_cents, len(member_ids))
+    shares = [(user_id, base + (1 if index < remainder else 0)) for index, user_id in enumerate(member_ids)]
+    return [(user_id, cents / 100) for user_id, cents in shares if cents > 0]
+
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS group_ledger (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           group_id INTEGER NOT NULL,
+           transaction_id INTEGER,
+           payer_id INTEGER NOT NULL,
+           user_id INTEGER NOT NULL,
+           amount REAL NOT NULL,
+           kind VARCHAR(20) NOT NULL DEFAULT 'split',
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           FOREIGN KEY (group_id) REFERENCES groups (id),
+           FOREIGN KEY (transaction_id) REFERENCES transactions (id)
+       )''',
+
+    '''CREATE INDEX IF NOT EXISTS idx_group_ledger_transaction
+       ON group_ledger (transaction_id)''',
+
+    '''CREATE INDEX IF NOT EXISTS idx_group_ledger_group_created
+       ON group_ledger (group_id, created_at)''',
+
+    '''CREATE TABLE IF NOT EXISTS group_balances (
+           group_id INTEGER NOT NULL,
+           user_id INTEGER NOT NULL,
+           paid REAL NOT NULL DEFAULT 0,
+           owed REAL NOT NULL DEFAULT 0,
+           PRIMARY KEY (group_id, user_id)
+       ) WITHOUT ROWID''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_group_ledger_insert
+        AFTER INSERT ON group_ledger
+        BEGIN {_APPLY.format(row='NEW')} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_group_ledger_delete
+        AFTER DELETE ON group_ledger
+        BEGIN {_REVERT.format(row='OLD')} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_group_ledger_update
+        AFTER UPDATE OF group_id, payer_id, user_id, amount ON group_ledger
+        BEGIN {_REVERT.format(row='OLD')} {_APPLY.format(row='NEW')} END''',
+
+    # 交易刪除時移除其分攤
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_ledger_delete
+        AFTER DELETE ON transactions
+        BEGIN
+            DELETE FROM group_ledger WHERE transaction_id = OLD.id;
+        END''',
+
+    # 移出原群組或改為收入時，分攤不再成立
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_ledger_detach
+        AFTER UPDATE OF group_id, amount ON transactions
+        WHEN OLD.group_id IS NOT NEW.group_id OR NEW.amount >= 0
+        BEGIN
+            DELETE FROM group_ledger WHERE transaction_id = NEW.id;
+        END''',
+
+    # 支出金額變動時依比例調整各分攤
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_ledger_rescale
+        AFTER UPDATE OF amount ON transactions
+        WHEN OLD.group_id IS NEW.group_id AND OLD.amount < 0 AND NEW.amount < 0
+             AND OLD.amount != NEW.amount
+        BEGIN
+            UPDATE group_ledger SET amount = ROUND(amount * NEW.amount / OLD.amount, 2)
+            WHERE transaction_id = NEW.id;
+        END''',
+
+    '''CREATE TRIGGER IF NOT EXISTS trg_transactions_ledger_payer
+        AFTER UPDATE OF user_id ON transactions
+        WHEN OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            UPDATE group_ledger SET payer_id = NEW.user_id
+            WHERE transaction_id = NEW.id;
+        END''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
+
+    # 回填：既有的群組支出由目前的 active 成員平均分攤
+    members = {}
+    rows = conn.execute('''
+        SELECT id, group_id, user_id, amount FROM transactions
+        WHERE group_id IS NOT NULL AND amount < 0
+    ''').fetchall()
+    for transaction_id, group_id, payer_id, amount in rows:
+        if group_id not in members:
+            members[group_id] = [row[0] for row in conn.execute('''
+                SELECT user_id FROM group_members
+                WHERE group_id = ? AND status = 'active'
+                ORDER BY joined_at, user_id
+            ''', (group_id,))]
+        if members[group_id]:
+            conn.executemany('''
+                INSERT INTO group_ledger (group_id, transaction_id, payer_id, user_id, amount, kind, created_at)
+                VALUES (?, ?, ?, ?, ?, 'split', ?)
+            ''', [(group_id, transaction_id, payer_id, user_id, share, datetime.now())
+                  for user_id, share in _equal_shares(amount, members[group_id])])
@@ -0,0 +1,51 @@
+"""週期性交易規則 (recurring_rules) 與已產生交易的去重索引
+
+規則以 start_date 為錨點，第 n 次發生日 = start_date + n * interval 個 frequency 單位
+（月/年遇到月底時取當月最後一天）。next_index / next_run_date 指向下一次尚未產生的發生日，
+排程器只需以 (is_active, next_run_date) 索引找出到期規則。
+transactions.recurring_rule_id + date 的唯一索引保證同一發生日只會產生一筆交易，
+排程器重啟或重跑時不會重複寫入。
+"""
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS recurring_rules (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           user_id INTEGER NOT NULL,
+           group_id INTEGER,
+           description TEXT NOT NULL,
+           amount REAL NOT NULL,
+           category TEXT NOT NULL,
+           frequency VARCHAR(10) NOT NULL,
+           interval INTEGER NOT NULL DEFAULT 1,
+           start_date TEXT NOT NULL,
+           end_date TEXT,
+           next_index INTEGER NOT NULL DEFAULT 0,
+           next_run_date TEXT,
+           is_active BOOLEAN DEFAULT 1,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           FOREIGN KEY (user_id) REFERENCES users (id),
+           FOREIGN KEY (group_id) REFERENCES groups (id)
+       )''',
+
+    # 排程器：WHERE is_active = 1 AND next_run_date <= ? ORDER BY next_run_date
+    '''CREATE INDEX IF NOT EXISTS idx_recurring_rules_due
+       ON recurring_rules (is_active, next_run_date)''',
+
+    '''CREATE INDEX IF NOT EXISTS idx_recurring_rules_user
+       ON recurring_rules (user_id, is_active)''',
+
+    # 同一規則同一天只產生一筆交易
+    '''CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_recurring_occurrence
+       ON transactions (recurring_rule_id, date)
+       WHERE recurring_rule_id IS NOT NULL''',
+]
+
+
+def upgrade(conn):
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(transactions)')}
+    if 'recurring_rule_id' not in existing:
+        conn.execute('ALTER TABLE transactions ADD COLUMN recurring_rule_id INTEGER')
+
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,112 @@
+"""預算 (budgets) 與各預算期間已花費金額 (budget_spend)
+
+預算屬於用戶或群組，可限定分類（NULL 代表全部分類），週期為 weekly / monthly / yearly，
+或以 start_date ~ end_date 為單一期間的 custom。
+budget_spend 以 (budget_id, period_start) 累計支出，由交易表的觸發器增量維護，
+查詢預算狀態只需讀取目前期間的一列；新建預算時由 Budget._backfill 回填既有交易。
+"""
+
+# 交易日期所屬預算期間的起始日，weekly 以週一為一週的開始（與 Budget.period_bounds 一致）
+PERIOD_START_SQL = '''CASE {budget}.period
+    WHEN 'monthly' THEN substr({day}, 1, 7) || '-01'
+    WHEN 'weekly' THEN date({day}, 'weekday 0', '-6 days')
+    WHEN 'yearly' THEN substr({day}, 1, 4) || '-01-01'
+    ELSE {budget}.start_date
+END'''
+
+# 交易符合預算的條件：擁有者、分類（NULL 代表全部分類）與有效日期
+MATCH_SQL = '''(({budget}.owner_type = 'user' AND {budget}.owner_id = {row}.user_id)
+      OR ({budget}.owner_type = 'group' AND {budget}.owner_id = {row}.group_id))
+    AND ({budget}.category IS NULL OR {budget}.category = {row}.category)
+    AND {row}.date >= {budget}.start_date
+    AND ({budget}.end_date IS NULL OR {row}.date <= {budget}.end_date)'''
+
+# 符合交易的預算：用戶預算與群組預算分開查詢，兩邊都能走 (owner_type, owner_id) 索引
+_MATCHING = '''
+    SELECT b.id AS budget_id, {period} AS period_start FROM budgets b
+    WHERE b.owner_type = 'user' AND b.owner_id = {row}.user_id AND {match}
+    UNION ALL
+    SELECT b.id, {period} FROM budgets b
+    WHERE b.owner_type = 'group' AND b.owner_id = {row}.group_id AND {match}
+'''
+
+
+def _matching(row):
+    return _MATCHING.format(row=row,
+                            period=PERIOD_START_SQL.format(budget='b', day=f'{row}.date'),
+                            match=MATCH_SQL.format(budget='b', row=row))
+
+
+# 只有支出 (amount < 0) 計入預算
+_APPLY = '''
+    INSERT INTO budget_spend (budget_id, period_start, spent, txn_count)
+    SELECT budget_id, period_start, -{row}.amount, 1
+    FROM ({matching})
+    WHERE {row}.amount < 0
+    ON CONFLICT (budget_id, period_start) DO UPDATE SET
+        spent = spent + excluded.spent,
+        txn_count = txn_count + 1;
+'''
+
+_REVERT = '''
+    UPDATE budget_spend SET
+        spent = spent + {row}.amount,
+        txn_count = txn_count - 1
+    WHERE {row}.amount < 0 AND (budget_id, period_start) IN ({matching});
+
+    DELETE FROM budget_spend
+    WHERE {row}.amount < 0 AND txn_count <= 0 AND (budget_id, period_start) IN ({matching});
+'''
+
+
+def _apply(row):
+    return _APPLY.format(row=row, matching=_matching(row))
+
+
+def _revert(row):
+    return _REVERT.format(row=row, matching=_matching(row))
+
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS budgets (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           owner_type TEXT NOT NULL,
+           owner_id INTEGER NOT NULL,
+           category TEXT,
+           amount REAL NOT NULL,
+           period VARCHAR(10) NOT NULL,
+           start_date TEXT NOT NULL,
+           end_date TEXT,
+           created_by INTEGER,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           FOREIGN KEY (created_by) REFERENCES users (id)
+       )''',
+
+    'CREATE INDEX IF NOT EXISTS idx_budgets_owner ON budgets (owner_type, owner_id)',
+
+    '''CREATE TABLE IF NOT EXISTS budget_spend (
+           budget_id INTEGER NOT NULL,
+           period_start TEXT NOT NULL,
+           spent REAL NOT NULL DEFAULT 0,
+           txn_count INTEGER NOT NULL DEFAULT 0,
+           PRIMARY KEY (budget_id, period_start)
+       ) WITHOUT ROWID''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_budget_insert
+        AFTER INSERT ON transactions
+        BEGIN {_apply('NEW')} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_budget_delete
+        AFTER DELETE ON transactions
+        BEGIN {_revert('OLD')} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_budget_update
+        AFTER UPDATE OF user_id, group_id, amount, category, date ON transactions
+        BEGIN {_revert('OLD')} {_apply('NEW')} END''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,116 @@
+"""金額欄位改為整數分 (INTEGER，最小貨幣單位)
+
+原本 transactions.amount 為 REAL、發票金額為 DECIMAL（NUMERIC 親和性），SUM 在浮點數上
+累加會有誤差，彙總表與即時計算的結果無法逐位元一致。SQLite 無法直接修改欄位型別，
+因此每個表依官方建議的步驟重建：建新表 → 複製並換算為分 → 刪舊表 → 改名，
+再重新建立原本掛在該表上的索引與觸發器。
+程式端的換算見 models/money.py。
+"""
+
+import re
+
+# 需要改成整數分的欄位
+COLUMNS = {
+    'transactions': ('amount',),
+    'monthly_rollups': ('income', 'expense'),
+    'group_ledger': ('amount',),
+    'group_balances': ('paid', 'owed'),
+    'recurring_rules': ('amount',),
+    'budgets': ('amount',),
+    'budget_spend': ('spent',),
+    'invoice_records': ('total_amount', 'tax_amount'),
+    'invoice_items': ('item_price', 'item_amount'),
+}
+
+# 金額變動時依比例調整分攤；四捨五入到整數分後，零頭補到第一筆分攤，總和維持等於交易金額
+RESCALE_TRIGGER = '''CREATE TRIGGER trg_transactions_ledger_rescale
+    AFTER UPDATE OF amount ON transactions
+    WHEN OLD.group_id IS NEW.group_id AND OLD.amount < 0 AND NEW.amount < 0
+         AND OLD.amount != NEW.amount
+    BEGIN
+        UPDATE group_ledger SET amount = CAST(ROUND(amount * 1.0 * NEW.amount / OLD.amount) AS INTEGER)
+        WHERE transaction_id = NEW.id AND kind = 'split';
+
+        UPDATE group_ledger
+        SET amount = amount - NEW.amount - (SELECT SUM(amount) FROM group_ledger
+                                            WHERE transaction_id = NEW.id AND kind = 'split')
+        WHERE id = (SELECT MIN(id) FROM group_ledger WHERE transaction_id = NEW.id AND kind = 'split');
+    END'''
+
+
+def _rebuild_as_cents(conn, table, money_columns):
+    """重建 table，將 money_columns 由元 (REAL/DECIMAL) 換算為整數分"""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                       (table,)).fetchone()
+    if row is None:
+        return
+
+    columns = {info[1]: (info[2] or '').upper() for info in conn.execute(f'PRAGMA table_info({table})')}
+    pending = [column for column in money_columns if column in columns and columns[column] != 'INTEGER']
+    if not pending:
+        return
+
+    new_table = f'{table}__cents'
+    create_sql = re.sub(r'^CREATE TABLE\s+(IF NOT EXISTS\s+)?("?\w+"?)', f'CREATE TABLE {new_table}', row[0])
+    for column in pending:
+        create_sql = re.sub(rf'(\b{column}\s+)(REAL|DECIMAL\s*\(\s*\d+\s*,\s*\d+\s*\)|NUMERIC)',
+                            r'\1INTEGER', create_sql, flags=re.IGNORECASE)
+
+    # 掛在這個表上的索引與觸發器會隨 DROP TABLE 一起刪除，先記下來
+    dependents = [sql for (sql,) in conn.execute('''
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''', (table,))]
+    sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone() \
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone() else None
+
+    column_list = ', '.join(columns)
+    select_list = ', '.join(
+        f'CAST(ROUND({column} * 100) AS INTEGER)' if column in pending else column
+        for column in columns
+    )
+
+    conn.execute(create_sql)
+    conn.execute(f'INSERT INTO {new_table} ({column_list}) SELECT {select_list} FROM {table}')
+    conn.execute(f'DROP TABLE {table}')
+    # 其他表的觸發器仍以名稱引用此表，改名時不需要（也不應該）改寫它們
+    conn.execute('PRAGMA legacy_alter_table = ON')
+    try:
+        conn.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+    finally:
+        conn.execute('PRAGMA legacy_alter_table = OFF')
+
+    for sql in dependents:
+        conn.execute(sql)
+
+    if sequence is not None:
+        # 保留 AUTOINCREMENT 的計數，已刪除的 id 不會被重新使用
+        conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
+
+
+def upgrade(conn):
+    for table, money_columns in COLUMNS.items():
+        _rebuild_as_cents(conn, table, money_columns)
+
+    conn.execute('DROP TRIGGER IF EXISTS trg_transactions_ledger_rescale')
+    conn.execute(RESCALE_TRIGGER)
+
+    # 彙總表由整數分的交易重新計算，不沿用浮點累加的結果
+    conn.execute('DELETE FROM monthly_rollups')
+    conn.execute('''
+        INSERT INTO monthly_rollups (owner_type, owner_id, month, category, type, income, expense, txn_count)
+        SELECT 'user', user_id, substr(date, 1, 7) as month, category, type,
+               SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END),
+               SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END),
+               COUNT(*)
+        FROM transactions
+        GROUP BY user_id, month, category, type
+        UNION ALL
+        SELECT 'group', group_id, substr(date, 1, 7) as month, category, type,
+               SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END),
+               SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END),
+               COUNT(*)
+        FROM transactions
+        WHERE group_id IS NOT NULL
+        GROUP BY group_id, month, category, type
+    ''')
@@ -0,0 +1,51 @@
+"""發票同步工作佇列 (sync_jobs) 與 sync_logs 的進度欄位
+
+同步請求只寫入一筆 queued 工作就立即回應，由背景 worker 認領執行
+（見 services/sync_queue.py）。認領時設定租約 lease_expires_at，worker 當掉時
+租約過期，工作會被其他 worker 重新認領；available_at 用於失敗後延遲重試。
+兩者皆為 Unix 時間戳（秒），方便直接比較。
+user_id 為 NULL 的工作代表同步所有使用者的載具（每晚排程）。
+"""
+
+SYNC_LOG_COLUMNS = {
+    'job_id': 'INTEGER',
+    'progress_done': 'INTEGER DEFAULT 0',
+    'progress_total': 'INTEGER DEFAULT 0',
+}
+
+STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS sync_jobs (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           user_id INTEGER,
+           carrier_id INTEGER,
+           sync_type TEXT NOT NULL,
+           status TEXT NOT NULL DEFAULT 'queued',
+           attempts INTEGER NOT NULL DEFAULT 0,
+           max_attempts INTEGER NOT NULL DEFAULT 3,
+           available_at REAL NOT NULL,
+           lease_expires_at REAL,
+           worker_id TEXT,
+           result TEXT,
+           error TEXT,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           started_at TIMESTAMP,
+           finished_at TIMESTAMP,
+           FOREIGN KEY (user_id) REFERENCES users (id),
+           FOREIGN KEY (carrier_id) REFERENCES invoice_carriers (id)
+       )''',
+
+    'CREATE INDEX IF NOT EXISTS idx_sync_jobs_status ON sync_jobs (status, available_at)',
+    'CREATE INDEX IF NOT EXISTS idx_sync_jobs_user ON sync_jobs (user_id, id)',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
+
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(sync_logs)')}
+    if existing:
+        for column, definition in SYNC_LOG_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f'ALTER TABLE sync_logs ADD COLUMN {column} {definition}')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sync_logs_job ON sync_logs (job_id)')
@@ -0,0 +1,57 @@
+"""發票增量同步：載具的同步水位 (watermark) 與發票原始資料雜湊
+
+invoice_carriers.last_synced_date 為上次成功同步時查詢範圍的結束日，下次同步只查詢
+水位往前重疊幾天到今天的範圍，不再每次重抓 30 天（見 RealInvoiceService）。
+invoice_records.raw_hash 為原始資料的 SHA-256，內容沒有變化的發票不再 UPDATE。
+"""
+
+import hashlib
+import json
+
+COLUMNS = {
+    'invoice_carriers': {
+        'last_synced_date': 'DATE',
+        'last_sync_at': 'TIMESTAMP',
+    },
+    'invoice_records': {
+        'raw_hash': 'TEXT',
+    },
+}
+
+
+def _payload_hash(invoice_data):
+    """發票原始資料的雜湊，計算方式須與 InvoiceRecord.payload_hash 相同"""
+    canonical = json.dumps(invoice_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def upgrade(conn):
+    for table, columns in COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if not existing:
+            # 發票資料表由 init_invoice_tables() 建立，尚未建立時會直接含有新欄位
+            continue
+        for column, definition in columns.items():
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sync_logs'").fetchone():
+        # 既有載具以最後一次成功同步的日期作為水位
+        conn.execute('''
+            UPDATE invoice_carriers
+            SET last_sync_at = (SELECT MAX(sync_end_time) FROM sync_logs
+                                WHERE sync_logs.carrier_id = invoice_carriers.id
+                                  AND sync_status = 'success'),
+                last_synced_date = (SELECT date(MAX(sync_end_time)) FROM sync_logs
+                                    WHERE sync_logs.carrier_id = invoice_carriers.id
+                                      AND sync_status = 'success')
+            WHERE last_synced_date IS NULL
+        ''')
+
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'invoice_records'").fetchone():
+        rows = conn.execute('SELECT id, raw_data FROM invoice_records WHERE raw_hash IS NULL').fetchall()
+        conn.executemany(
+            'UPDATE invoice_records SET raw_hash = ? WHERE id = ?',
+            [(_payload_hash(json.loads(raw_data)), record_id)
+             for record_id, raw_data in rows if raw_data]
+        )
@@ -0,0 +1,37 @@
+"""發票紀錄 (user_id, invoice_number) 唯一索引
+
+同步改為批次 upsert（INSERT ... ON CONFLICT DO UPDATE，見 InvoiceRecord.upsert_many），
+需要唯一約束作為衝突目標。原本先查再寫的流程在並行同步時可能寫入重複的發票，
+建立索引前先合併重複資料：保留最早的一筆，已匯入為交易的標記 (is_processed) 併入保留的那筆，
+其餘紀錄與其明細刪除。唯一索引同時涵蓋原本 idx_invoice_records_user_number 的查詢，舊索引移除。
+"""
+
+# 每組重複發票中保留 id 最小的一筆
+_DUPLICATES = '''
+    SELECT id FROM invoice_records r
+    WHERE id > (SELECT MIN(id) FROM invoice_records
+                WHERE user_id = r.user_id AND invoice_number = r.invoice_number)
+'''
+
+
+def upgrade(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'invoice_records'").fetchone():
+        # 發票資料表由 init_invoice_tables() 建立，尚未建立時不需要遷移
+        return
+
+    conn.execute('''
+        UPDATE invoice_records
+        SET is_processed = 1
+        WHERE is_processed = 0 AND EXISTS (
+            SELECT 1 FROM invoice_records dup
+            WHERE dup.user_id = invoice_records.user_id
+              AND dup.invoice_number = invoice_records.invoice_number
+              AND dup.is_processed = 1
+        )
+    ''')
+    conn.execute(f'DELETE FROM invoice_items WHERE invoice_record_id IN ({_DUPLICATES})')
+    conn.execute(f'DELETE FROM invoice_records WHERE id IN ({_DUPLICATES})')
+
+    conn.execute('DROP INDEX IF EXISTS idx_invoice_records_user_number')
+    conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS uq_invoice_records_user_number
+                    ON invoice_records (user_id, invoice_number)''')
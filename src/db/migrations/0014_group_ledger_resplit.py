@@ -0,0 +1,54 @@
+"""交易變成群組支出時重建平均分攤
+
+0007 的 trg_transactions_ledger_detach 在交易移出群組或改為收入時刪除分攤，但交易再改回
+支出、或以 group_id 移入群組時沒有重新產生分攤，group_balances 因此永久少算。
+改為單一觸發器：群組或收支方向改變時先刪除原分攤，若變更後仍是群組支出，
+再由目前的 active 成員平均分攤（以分計算，零頭依加入順序分給前面的成員，與 Settlement.compute_shares 相同）。
+自訂比例／金額的分攤在這種變更後也改為平均分攤。
+同時為先前因此遺失分攤的群組支出補上分攤。
+"""
+
+# 依加入順序為 active 成員編號，rn <= 零頭的成員多分 1 分
+_SPLIT = '''
+    INSERT INTO group_ledger (group_id, transaction_id, payer_id, user_id, amount, kind, created_at)
+    SELECT NEW.group_id, NEW.id, NEW.user_id, user_id,
+           -NEW.amount / n + (rn <= -NEW.amount % n), 'split', datetime('now', 'localtime')
+    FROM (SELECT user_id,
+                 ROW_NUMBER() OVER (ORDER BY joined_at, user_id) AS rn,
+                 COUNT(*) OVER () AS n
+          FROM group_members
+          WHERE group_id = NEW.group_id AND status = 'active')
+    WHERE NEW.amount < 0 AND -NEW.amount / n + (rn <= -NEW.amount % n) > 0;
+'''
+
+STATEMENTS = [
+    'DROP TRIGGER IF EXISTS trg_transactions_ledger_detach',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_ledger_resplit
+        AFTER UPDATE OF group_id, amount ON transactions
+        WHEN OLD.group_id IS NOT NEW.group_id OR (OLD.amount < 0) != (NEW.amount < 0)
+        BEGIN
+            DELETE FROM group_ledger WHERE transaction_id = NEW.id AND kind = 'split';
+            {_SPLIT}
+        END''',
+
+    # 補上遺失分攤的群組支出（沒有任何 split 明細者）
+    '''INSERT INTO group_ledger (group_id, transaction_id, payer_id, user_id, amount, kind, created_at)
+       SELECT t.group_id, t.id, t.user_id, m.user_id,
+              -t.amount / m.n + (m.rn <= -t.amount % m.n), 'split', datetime('now', 'localtime')
+       FROM transactions t
+       JOIN (SELECT group_id, user_id,
+                    ROW_NUMBER() OVER (PARTITION BY group_id ORDER BY joined_at, user_id) AS rn,
+                    COUNT(*) OVER (PARTITION BY group_id) AS n
+             FROM group_members
+             WHERE status = 'active') m ON m.group_id = t.group_id
+       WHERE t.group_id IS NOT NULL AND t.amount < 0
+         AND -t.amount / m.n + (m.rn <= -t.amount % m.n) > 0
+         AND NOT EXISTS (SELECT 1 FROM group_ledger l
+                         WHERE l.transaction_id = t.id AND l.kind = 'split')''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,53 @@
+"""交易全文檢索改用 FTS5 內建的 trigram 分詞器
+
+0003 的觸發器呼叫 Python 函式 fts_tokens，沒有註冊該函式的連接（sqlite3 命令列、
+備份還原與維護腳本等）寫入交易時會失敗：no such function: fts_tokens。
+改為直接索引原始描述，由 trigram 分詞器（SQLite 3.34 以上）切成三字元片段，
+觸發器只剩純 SQL，任何連接都可以寫入交易。trigram 以子字串比對，中文不需要先逐字切分。
+
+scope 欄位改存 '<u<user_id>><g<group_id>>'：trigram 片語至少要 3 個字元，
+加上角括號後 "<u1>" 只會比對到完整的使用者編號，不會比對到 <u12>。
+"""
+
+_INSERT = '''
+    INSERT INTO transactions_fts (rowid, description, scope)
+    VALUES (NEW.id, NEW.description,
+            '<u' || NEW.user_id || '>' || COALESCE('<g' || NEW.group_id || '>', ''));
+'''
+
+_DELETE = '''
+    DELETE FROM transactions_fts WHERE rowid = OLD.id;
+'''
+
+STATEMENTS = [
+    'DROP TRIGGER IF EXISTS trg_transactions_fts_insert',
+    'DROP TRIGGER IF EXISTS trg_transactions_fts_delete',
+    'DROP TRIGGER IF EXISTS trg_transactions_fts_update',
+    'DROP TABLE IF EXISTS transactions_fts',
+
+    '''CREATE VIRTUAL TABLE transactions_fts USING fts5(
+           description, scope, tokenize = 'trigram', detail = 'full'
+       )''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_insert
+        AFTER INSERT ON transactions
+        BEGIN {_INSERT} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_delete
+        AFTER DELETE ON transactions
+        BEGIN {_DELETE} END''',
+
+    f'''CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_update
+        AFTER UPDATE OF description, user_id, group_id ON transactions
+        BEGIN {_DELETE} {_INSERT} END''',
+
+    # 回填既有交易
+    '''INSERT INTO transactions_fts (rowid, description, scope)
+       SELECT id, description, '<u' || user_id || '>' || COALESCE('<g' || group_id || '>', '')
+       FROM transactions''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,16 @@
+"""用戶姓名開頭比對（不分大小寫）的索引
+
+0004 的 trigram 索引只能查詢 3 個字元以上的關鍵字，而中文姓名多半只有 2 ~ 3 個字。
+較短的關鍵字改以姓名開頭比對：full_name LIKE 'xx%' 在 NOCASE 索引上是範圍查詢，
+不必再以 '%xx%' 掃描整個 users 表。
+"""
+
+STATEMENTS = [
+    '''CREATE INDEX IF NOT EXISTS idx_users_full_name_nocase
+       ON users (full_name COLLATE NOCASE)''',
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(statement)
@@ -0,0 +1,82 @@
+import importlib
+import os
+import pkgutil
+import re
+from datetime import datetime
+
+# 遷移檔命名規則：四位數版本號_說明，例如 0001_hot_path_indexes.py
+_MIGRATION_PATTERN = re.compile(r'^(\d{4})_(\w+)$')
+
+
+class MigrationError(Exception):
+    """遷移執行失敗，訊息包含失敗的遷移檔名稱；原始例外保留在 __cause__"""
+
+    def __init__(self, module_name, error):
+        super().__init__(f'遷移 {module_name} 失敗，已回滾並停止後續遷移: {error}')
+        self.module_name = module_name
+
+
+def discover_migrations():
+    """依版本號排序列出所有遷移檔 (version, name, module_name)"""
+    migrations = []
+    for module_info in pkgutil.iter_modules([os.path.dirname(__file__)]):
+        match = _MIGRATION_PATTERN.match(module_info.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), module_info.name))
+    return sorted(migrations)
+
+
+def ensure_version_table(conn):
+    """創建 schema_version 表"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def get_current_version(conn):
+    """獲取目前的 schema 版本，尚未套用任何遷移時為 0"""
+    ensure_version_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, target=None):
+    """依序套用尚未執行的遷移，回傳本次套用的版本號列表
+
+    每個遷移在自己的 IMMEDIATE 交易中執行，失敗時整個遷移回滾並拋出 MigrationError，
+    多個進程同時啟動時只有一個會真正套用。遷移內不可使用 executescript()，
+    否則會提前提交交易。
+    """
+    ensure_version_table(conn)
+    applied = []
+
+    for version, name, module_name in discover_migrations():
+        if target is not None and version > target:
+            break
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+            if version <= current:
+                conn.rollback()
+                continue
+
+            module = importlib.import_module(f'{__name__}.{module_name}')
+            module.upgrade(conn)
+            conn.execute('''
+                INSERT INTO schema_version (version, name, applied_at)
+                VALUES (?, ?, ?)
+            ''', (version, name, datetime.now()))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise MigrationError(module_name, e) from e
+
+        applied.append(version)
+
+    return applied
@@ -0,0 +1,36 @@
+"""命令列工具：套用遷移並檢查熱門查詢的查詢計畫
+
+    cd src && python -m db.migrations            # 套用遷移
+    cd src && python -m db.migrations --check    # 套用遷移後檢查是否有查詢退化成 SCAN
+"""
+import sys
+
+from db import get_pool
+from db.migrations import MigrationError, get_current_version, migrate
+from db.query_plans import find_scans
+
+
+def main(argv):
+    conn = get_pool().acquire()
+    try:
+        try:
+            applied = migrate(conn)
+        except MigrationError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f'schema 版本: {get_current_version(conn)}，本次套用: {applied or "無"}')
+
+        if '--check' in argv:
+            regressions = find_scans(conn)
+            for name, scans in regressions.items():
+                print(f'[SCAN] {name}: {"; ".join(scans)}')
+            if regressions:
+                return 1
+            print('所有熱門查詢皆使用索引')
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,241 @@
+import os
+import queue
+import sqlite3
+import threading
+
+from flask import g, has_app_context
+
+from db.fts import register_functions
+from db.profiles import get_storage_profile
+from db.writer import WriteQueue
+
+# 預設資料庫路徑（專案根目錄下的 database.db）
+DEFAULT_DATABASE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database.db'
+)
+
+
+class PoolTimeoutError(Exception):
+    """連接池在等待時間內沒有可用連接"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """可歸還至連接池的 SQLite 連接，close() 不會真正關閉連接"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._checked_out = False
+        self._request_bound = False
+
+    def close(self):
+        """歸還連接（綁定請求的連接會在請求結束時統一歸還）"""
+        if self._request_bound:
+            return
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def _close_physical(self):
+        """真正關閉底層連接"""
+        super().close()
+
+
+class ConnectionPool:
+    """有上限、執行緒安全的 SQLite 連接池"""
+
+    def __init__(self, database, max_size=10, timeout=30.0, pragmas=None):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(get_storage_profile() if pragmas is None else pragmas)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._closed = False
+
+    def _connect(self):
+        """建立新連接並套用 PRAGMA"""
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.timeout,
+            check_same_thread=False,
+            factory=PooledConnection
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        register_functions(conn)
+        conn._pool = self
+        return conn
+
+    def acquire(self):
+        """取得連接，池中沒有閒置連接時建立新連接"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f'等待資料庫連接逾時 ({self.timeout}s)')
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        """歸還連接，未提交的變更會被回滾"""
+        if not conn._checked_out:
+            return
+        conn._checked_out = False
+        conn._request_bound = False
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            conn._close_physical()
+        else:
+            if self._closed:
+                conn._close_physical()
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """關閉所有閒置連接，之後歸還的連接也會直接關閉"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait()._close_physical()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_writer = None
+_pool_lock = threading.Lock()
+
+_initialized_schemas = set()
+_schema_lock = threading.RLock()
+
+
+def configure(database=None, max_size=None, timeout=None, profile=None, pragmas=None,
+              write_queue=None):
+    """(重新)設定全域連接池與寫入佇列
+
+    profile 為 db.profiles 中的儲存設定檔名稱，pragmas 可覆寫設定檔中的個別 PRAGMA。
+    """
+    global _pool, _writer
+    with _pool_lock:
+        if _writer is not None:
+            _writer.stop()
+        if _pool is not None:
+            _pool.close_all()
+
+        if write_queue is None:
+            write_queue = os.environ.get('DB_WRITE_QUEUE', 'true').lower() == 'true'
+
+        _pool = ConnectionPool(
+            database or os.environ.get('DATABASE_PATH', DEFAULT_DATABASE_PATH),
+            max_size=max_size or int(os.environ.get('DB_POOL_SIZE', 10)),
+            timeout=timeout or float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            pragmas=get_storage_profile(profile or os.environ.get('DB_STORAGE_PROFILE'), pragmas)
+        )
+        _writer = WriteQueue(_pool) if write_queue else None
+    with _schema_lock:
+        _initialized_schemas.clear()
+    return _pool
+
+
+def get_pool():
+    """獲取全域連接池（首次使用時以預設值建立）"""
+    if _pool is None:
+        configure()
+    return _pool
+
+
+def get_write_queue():
+    """獲取全域寫入佇列，未啟用時回傳 None"""
+    if _pool is None:
+        configure()
+    return _writer
+
+
+def execute_write(fn, conn=None):
+    """執行寫入函式 fn(conn)
+
+    啟用寫入佇列時交由單一寫入者執行並與其他寫入一起提交；
+    否則直接在 conn（預設為目前請求的連接）上執行並提交。
+    請求與背景同步的寫入都應經由此函式；建表、遷移與維護指令不在此列（見 WriteQueue）。
+    """
+    writer = get_write_queue()
+    if writer is not None:
+        return writer.execute(fn)
+
+    own_connection = conn is None
+    if own_connection:
+        conn = get_db_connection()
+    try:
+        result = fn(conn)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_connection:
+            conn.close()
+
+
+def get_db_connection():
+    """獲取資料庫連接
+
+    在 Flask app context 中，同一請求重複呼叫會取得同一個連接，
+    呼叫 close() 不會歸還，請求結束時由 close_db() 統一歸還。
+    在 app context 外（啟動腳本、背景工作）則直接從連接池取得，close() 時歸還。
+    """
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            conn = get_pool().acquire()
+            conn._request_bound = True
+            g._db_conn = conn
+        return conn
+    return get_pool().acquire()
+
+
+def close_db(exception=None):
+    """歸還目前請求使用的連接"""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn._request_bound = False
+        conn.close()
+
+
+def ensure_schema(name, create):
+    """每個連接池只執行一次建表，避免每個請求重複查詢 schema"""
+    if name in _initialized_schemas:
+        return
+    with _schema_lock:
+        if name in _initialized_schemas:
+            return
+        create()
+        _initialized_schemas.add(name)
+
+
+def init_app(app):
+    """將連接池綁定到 Flask 應用程式"""
+    configure(
+        database=app.config.get('DATABASE_PATH'),
+        max_size=app.config.get('DB_POOL_SIZE'),
+        timeout=app.config.get('DB_POOL_TIMEOUT'),
+        profile=app.config.get('DB_STORAGE_PROFILE'),
+        pragmas=app.config.get('DB_PRAGMAS'),
+        write_queue=app.config.get('DB_WRITE_QUEUE')
+    )
+    app.teardown_appcontext(close_db)
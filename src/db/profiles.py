@@ -0,0 +1,42 @@
+# SQLite 儲存設定檔：每個設定檔是一組在新連接建立時套用的 PRAGMA
+STORAGE_PROFILES = {
+    # 原本的 rollback journal 模式，寫入時會阻擋所有讀取
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+    },
+    # WAL 模式：讀取不會被寫入阻擋，synchronous=NORMAL 在 WAL 下仍可保證資料庫一致性
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'cache_size': -16000,       # 約 16MB 頁面快取
+        'mmap_size': 134217728,     # 128MB 記憶體映射讀取
+    },
+    # WAL + 每次提交都 fsync，適合不能接受斷電遺失最後幾筆交易的部署
+    'wal-durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+        'cache_size': -16000,
+        'mmap_size': 134217728,
+    },
+}
+
+DEFAULT_STORAGE_PROFILE = 'wal'
+
+
+def get_storage_profile(name=None, overrides=None):
+    """獲取儲存設定檔的 PRAGMA，可用 overrides 覆寫個別項目"""
+    name = name or DEFAULT_STORAGE_PROFILE
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f'未知的儲存設定檔: {name}')
+
+    pragmas = dict(STORAGE_PROFILES[name])
+    if overrides:
+        pragmas.update(overrides)
+    return pragmas
@@ -0,0 +1,117 @@
+# 熱門查詢列表，用於確認每個查詢都走索引，不會退化成全表掃描 (SCAN)
+HOT_QUERIES = {
+    'transactions.list_by_user': ('''
+        SELECT t.*, u.username, u.full_name
+        FROM transactions t
+        LEFT JOIN users u ON t.user_id = u.id
+        WHERE t.user_id = ?
+        ORDER BY t.date DESC, t.id DESC
+        LIMIT ? OFFSET ?
+    ''', (1, 20, 0)),
+    'transactions.seek_by_user': ('''
+        SELECT t.id, t.date
+        FROM transactions t
+        WHERE t.user_id = ? AND (t.date, t.id) < (?, ?)
+        ORDER BY t.date DESC, t.id DESC
+        LIMIT ?
+    ''', (1, '2100-01-01', 0, 21)),
+    'transactions.seek_by_group': ('''
+        SELECT t.id, t.date
+        FROM transactions t
+        WHERE t.group_id = ? AND (t.date, t.id) < (?, ?)
+        ORDER BY t.date DESC, t.id DESC
+        LIMIT ?
+    ''', (1, '2100-01-01', 0, 21)),
+    'transactions.count_by_user': ('''
+        SELECT COUNT(*) FROM transactions WHERE user_id = ?
+    ''', (1,)),
+    # 使用者與群組統計的總收支、分類與月度趨勢都由每月彙總表計算
+    'monthly_rollups.summary': ('''
+        SELECT month, category, SUM(income), SUM(expense)
+        FROM monthly_rollups
+        WHERE owner_type = ? AND owner_id = ? AND month >= ?
+        GROUP BY month, category
+    ''', ('user', 1, '2000-01')),
+    'transactions.group_member_contributions': ('''
+        SELECT u.full_name, u.username,
+               SUM(CASE WHEN t.amount > 0 THEN t.amount ELSE 0 END) as income,
+               SUM(CASE WHEN t.amount < 0 THEN -t.amount ELSE 0 END) as expense,
+               COUNT(*) as transaction_count
+        FROM transactions t
+        JOIN users u ON t.user_id = u.id
+        WHERE t.group_id = ? AND t.date >= ?
+        GROUP BY t.user_id, u.full_name, u.username
+        ORDER BY (income + expense) DESC
+    ''', (1, '2000-01-01')),
+    'budgets.status': ('''
+        SELECT b.id, b.amount, COALESCE(s.spent, 0)
+        FROM budgets b
+        LEFT JOIN budget_spend s
+               ON s.budget_id = b.id
+              AND s.period_start = CASE b.period WHEN 'monthly' THEN substr(:today, 1, 7) || '-01'
+                                                 ELSE b.start_date END
+        WHERE b.owner_type = :owner_type AND b.owner_id = :owner_id
+          AND b.start_date <= :today
+    ''', {'today': '2000-01-01', 'owner_type': 'user', 'owner_id': 1}),
+    'users.search_by_name_prefix': ('''
+        SELECT id, username, full_name, email, avatar_url
+        FROM users
+        WHERE full_name LIKE ? ESCAPE '\\' AND is_active = 1
+        ORDER BY full_name
+        LIMIT ?
+    ''', ('小明%', 10)),
+    'group_members.permission': ('''
+        SELECT role FROM group_members
+        WHERE group_id = ? AND user_id = ? AND status = 'active'
+    ''', (1, 1)),
+    'group_members.user_groups': ('''
+        SELECT g.id, g.name, gm.role
+        FROM groups g
+        JOIN group_members gm ON g.id = gm.group_id
+        WHERE gm.user_id = ? AND gm.status = 'active' AND g.is_active = 1
+    ''', (1,)),
+    'group_invitations.pending_for_user': ('''
+        SELECT id FROM group_invitations
+        WHERE invitee_id = ? AND status = 'pending'
+    ''', (1,)),
+    'invoice_records.exists_by_number': ('''
+        SELECT id FROM invoice_records
+        WHERE user_id = ? AND invoice_number = ?
+    ''', (1, 'AA00000000')),
+    'sync_jobs.claim': ('''
+        SELECT id FROM sync_jobs
+        WHERE (status = 'queued' AND available_at <= :now)
+           OR (status = 'running' AND lease_expires_at < :now)
+        ORDER BY available_at, id
+        LIMIT 1
+    ''', {'now': 0}),
+    'sync_jobs.covering_job': ('''
+        SELECT id FROM sync_jobs
+        WHERE status IN ('queued', 'running')
+          AND ((user_id IS :user_id AND carrier_id IS :carrier_id)
+               OR (user_id IS :user_id AND carrier_id IS NULL)
+               OR (user_id IS NULL AND carrier_id IS NULL))
+        ORDER BY carrier_id IS NULL, user_id IS NULL, id
+        LIMIT 1
+    ''', {'user_id': 1, 'carrier_id': 1}),
+    'sync_logs.by_job': ('''
+        SELECT id, progress_done, progress_total FROM sync_logs
+        WHERE job_id = ?
+        ORDER BY id
+    ''', (1,)),
+}
+
+
+def explain(conn, sql, params=()):
+    """回傳 EXPLAIN QUERY PLAN 的每一步說明"""
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+
+
+def find_scans(conn, queries=None):
+    """檢查查詢計畫，回傳 {查詢名稱: [SCAN 步驟]}，空 dict 表示所有查詢都走索引"""
+    regressions = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        scans = [step for step in explain(conn, sql, params) if step.startswith('SCAN')]
+        if scans:
+            regressions[name] = scans
+    return regressions
@@ -0,0 +1,141 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+
+class _WriteJob:
+    """寫入佇列中的單一工作"""
+
+    __slots__ = ('fn', 'future')
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.future = Future()
+
+
+class WriteQueue:
+    """單一寫入者佇列
+
+    所有寫入由一個背景執行緒依序執行，避免多個連接互搶寫入鎖而出現
+    "database is locked"。執行緒每次把佇列中已累積的工作（最多 max_batch 筆）
+    放進同一個交易一起提交（group commit），每筆工作包在各自的 SAVEPOINT 裡，
+    單筆失敗只會回滾該筆，不影響同批其他工作。
+
+    提交的函式會收到寫入者專用的連接，只能執行 SQL，不可自行 commit/rollback。
+
+    只有經由 execute_write() 的寫入會排進佇列；啟動時的建表（init_database、
+    各模型的 create_table）、遷移與維護指令（如 python -m models.rollup rebuild）
+    在自己的連接上直接提交，應在沒有請求流量時執行。
+    """
+
+    def __init__(self, pool, max_batch=64):
+        self.pool = pool
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        self.stats = {'jobs': 0, 'failed': 0, 'commits': 0}
+
+    def submit(self, fn):
+        """提交寫入工作，回傳 Future，結果為 fn(conn) 的回傳值"""
+        if self._stopped:
+            raise RuntimeError('寫入佇列已停止')
+        self._ensure_started()
+        job = _WriteJob(fn)
+        self._queue.put(job)
+        return job.future
+
+    def execute(self, fn, timeout=None):
+        """提交寫入工作並等待結果"""
+        return self.submit(fn).result(timeout)
+
+    def stop(self, timeout=None):
+        """處理完佇列中剩餘工作後停止背景執行緒"""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        self._conn = self.pool._connect()
+        # 由寫入者自行管理交易
+        self._conn.isolation_level = None
+        try:
+            running = True
+            while running:
+                job = self._queue.get()
+                if job is None:
+                    break
+
+                batch = [job]
+                while len(batch) < self.max_batch:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        running = False
+                        break
+                    batch.append(job)
+
+                self._commit_batch(batch)
+        finally:
+            self._conn._close_physical()
+            self._conn = None
+
+    def _commit_batch(self, batch):
+        """在同一個交易中執行並提交一批寫入工作"""
+        conn = self._conn
+        outcomes = []
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.Error as e:
+            for job in batch:
+                job.future.set_exception(e)
+            self.stats['failed'] += len(batch)
+            return
+
+        for job in batch:
+            conn.execute('SAVEPOINT write_job')
+            try:
+                result = job.fn(conn)
+            except Exception as e:
+                conn.execute('ROLLBACK TO write_job')
+                conn.execute('RELEASE write_job')
+                outcomes.append((job, None, e))
+            else:
+                conn.execute('RELEASE write_job')
+                outcomes.append((job, result, None))
+
+        try:
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for job in batch:
+                job.future.set_exception(e)
+            self.stats['failed'] += len(batch)
+            return
+
+        self.stats['commits'] += 1
+        for job, result, error in outcomes:
+            self.stats['jobs'] += 1
+            if error is not None:
+                self.stats['failed'] += 1
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
@@ -3,8 +3,13 @@ from flask_cors import CORS
 from models.user import User
 from models.transaction import Transaction
 from models.group import Group
+from db import execute_write, get_db_connection, init_app as init_db_app
+from db.migrations import MigrationError, migrate
+from services.statistics_cache import statistics_cache
+from services.membership_cache import get_member_role, membership_cache
 import sqlite3
 import os
+import sys
 from datetime import datetime
 
 # 導入路由
@@ -13,7 +18,9 @@ from routes.group import group_bp
 from routes.transaction import transaction_bp
 from routes.category import category_bp
 from routes.user import user_bp
-# from routes.invoice import invoice_bp  # 暫時註釋，需要CNS資安認證
+from routes.recurring import recurring_bp
+from routes.budget import budget_bp
+from services.recurring_scheduler import RecurringScheduler
 
 app = Flask(__name__)
 
@@ -24,6 +31,17 @@ app.config['SESSION_COOKIE_SECURE'] = os.environ.get('SESSION_COOKIE_SECURE', 'f
 app.config['SESSION_COOKIE_SAMESITE'] = os.environ.get('SESSION_COOKIE_SAMESITE', 'None')
 app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 24小時
 app.config['JSON_AS_ASCII'] = False # 解決中文亂碼問題
+app.config['DATABASE_PATH'] = os.environ.get('DATABASE_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database.db'))
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_STORAGE_PROFILE'] = os.environ.get('DB_STORAGE_PROFILE', 'wal')  # legacy / wal / wal-durable
+app.config['DB_WRITE_QUEUE'] = os.environ.get('DB_WRITE_QUEUE', 'true').lower() == 'true'
+app.config['TRANSACTION_BATCH_MAX'] = int(os.environ.get('TRANSACTION_BATCH_MAX', 200))
+app.config['RECURRING_SCHEDULER'] = os.environ.get('RECURRING_SCHEDULER', 'true').lower() == 'true'
+app.config['RECURRING_SCHEDULER_INTERVAL'] = int(os.environ.get('RECURRING_SCHEDULER_INTERVAL', 3600))  # 秒
+app.config['INVOICE_API_ENABLED'] = os.environ.get('INVOICE_API_ENABLED', 'false').lower() == 'true'
+
+# 綁定資料庫連接池
+init_db_app(app)
 
 # 修復的CORS設定 - 支援所有Vercel網址
 CORS(app, 
@@ -46,7 +64,13 @@ app.register_blueprint(group_bp, url_prefix='/api')
 app.register_blueprint(transaction_bp, url_prefix='/api')
 app.register_blueprint(category_bp, url_prefix='/api')
 app.register_blueprint(user_bp, url_prefix='/api')
-# app.register_blueprint(invoice_bp, url_prefix='/api/invoice')  # 暫時註釋，需要CNS資安認證
+app.register_blueprint(recurring_bp, url_prefix='/api')
+app.register_blueprint(budget_bp, url_prefix='/api')
+
+# 發票載具 API 需要CNS資安認證，預設不註冊；設定 INVOICE_API_ENABLED=true 才啟用
+if app.config['INVOICE_API_ENABLED']:
+    from routes.invoice import invoice_bp
+    app.register_blueprint(invoice_bp, url_prefix='/api/invoice')
 
 # 註冊 API 配置藍圖
 from routes.api_config import api_config_bp
@@ -57,13 +81,6 @@ if os.environ.get('GOOGLE_OAUTH_ENABLED', 'false').lower() == 'true':
     from routes.google_auth import google_auth_bp
     app.register_blueprint(google_auth_bp, url_prefix='/api/auth')
 
-# 資料庫路徑
-DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database.db')
-
-def get_db_connection():
-    """獲取資料庫連接"""
-    return sqlite3.connect(DATABASE_PATH)
-
 def init_database():
     """初始化資料庫"""
     db = get_db_connection()
@@ -128,23 +145,22 @@ def init_database():
             # 創建預設用戶
     
     db.commit()
+    
+    # 套用索引等 schema 遷移
+    migrate(db)
+    
     db.close()
     # 資料庫初始化完成
 
 def create_default_categories_for_user(user_id, db):
     """為用戶創建預設分類"""
     default_categories = ['餐飲', '交通', '購物', '娛樂', '薪資', '投資', '載具']
-    cursor = db.cursor()
     
-    for category_name in default_categories:
-        try:
-            cursor.execute('''
-                INSERT INTO user_categories (user_id, name, is_default)
-                VALUES (?, ?, 1)
-            ''', (user_id, category_name))
-        except sqlite3.IntegrityError:
-            # 分類已存在，跳過
-            pass
+    # 分類已存在則跳過
+    execute_write(lambda conn: conn.executemany('''
+        INSERT OR IGNORE INTO user_categories (user_id, name, is_default)
+        VALUES (?, ?, 1)
+    ''', [(user_id, category_name) for category_name in default_categories]), db)
 
 def require_login():
     """檢查登入狀態的裝飾器函數"""
@@ -214,15 +230,12 @@ def add_user_category():
             }), 400
         
         db = get_db_connection()
-        cursor = db.cursor()
         
         try:
-            cursor.execute('''
+            execute_write(lambda conn: conn.execute('''
                 INSERT INTO user_categories (user_id, name, is_default)
                 VALUES (?, ?, 0)
-            ''', (user_id, category_name))
-            
-            db.commit()
+            ''', (user_id, category_name)), db)
             db.close()
             
             return jsonify({
@@ -278,12 +291,10 @@ def delete_user_category(category_name):
                 'message': '不能刪除預設分類'
             }), 400
         
-        cursor.execute('''
+        execute_write(lambda conn: conn.execute('''
             DELETE FROM user_categories 
             WHERE user_id = ? AND name = ?
-        ''', (user_id, category_name))
-        
-        db.commit()
+        ''', (user_id, category_name)), db)
         db.close()
         
         return jsonify({
@@ -310,28 +321,24 @@ def get_statistics():
             }), 401
         
         group_id = request.args.get('group_id')
+        # 統計月數，最多五年
+        months = max(1, min(request.args.get('months', 6, type=int), 60))
         
         db = get_db_connection()
         transaction_model = Transaction(db)
         
         if group_id:
             # 檢查群組權限
-            cursor = db.cursor()
-            cursor.execute('''
-                SELECT role FROM group_members 
-                WHERE group_id = ? AND user_id = ? AND status = 'active'
-            ''', (group_id, user_id))
-            
-            if not cursor.fetchone():
+            if not group_id.isdigit() or get_member_role(db, user_id, int(group_id)) is None:
                 db.close()
                 return jsonify({
                     "success": False, 
                     "message": "您不是該群組成員"
                 }), 403
             
-            stats = transaction_model.get_group_statistics(group_id)
+            stats = transaction_model.get_group_statistics(group_id, months)
         else:
-            stats = transaction_model.get_user_statistics(user_id)
+            stats = transaction_model.get_user_statistics(user_id, months)
         
         db.close()
         
@@ -346,6 +353,22 @@ def get_statistics():
             "message": f"獲取統計數據失敗: {str(e)}"
         }), 500
 
+@app.route('/api/statistics/cache', methods=['GET'])
+def get_statistics_cache_stats():
+    """獲取統計快取的命中情況"""
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False, 
+            "message": "請先登入"
+        }), 401
+    
+    return jsonify({
+        "success": True,
+        "cache": statistics_cache.get_stats(),
+        "membership_cache": membership_cache.get_stats()
+    }), 200
+
 # 健康檢查
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -372,8 +395,15 @@ def internal_error(error):
     }), 500
 
 if __name__ == '__main__':
-    # 初始化資料庫
-    init_database()
+    # 初始化資料庫（遷移失敗時顯示失敗的遷移檔名稱後結束）
+    try:
+        init_database()
+    except MigrationError as e:
+        sys.exit(str(e))
+    
+    # 啟動週期性交易排程器（第一次執行會補齊停機期間錯過的發生日）
+    if app.config['RECURRING_SCHEDULER']:
+        RecurringScheduler(interval=app.config['RECURRING_SCHEDULER_INTERVAL']).start()
     
     # 獲取端口（雲端平台會提供PORT環境變數）
     import os
@@ -0,0 +1,286 @@
+from datetime import date, datetime, timedelta
+from db import execute_write
+from models.money import Money, to_amount
+
+# 交易日期所屬預算期間的起始日（觸發器與 Python 端 period_bounds 必須一致）
+# migration 0009 的觸發器保有自己的副本，修改計算方式需另寫新的遷移重建觸發器
+# weekly 以週一為一週的開始；custom 為單一期間，起始日即預算的 start_date
+PERIOD_START_SQL = '''CASE {budget}.period
+    WHEN 'monthly' THEN substr({day}, 1, 7) || '-01'
+    WHEN 'weekly' THEN date({day}, 'weekday 0', '-6 days')
+    WHEN 'yearly' THEN substr({day}, 1, 4) || '-01-01'
+    ELSE {budget}.start_date
+END'''
+
+# 交易符合預算的條件：擁有者、分類（NULL 代表全部分類）與有效日期
+MATCH_SQL = '''(({budget}.owner_type = 'user' AND {budget}.owner_id = {row}.user_id)
+      OR ({budget}.owner_type = 'group' AND {budget}.owner_id = {row}.group_id))
+    AND ({budget}.category IS NULL OR {budget}.category = {row}.category)
+    AND {row}.date >= {budget}.start_date
+    AND ({budget}.end_date IS NULL OR {row}.date <= {budget}.end_date)'''
+
+
+class Budget:
+    """預算（用戶或群組，可依分類、依週期）
+
+    每個預算期間的已花費金額存在 budget_spend，由交易表的觸發器在每次寫入時
+    增量更新（見 migration 0009），查詢預算狀態時不需掃描交易表。
+    """
+
+    PERIODS = ('weekly', 'monthly', 'yearly', 'custom')
+
+    # 已使用比例超過此值時狀態為 warning
+    WARNING_RATIO = 0.8
+
+    def __init__(self, db_connection):
+        self.db = db_connection
+
+    @staticmethod
+    def period_bounds(period, start_date, end_date, day):
+        """回傳 day 所屬預算期間的 (起始日, 結束日)，皆為 date"""
+        if period == 'monthly':
+            start = day.replace(day=1)
+            next_start = (start + timedelta(days=32)).replace(day=1)
+            end = next_start - timedelta(days=1)
+        elif period == 'weekly':
+            start = day - timedelta(days=day.weekday())
+            end = start + timedelta(days=6)
+        elif period == 'yearly':
+            start = date(day.year, 1, 1)
+            end = date(day.year, 12, 31)
+        else:
+            start = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+        # 期間不超出預算本身的有效範圍
+        budget_start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        start = max(start, budget_start)
+        if end_date:
+            end = min(end, datetime.strptime(end_date, '%Y-%m-%d').date())
+        return start, end
+
+    def create_budget(self, owner_type, owner_id, amount, period, created_by,
+                      category=None, start_date=None, end_date=None):
+        """創建預算，並由既有交易回填已花費金額"""
+        try:
+            if owner_type not in ('user', 'group'):
+                return {"success": False, "message": "無效的預算擁有者"}
+
+            if period not in self.PERIODS:
+                return {"success": False, "message": f"不支援的預算週期: {period}"}
+
+            amount = Money.parse(amount).cents
+            if amount <= 0:
+                return {"success": False, "message": "預算金額必須大於 0"}
+
+            start_date = start_date or date.today().replace(day=1).isoformat()
+            try:
+                datetime.strptime(start_date, '%Y-%m-%d')
+                if end_date:
+                    datetime.strptime(end_date, '%Y-%m-%d')
+            except (TypeError, ValueError):
+                return {"success": False, "message": "日期格式錯誤，應為 YYYY-MM-DD"}
+
+            if period == 'custom' and not end_date:
+                return {"success": False, "message": "自訂期間的預算需要結束日期"}
+            if end_date and end_date < start_date:
+                return {"success": False, "message": "結束日期不能早於開始日期"}
+
+            def insert(conn):
+                cursor = conn.execute('''
+                    INSERT INTO budgets (owner_type, owner_id, category, amount, period,
+                                         start_date, end_date, created_by, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (owner_type, owner_id, category or None, amount, period, start_date,
+                      end_date or None, created_by, datetime.now(), datetime.now()))
+                budget_id = cursor.lastrowid
+                Budget._backfill(conn, budget_id)
+                return budget_id
+
+            budget_id = execute_write(insert, self.db)
+
+            return {
+                "success": True,
+                "message": "預算創建成功",
+                "budget_id": budget_id
+            }
+
+        except Exception as e:
+            return {"success": False, "message": f"創建預算失敗: {str(e)}"}
+
+    def get_budget_owner(self, budget_id):
+        """獲取預算的 (owner_type, owner_id)，不存在時回傳 None"""
+        row = self.db.execute(
+            'SELECT owner_type, owner_id FROM budgets WHERE id = ?', (budget_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def get_budgets(self, owner_type, owner_id):
+        """獲取擁有者的預算列表"""
+        try:
+            cursor = self.db.cursor()
+            cursor.execute('''
+                SELECT id, category, amount, period, start_date, end_date, created_by, created_at
+                FROM budgets
+                WHERE owner_type = ? AND owner_id = ?
+                ORDER BY category IS NOT NULL, category, period
+            ''', (owner_type, owner_id))
+
+            return [
+                {
+                    "id": budget[0],
+                    "owner_type": owner_type,
+                    "owner_id": owner_id,
+                    "category": budget[1],
+                    "amount": to_amount(budget[2]),
+                    "period": budget[3],
+                    "start_date": budget[4],
+                    "end_date": budget[5],
+                    "created_by": budget[6],
+                    "created_at": budget[7]
+                }
+                for budget in cursor.fetchall()
+            ]
+
+        except Exception as e:
+            return []
+
+    def update_budget(self, budget_id, amount=None, end_date=None):
+        """更新預算金額或結束日期（分類與週期不可變更，需要時請重建預算）"""
+        try:
+            update_fields = []
+            values = []
+
+            if amount is not None:
+                amount = Money.parse(amount).cents
+                if amount <= 0:
+                    return {"success": False, "message": "預算金額必須大於 0"}
+                update_fields.append("amount = ?")
+                values.append(amount)
+
+            if end_date is not None:
+                if end_date:
+                    try:
+                        datetime.strptime(end_date, '%Y-%m-%d')
+                    except (TypeError, ValueError):
+                        return {"success": False, "message": "日期格式錯誤，應為 YYYY-MM-DD"}
+                update_fields.append("end_date = ?")
+                values.append(end_date or None)
+
+            if not update_fields:
+                return {"success": False, "message": "沒有可更新的欄位"}
+
+            values.extend([datetime.now(), budget_id])
+
+            def update(conn):
+                updated = conn.execute(f'''
+                    UPDATE budgets SET {', '.join(update_fields)}, updated_at = ?
+                    WHERE id = ?
+                ''', values).rowcount
+
+                # 結束日期影響計入範圍，已花費金額需重新回填
+                if updated and end_date is not None:
+                    conn.execute('DELETE FROM budget_spend WHERE budget_id = ?', (budget_id,))
+                    self._backfill(conn, budget_id)
+                return updated
+
+            if execute_write(update, self.db) == 0:
+                return {"success": False, "message": "預算不存在"}
+
+            return {"success": True, "message": "預算更新成功"}
+
+        except Exception as e:
+            return {"success": False, "message": f"更新預算失敗: {str(e)}"}
+
+    @staticmethod
+    def _backfill(conn, budget_id):
+        """由既有交易計算預算各期間的已花費金額（之後的寫入由觸發器維護）"""
+        owner_type = conn.execute('SELECT owner_type FROM budgets WHERE id = ?',
+                                  (budget_id,)).fetchone()[0]
+        owner_column = 'user_id' if owner_type == 'user' else 'group_id'
+        conn.execute(f'''
+            INSERT INTO budget_spend (budget_id, period_start, spent, txn_count)
+            SELECT b.id, {PERIOD_START_SQL.format(budget='b', day='t.date')} AS period_start,
+                   SUM(-t.amount), COUNT(*)
+            FROM budgets b
+            JOIN transactions t ON t.{owner_column} = b.owner_id
+            WHERE b.id = ? AND t.amount < 0 AND {MATCH_SQL.format(budget='b', row='t')}
+            GROUP BY period_start
+        ''', (budget_id,))
+
+    def delete_budget(self, budget_id):
+        """刪除預算"""
+        try:
+            def delete(conn):
+                conn.execute('DELETE FROM budget_spend WHERE budget_id = ?', (budget_id,))
+                return conn.execute('DELETE FROM budgets WHERE id = ?', (budget_id,)).rowcount
+
+            if execute_write(delete, self.db) == 0:
+                return {"success": False, "message": "預算不存在"}
+
+            return {"success": True, "message": "預算已刪除"}
+
+        except Exception as e:
+            return {"success": False, "message": f"刪除預算失敗: {str(e)}"}
+
+    def get_status(self, owner_type, owner_id, today=None):
+        """獲取擁有者所有預算在目前期間的花費、剩餘金額與消耗速度"""
+        try:
+            today = today or date.today()
+            today_str = today.isoformat()
+
+            cursor = self.db.cursor()
+            cursor.execute(f'''
+                SELECT b.id, b.category, b.amount, b.period, b.start_date, b.end_date,
+                       COALESCE(s.spent, 0), COALESCE(s.txn_count, 0)
+                FROM budgets b
+                LEFT JOIN budget_spend s
+                       ON s.budget_id = b.id
+                      AND s.period_start = {PERIOD_START_SQL.format(budget='b', day=':today')}
+                WHERE b.owner_type = :owner_type AND b.owner_id = :owner_id
+                  AND b.start_date <= :today AND (b.end_date IS NULL OR b.end_date >= :today)
+                ORDER BY b.category IS NOT NULL, b.category, b.period
+            ''', {"today": today_str, "owner_type": owner_type, "owner_id": owner_id})
+
+            budgets = []
+            for budget_id, category, amount, period, start_date, end_date, spent, txn_count in cursor.fetchall():
+                period_start, period_end = self.period_bounds(period, start_date, end_date, today)
+                total_days = (period_end - period_start).days + 1
+                elapsed_days = (today - period_start).days + 1
+                remaining_days = total_days - elapsed_days
+
+                # 金額皆為整數分，只在輸出時換回元
+                remaining = amount - spent
+                burn_rate = round(spent / elapsed_days)
+                projected = round(spent * total_days / elapsed_days)
+                used_ratio = spent / amount
+
+                if used_ratio >= 1:
+                    status = 'over'
+                elif used_ratio >= self.WARNING_RATIO or projected > amount:
+                    status = 'warning'
+                else:
+                    status = 'ok'
+
+                budgets.append({
+                    "id": budget_id,
+                    "category": category,
+                    "period": period,
+                    "period_start": period_start.isoformat(),
+                    "period_end": period_end.isoformat(),
+                    "amount": to_amount(amount),
+                    "spent": to_amount(spent),
+                    "remaining": to_amount(remaining),
+                    "used_percent": round(used_ratio * 100, 1),
+                    "transaction_count": txn_count,
+                    "burn_rate": to_amount(burn_rate),
+                    "projected_spend": to_amount(projected),
+                    "daily_allowance": to_amount(max(remaining, 0) // remaining_days) if remaining_days > 0 else 0,
+                    "days_remaining": remaining_days,
+                    "status": status
+                })
+
+            return {"success": True, "budgets": budgets}
+
+        except Exception as e:
+            return {"success": False, "message": f"獲取預算狀態失敗: {str(e)}"}
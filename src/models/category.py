@@ -1,12 +1,13 @@
 import sqlite3
 from datetime import datetime
+from db import ensure_schema, execute_write, get_db_connection
 
 class UserCategory:
     """用戶分類模型"""
     
     def __init__(self, db_connection):
         self.db = db_connection
-        self.create_table()
+        ensure_schema('user_categories', self.create_table)
     
     def create_table(self):
         """創建用戶分類表"""
@@ -28,12 +29,8 @@ class UserCategory:
     @staticmethod
     def get_user_categories(user_id):
         """獲取用戶的所有分類"""
-        import sqlite3
-        import os
-        
         # 獲取資料庫連接
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "database.db")
-        db = sqlite3.connect(db_path)
+        db = get_db_connection()
         cursor = db.cursor()
         cursor.execute('''
             SELECT id, user_id, name, is_default, created_at
@@ -60,12 +57,8 @@ class UserCategory:
     @staticmethod
     def add_user_category(user_id, category_name):
         """為用戶新增分類"""
-        import sqlite3
-        import os
-        
         # 獲取資料庫連接
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database.db')
-        db = sqlite3.connect(db_path)
+        db = get_db_connection()
         cursor = db.cursor()
         
         # 檢查是否已存在
@@ -80,13 +73,10 @@ class UserCategory:
         
         # 新增分類
         try:
-            cursor.execute('''
+            category_id = execute_write(lambda conn: conn.execute('''
                 INSERT INTO user_categories (user_id, name, is_default, created_at)
                 VALUES (?, ?, 0, CURRENT_TIMESTAMP)
-            ''', (user_id, category_name))
-            
-            category_id = cursor.lastrowid
-            db.commit()
+            ''', (user_id, category_name)).lastrowid, db)
             db.close()
             
             return {
@@ -103,12 +93,8 @@ class UserCategory:
     @staticmethod
     def delete_user_category(user_id, category_name):
         """刪除用戶分類（不能刪除預設分類）"""
-        import sqlite3
-        import os
-        
         # 獲取資料庫連接
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database.db')
-        db = sqlite3.connect(db_path)
+        db = get_db_connection()
         cursor = db.cursor()
         
         # 檢查分類是否存在且是否為預設分類
@@ -127,12 +113,10 @@ class UserCategory:
             return False, "不能刪除預設分類"
         
         # 刪除分類
-        cursor.execute('''
+        execute_write(lambda conn: conn.execute('''
             DELETE FROM user_categories 
             WHERE user_id = ? AND name = ?
-        ''', (user_id, category_name))
-        
-        db.commit()
+        ''', (user_id, category_name)), db)
         db.close()
         
         return True, None
@@ -142,7 +126,7 @@ class GroupCategory:
     
     def __init__(self, db_connection):
         self.db = db_connection
-        self.create_table()
+        ensure_schema('group_categories', self.create_table)
     
     def create_table(self):
         """創建群組分類表"""
@@ -165,12 +149,8 @@ class GroupCategory:
     @staticmethod
     def get_group_categories(group_id):
         """獲取群組的所有分類"""
-        import sqlite3
-        import os
-        
         # 獲取資料庫連接
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "database.db")
-        db = sqlite3.connect(db_path)
+        db = get_db_connection()
         cursor = db.cursor()
         cursor.execute('''
             SELECT id, group_id, name, created_by, is_inherited, created_at
@@ -198,12 +178,8 @@ class GroupCategory:
     @staticmethod
     def add_group_category(group_id, user_id, category_name):
         """為群組新增分類"""
-        import sqlite3
-        import os
-        
         # 獲取資料庫連接
-        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "database.db")
-        db = sqlite3.connect(db_path)
+        db = get_db_connection()
         cursor = db.cursor()
         
         # 檢查是否已存在
@@ -218,13 +194,10 @@ class GroupCategory:
         
         # 新增分類
         try:
-            cursor.execute('''
+            category_id = execute_write(lambda conn: conn.execute('''
                 INSERT INTO group_categories (group_id, name, created_by, is_inherited, created_at)
                 VALUES (?, ?, ?, 0, CURRENT_TIMESTAMP)
-            ''', (group_id, category_name, user_id))
-            
-            category_id = cursor.lastrowid
-            db.commit()
+            ''', (group_id, category_name, user_id)).lastrowid, db)
             db.close()
             
             return {
@@ -1,10 +1,13 @@
 from datetime import datetime
 import json
+from db import ensure_schema, execute_write
+from models.user import User
+from services.membership_cache import get_member_role, invalidate_membership
 
 class Group:
     def __init__(self, db_connection):
         self.db = db_connection
-        self.create_tables()
+        ensure_schema('groups', self.create_tables)
     
     def create_tables(self):
         """創建群組相關表格"""
@@ -89,69 +92,42 @@ class Group:
             if cursor.fetchone():
                 return {"success": False, "message": "您已經有同名的群組"}
             
-            # 創建群組
-            cursor.execute('''
-                INSERT INTO groups (name, description, created_by, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name_stripped, description or '', created_by, datetime.now(), datetime.now()))
-            
-            group_id = cursor.lastrowid
-            
-            # 添加創建者為管理員
-            cursor.execute('''
-                INSERT INTO group_members (group_id, user_id, role, status, joined_at)
-                VALUES (?, ?, 'admin', 'active', ?)
-            ''', (group_id, created_by, datetime.now()))
-            
             # 如果提供了成員名單，發送邀請
-            invited_users = []
+            candidates = {}
             if member_names:
                 # 解析成員名單（支援逗號分隔的姓名）
                 names = [name.strip() for name in member_names.split(',') if name.strip()]
                 
+                # 一次查詢解析全部姓名
+                resolved = User(self.db).resolve_users_by_names(names)
+                
+                # 依輸入順序去重，不邀請自己
                 for name in names:
-                    # 搜索用戶 - 使用模糊匹配和去除空格
-                    name_trimmed = name.strip()
-                    cursor.execute('''
-                        SELECT id, full_name, username FROM users 
-                        WHERE (full_name = ? OR full_name LIKE ?) AND is_active = 1
-                        LIMIT 1
-                    ''', (name_trimmed, f'%{name_trimmed}%'))
-                    
-                    user = cursor.fetchone()
-                    if user and user[0] != created_by:  # 不邀請自己
-                        # 檢查是否已經是群組成員
-                        cursor.execute('''
-                            SELECT id FROM group_members 
-                            WHERE group_id = ? AND user_id = ? AND status = 'active'
-                        ''', (group_id, user[0]))
-                        
-                        if not cursor.fetchone():  # 不是現有成員
-                            # 檢查是否已有待處理邀請
-                            cursor.execute('''
-                                SELECT id FROM group_invitations 
-                                WHERE group_id = ? AND invitee_id = ? AND status = 'pending'
-                            ''', (group_id, user[0]))
-                            
-                            if not cursor.fetchone():  # 沒有待處理邀請
-                                # 發送邀請
-                                try:
-                                    cursor.execute('''
-                                        INSERT INTO group_invitations (group_id, inviter_id, invitee_id, status, created_at)
-                                        VALUES (?, ?, ?, 'pending', ?)
-                                    ''', (group_id, created_by, user[0], datetime.now()))
-                                    
-                                    invited_users.append({
-                                        "id": user[0],
-                                        "full_name": user[1],
-                                        "username": user[2]
-                                    })
-                                except Exception as e:
-                                    pass
-                    else:
-                        pass
-            
-            self.db.commit()
+                    user = resolved.get(name)
+                    if user and user["id"] != created_by:
+                        candidates.setdefault(user["id"], user)
+            
+            def insert(conn):
+                cursor = conn.cursor()
+                
+                # 創建群組
+                cursor.execute('''
+                    INSERT INTO groups (name, description, created_by, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (name_stripped, description or '', created_by, datetime.now(), datetime.now()))
+                
+                group_id = cursor.lastrowid
+                
+                # 添加創建者為管理員
+                cursor.execute('''
+                    INSERT INTO group_members (group_id, user_id, role, status, joined_at)
+                    VALUES (?, ?, 'admin', 'active', ?)
+                ''', (group_id, created_by, datetime.now()))
+                
+                return group_id, self._bulk_invite(cursor, group_id, created_by, list(candidates.values()))
+            
+            group_id, invited_users = execute_write(insert, self.db)
+            invalidate_membership(group_id, [created_by])
             
             # 獲取完整的群組信息
             group_info = self.get_group_by_id(group_id)
@@ -166,6 +142,42 @@ class Group:
         except Exception as e:
             return {"success": False, "message": f"創建群組失敗: {str(e)}"}
     
+    def _bulk_invite(self, cursor, group_id, inviter_id, users):
+        """批次邀請：以單一查詢排除現有成員與待處理邀請，再用 executemany 寫入"""
+        if not users:
+            return []
+        
+        cursor.execute(f'''
+            WITH candidates(user_id) AS (VALUES {', '.join(['(?)'] * len(users))})
+            SELECT c.user_id FROM candidates c
+            WHERE NOT EXISTS (
+                SELECT 1 FROM group_members gm
+                WHERE gm.group_id = ? AND gm.user_id = c.user_id AND gm.status = 'active'
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM group_invitations gi
+                WHERE gi.group_id = ? AND gi.invitee_id = c.user_id AND gi.status = 'pending'
+            )
+        ''', [user["id"] for user in users] + [group_id, group_id])
+        
+        invitable = {row[0] for row in cursor.fetchall()}
+        invited_users = [
+            {
+                "id": user["id"],
+                "full_name": user["full_name"],
+                "username": user["username"]
+            }
+            for user in users if user["id"] in invitable
+        ]
+        
+        now = datetime.now()
+        cursor.executemany('''
+            INSERT INTO group_invitations (group_id, inviter_id, invitee_id, status, created_at)
+            VALUES (?, ?, ?, 'pending', ?)
+        ''', [(group_id, inviter_id, user["id"], now) for user in invited_users])
+        
+        return invited_users
+    
     def get_group_by_id(self, group_id):
         """根據ID獲取群組信息"""
         try:
@@ -174,7 +186,8 @@ class Group:
             # 獲取群組基本信息
             cursor.execute('''
                 SELECT g.id, g.name, g.description, g.created_by, g.created_at, g.updated_at,
-                       u.full_name as creator_name, u.username as creator_username
+                       u.full_name as creator_name, u.username as creator_username,
+                       g.transaction_count, g.last_activity_at
                 FROM groups g
                 JOIN users u ON g.created_by = u.id
                 WHERE g.id = ? AND g.is_active = 1
@@ -214,6 +227,8 @@ class Group:
                 "creator_name": group[6],
                 "creator_username": group[7],
                 "member_count": len(members),
+                "transaction_count": group[8],
+                "last_activity_at": group[9],
                 "pending_invitations": pending_invitations,
                 "members": [
                     {
@@ -239,7 +254,7 @@ class Group:
             cursor.execute('''
                 SELECT g.id, g.name, g.description, g.created_by, g.created_at,
                        gm.role, gm.joined_at,
-                       (SELECT COUNT(*) FROM group_members WHERE group_id = g.id AND status = 'active') as member_count
+                       g.member_count, g.transaction_count, g.last_activity_at
                 FROM groups g
                 JOIN group_members gm ON g.id = gm.group_id
                 WHERE gm.user_id = ? AND gm.status = 'active' AND g.is_active = 1
@@ -257,7 +272,9 @@ class Group:
                     "created_at": group[4],
                     "user_role": group[5],
                     "joined_at": group[6],
-                    "member_count": group[7]
+                    "member_count": group[7],
+                    "transaction_count": group[8],
+                    "last_activity_at": group[9]
                 }
                 for group in groups
             ]
@@ -271,12 +288,7 @@ class Group:
             cursor = self.db.cursor()
             
             # 檢查用戶是否是群組成員
-            cursor.execute('''
-                SELECT role FROM group_members 
-                WHERE group_id = ? AND user_id = ? AND status = 'active'
-            ''', (group_id, user_id))
-            
-            user_member = cursor.fetchone()
+            user_member = get_member_role(self.db, user_id, group_id)
             if not user_member:
                 return {"success": False, "message": "您不是該群組成員"}
             
@@ -317,13 +329,8 @@ class Group:
             cursor = self.db.cursor()
             
             # 檢查用戶是否是群組管理員
-            cursor.execute('''
-                SELECT role FROM group_members 
-                WHERE group_id = ? AND user_id = ? AND status = 'active'
-            ''', (group_id, user_id))
-            
-            user_role = cursor.fetchone()
-            if not user_role or user_role[0] != 'admin':
+            user_role = get_member_role(self.db, user_id, group_id)
+            if user_role != 'admin':
                 return {"success": False, "message": "只有群組管理員可以刪除群組"}
             
             # 檢查群組是否有關聯的交易記錄
@@ -336,16 +343,18 @@ class Group:
                 return {"success": False, "message": f"無法刪除群組，還有 {transaction_count} 筆交易記錄關聯到此群組"}
             
             # 刪除群組相關資料
-            # 1. 刪除群組邀請
-            cursor.execute('DELETE FROM group_invitations WHERE group_id = ?', (group_id,))
-            
-            # 2. 刪除群組成員
-            cursor.execute('DELETE FROM group_members WHERE group_id = ?', (group_id,))
-            
-            # 3. 刪除群組
-            cursor.execute('DELETE FROM groups WHERE id = ?', (group_id,))
+            def delete(conn):
+                # 1. 刪除群組邀請
+                conn.execute('DELETE FROM group_invitations WHERE group_id = ?', (group_id,))
+                
+                # 2. 刪除群組成員
+                conn.execute('DELETE FROM group_members WHERE group_id = ?', (group_id,))
+                
+                # 3. 刪除群組
+                conn.execute('DELETE FROM groups WHERE id = ?', (group_id,))
             
-            self.db.commit()
+            execute_write(delete, self.db)
+            invalidate_membership(group_id)
             
             return {"success": True, "message": "群組已成功刪除"}
             
@@ -358,13 +367,8 @@ class Group:
             cursor = self.db.cursor()
             
             # 檢查邀請者是否有權限
-            cursor.execute('''
-                SELECT role FROM group_members 
-                WHERE group_id = ? AND user_id = ? AND status = 'active'
-            ''', (group_id, inviter_id))
-            
-            inviter = cursor.fetchone()
-            if not inviter or inviter[0] not in ['admin', 'moderator']:
+            inviter = get_member_role(self.db, inviter_id, group_id)
+            if inviter not in ['admin', 'moderator']:
                 return {"success": False, "message": "您沒有邀請權限"}
             
             # 檢查被邀請者是否已經是成員
@@ -390,12 +394,10 @@ class Group:
                 return {"success": False, "message": "該用戶已有待處理的邀請"}
             
             # 創建邀請
-            cursor.execute('''
+            execute_write(lambda conn: conn.execute('''
                 INSERT INTO group_invitations (group_id, inviter_id, invitee_id, message, created_at)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (group_id, inviter_id, invitee_id, message, datetime.now()))
-            
-            self.db.commit()
+            ''', (group_id, inviter_id, invitee_id, message, datetime.now())), self.db)
             
             return {"success": True, "message": "邀請已發送"}
             
@@ -423,21 +425,28 @@ class Group:
             group_id = invitation[0]
             status = 'accepted' if accept else 'declined'
             
-            # 更新邀請狀態
-            cursor.execute('''
-                UPDATE group_invitations 
-                SET status = ?, responded_at = ?
-                WHERE id = ?
-            ''', (status, datetime.now(), invitation_id))
-            
-            # 如果接受邀請，添加為群組成員
+            def respond(conn):
+                # 更新邀請狀態
+                conn.execute('''
+                    UPDATE group_invitations 
+                    SET status = ?, responded_at = ?
+                    WHERE id = ?
+                ''', (status, datetime.now(), invitation_id))
+                
+                # 如果接受邀請，添加為群組成員
+                if accept:
+                    conn.execute('''
+                        INSERT INTO group_members (group_id, user_id, role, status, joined_at)
+                        VALUES (?, ?, 'member', 'active', ?)
+                        ON CONFLICT (group_id, user_id) DO UPDATE SET
+                            role = excluded.role,
+                            status = excluded.status,
+                            joined_at = excluded.joined_at
+                    ''', (group_id, user_id, datetime.now()))
+            
+            execute_write(respond, self.db)
             if accept:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO group_members (group_id, user_id, role, status, joined_at)
-                    VALUES (?, ?, 'member', 'active', ?)
-                ''', (group_id, user_id, datetime.now()))
-            
-            self.db.commit()
+                invalidate_membership(group_id, [user_id])
             
             message = "已加入群組" if accept else "已拒絕邀請"
             return {"success": True, "message": message}
@@ -485,13 +494,8 @@ class Group:
             cursor = self.db.cursor()
             
             # 檢查操作者權限
-            cursor.execute('''
-                SELECT role FROM group_members 
-                WHERE group_id = ? AND user_id = ? AND status = 'active'
-            ''', (group_id, admin_id))
-            
-            admin = cursor.fetchone()
-            if not admin or admin[0] not in ['admin']:
+            admin = get_member_role(self.db, admin_id, group_id)
+            if admin != 'admin':
                 return {"success": False, "message": "您沒有移除成員的權限"}
             
             # 不能移除自己
@@ -499,23 +503,17 @@ class Group:
                 return {"success": False, "message": "不能移除自己"}
             
             # 檢查被移除者是否是成員
-            cursor.execute('''
-                SELECT role FROM group_members 
-                WHERE group_id = ? AND user_id = ? AND status = 'active'
-            ''', (group_id, member_id))
-            
-            member = cursor.fetchone()
+            member = get_member_role(self.db, member_id, group_id)
             if not member:
                 return {"success": False, "message": "該用戶不是群組成員"}
             
             # 移除成員
-            cursor.execute('''
+            execute_write(lambda conn: conn.execute('''
                 UPDATE group_members 
                 SET status = 'removed'
                 WHERE group_id = ? AND user_id = ?
-            ''', (group_id, member_id))
-            
-            self.db.commit()
+            ''', (group_id, member_id)), self.db)
+            invalidate_membership(group_id, [member_id])
             
             return {"success": True, "message": "成員已移除"}
             
@@ -528,17 +526,12 @@ class Group:
             cursor = self.db.cursor()
             
             # 檢查是否是群組成員
-            cursor.execute('''
-                SELECT role FROM group_members 
-                WHERE group_id = ? AND user_id = ? AND status = 'active'
-            ''', (group_id, user_id))
-            
-            member = cursor.fetchone()
+            member = get_member_role(self.db, user_id, group_id)
             if not member:
                 return {"success": False, "message": "您不是該群組成員"}
             
             # 如果是管理員，檢查是否還有其他管理員
-            if member[0] == 'admin':
+            if member == 'admin':
                 cursor.execute('''
                     SELECT COUNT(*) FROM group_members 
                     WHERE group_id = ? AND role = 'admin' AND status = 'active'
@@ -549,13 +542,12 @@ class Group:
                     return {"success": False, "message": "您是唯一的管理員，請先指定其他管理員或刪除群組"}
             
             # 離開群組
-            cursor.execute('''
+            execute_write(lambda conn: conn.execute('''
                 UPDATE group_members 
                 SET status = 'left'
                 WHERE group_id = ? AND user_id = ?
-            ''', (group_id, user_id))
-            
-            self.db.commit()
+            ''', (group_id, user_id)), self.db)
+            invalidate_membership(group_id, [user_id])
             
             return {"success": True, "message": "已離開群組"}
             
@@ -580,28 +572,30 @@ class Group:
             if group[0] != user_id:
                 return {"success": False, "message": "只有群組創建者可以刪除群組"}
             
-            # 軟刪除群組
-            cursor.execute('''
-                UPDATE groups 
-                SET is_active = 0, updated_at = ?
-                WHERE id = ?
-            ''', (datetime.now(), group_id))
-            
-            # 移除所有成員
-            cursor.execute('''
-                UPDATE group_members 
-                SET status = 'removed'
-                WHERE group_id = ?
-            ''', (group_id,))
-            
-            # 取消所有待處理邀請
-            cursor.execute('''
-                UPDATE group_invitations 
-                SET status = 'cancelled'
-                WHERE group_id = ? AND status = 'pending'
-            ''', (group_id,))
+            def deactivate(conn):
+                # 軟刪除群組
+                conn.execute('''
+                    UPDATE groups 
+                    SET is_active = 0, updated_at = ?
+                    WHERE id = ?
+                ''', (datetime.now(), group_id))
+                
+                # 移除所有成員
+                conn.execute('''
+                    UPDATE group_members 
+                    SET status = 'removed'
+                    WHERE group_id = ?
+                ''', (group_id,))
+                
+                # 取消所有待處理邀請
+                conn.execute('''
+                    UPDATE group_invitations 
+                    SET status = 'cancelled'
+                    WHERE group_id = ? AND status = 'pending'
+                ''', (group_id,))
             
-            self.db.commit()
+            execute_write(deactivate, self.db)
+            invalidate_membership(group_id)
             
             return {"success": True, "message": "群組已刪除"}
             
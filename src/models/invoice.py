@@ -1,13 +1,20 @@
 import sqlite3
 import json
+import hashlib
 from datetime import datetime, date
 from decimal import Decimal
+from db import execute_write, get_db_connection
+from models.money import to_amount, to_cents
 
-def get_db_connection():
-    """獲取資料庫連接"""
-    conn = sqlite3.connect('../database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+def row_cursor(conn):
+    """回傳以 sqlite3.Row 取出資料列的游標
+
+    row_factory 只設定在游標上：連接可能是同一個請求共用的連接，
+    改動連接的 row_factory 會讓之後其他程式的查詢也拿到 Row。
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor
 
 def init_invoice_tables():
     """初始化發票相關資料表"""
@@ -24,13 +31,15 @@ def init_invoice_tables():
             carrier_name TEXT,
             verification_code TEXT,
             is_active BOOLEAN DEFAULT 1,
+            last_synced_date DATE,
+            last_sync_at TIMESTAMP,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
     
-    # 創建發票紀錄表
+    # 創建發票紀錄表（金額欄位為整數分，見 models/money.py）
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS invoice_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,12 +51,13 @@ def init_invoice_tables():
             seller_name TEXT,
             seller_id TEXT,
             seller_address TEXT,
-            total_amount DECIMAL(10,2) NOT NULL,
-            tax_amount DECIMAL(10,2) DEFAULT 0,
+            total_amount INTEGER NOT NULL,
+            tax_amount INTEGER DEFAULT 0,
             invoice_status TEXT DEFAULT 'normal',
             category_id INTEGER,
             is_processed BOOLEAN DEFAULT 0,
             raw_data TEXT,
+            raw_hash TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id),
@@ -63,8 +73,8 @@ def init_invoice_tables():
             item_name TEXT NOT NULL,
             item_quantity DECIMAL(10,3) DEFAULT 1,
             item_unit TEXT,
-            item_price DECIMAL(10,2) NOT NULL,
-            item_amount DECIMAL(10,2) NOT NULL,
+            item_price INTEGER NOT NULL,
+            item_amount INTEGER NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (invoice_record_id) REFERENCES invoice_records (id)
         )
@@ -82,6 +92,9 @@ def init_invoice_tables():
             invoices_found INTEGER DEFAULT 0,
             invoices_new INTEGER DEFAULT 0,
             invoices_updated INTEGER DEFAULT 0,
+            job_id INTEGER,
+            progress_done INTEGER DEFAULT 0,
+            progress_total INTEGER DEFAULT 0,
             sync_start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             sync_end_time TIMESTAMP,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -100,7 +113,7 @@ class InvoiceCarrier:
     def get_by_user_id(user_id):
         """獲取使用者的所有載具"""
         conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = row_cursor(conn)
         
         cursor.execute('''
             SELECT * FROM invoice_carriers 
@@ -112,30 +125,38 @@ class InvoiceCarrier:
         conn.close()
         
         return [dict(carrier) for carrier in carriers]
-    
+
     @staticmethod
-    def create(user_id, carrier_type, carrier_id, carrier_name=None, verification_code=None):
-        """創建新載具"""
+    def get_all_active():
+        """獲取所有使用者的有效載具（排程同步用）"""
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
+        cursor = row_cursor(conn)
+
         cursor.execute('''
+            SELECT * FROM invoice_carriers
+            WHERE is_active = 1
+            ORDER BY user_id, id
+        ''')
+
+        carriers = cursor.fetchall()
+        conn.close()
+
+        return [dict(carrier) for carrier in carriers]
+
+    @staticmethod
+    def create(user_id, carrier_type, carrier_id, carrier_name=None, verification_code=None):
+        """創建新載具"""
+        return execute_write(lambda conn: conn.execute('''
             INSERT INTO invoice_carriers 
             (user_id, carrier_type, carrier_id, carrier_name, verification_code)
             VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, carrier_type, carrier_id, carrier_name, verification_code))
-        
-        carrier_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return carrier_id
+        ''', (user_id, carrier_type, carrier_id, carrier_name, verification_code)).lastrowid)
     
     @staticmethod
     def get_by_id(carrier_id):
         """根據ID獲取載具"""
         conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = row_cursor(conn)
         
         cursor.execute('SELECT * FROM invoice_carriers WHERE id = ?', (carrier_id,))
         carrier = cursor.fetchone()
@@ -143,11 +164,20 @@ class InvoiceCarrier:
         
         return dict(carrier) if carrier else None
     
+    @staticmethod
+    def mark_synced(carrier_id, synced_date):
+        """同步成功後推進載具的同步水位（查詢範圍的結束日）"""
+        execute_write(lambda conn: conn.execute('''
+            UPDATE invoice_carriers
+            SET last_synced_date = ?, last_sync_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (synced_date.isoformat(), carrier_id)))
+    
     @staticmethod
     def exists(user_id, carrier_type, carrier_id):
         """檢查載具是否已存在"""
         conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = row_cursor(conn)
         
         cursor.execute('''
             SELECT COUNT(*) FROM invoice_carriers 
@@ -162,11 +192,14 @@ class InvoiceCarrier:
 class InvoiceRecord:
     """發票紀錄模型"""
     
+    # 批次查詢時每次 IN (...) 的參數上限（低於 SQLite 預設的變數數量限制）
+    LOOKUP_CHUNK = 500
+    
     @staticmethod
     def get_by_user_id(user_id, page=1, per_page=20, start_date=None, end_date=None, carrier_id=None):
         """獲取使用者的發票紀錄"""
         conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = row_cursor(conn)
         
         # 構建查詢條件
         conditions = ['user_id = ?']
@@ -206,55 +239,62 @@ class InvoiceRecord:
         conn.close()
         
         return {
-            'records': [dict(record) for record in records],
+            'records': [InvoiceRecord.to_dict(record) for record in records],
             'total': total,
             'page': page,
             'per_page': per_page,
             'pages': (total + per_page - 1) // per_page
         }
     
+    @staticmethod
+    def to_dict(record):
+        """發票紀錄序列化，金額由分換回元"""
+        data = dict(record)
+        data['total_amount'] = to_amount(data['total_amount'])
+        data['tax_amount'] = to_amount(data['tax_amount'])
+        return data
+    
+    @staticmethod
+    def payload_hash(invoice_data):
+        """發票原始資料的雜湊（鍵排序後序列化，鍵順序不同視為相同內容；migration 0012 以相同方式回填）"""
+        canonical = json.dumps(invoice_data, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
     @staticmethod
     def create(user_id, carrier_id, invoice_data):
         """創建發票紀錄"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO invoice_records 
-            (user_id, carrier_id, invoice_number, invoice_date, invoice_time,
-             seller_name, seller_id, total_amount, tax_amount, raw_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            user_id, carrier_id, invoice_data['invoice_number'],
-            invoice_data['invoice_date'], invoice_data.get('invoice_time'),
-            invoice_data.get('seller_name'), invoice_data.get('seller_id'),
-            invoice_data['total_amount'], invoice_data.get('tax_amount', 0),
-            json.dumps(invoice_data)
-        ))
-        
-        record_id = cursor.lastrowid
-        
-        # 創建發票明細
-        for item in invoice_data.get('items', []):
-            cursor.execute('''
+        def insert(conn):
+            record_id = conn.execute('''
+                INSERT INTO invoice_records 
+                (user_id, carrier_id, invoice_number, invoice_date, invoice_time,
+                 seller_name, seller_id, total_amount, tax_amount, raw_data, raw_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                user_id, carrier_id, invoice_data['invoice_number'],
+                invoice_data['invoice_date'], invoice_data.get('invoice_time'),
+                invoice_data.get('seller_name'), invoice_data.get('seller_id'),
+                to_cents(invoice_data['total_amount']), to_cents(invoice_data.get('tax_amount', 0)),
+                json.dumps(invoice_data), InvoiceRecord.payload_hash(invoice_data)
+            )).lastrowid
+            
+            # 創建發票明細
+            conn.executemany('''
                 INSERT INTO invoice_items 
                 (invoice_record_id, item_name, item_quantity, item_price, item_amount)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (
+            ''', [(
                 record_id, item['name'], item.get('quantity', 1),
-                item['price'], item['amount']
-            ))
+                to_cents(item['price']), to_cents(item['amount'])
+            ) for item in invoice_data.get('items', [])])
+            return record_id
         
-        conn.commit()
-        conn.close()
-        
-        return record_id
+        return execute_write(insert)
     
     @staticmethod
     def exists_by_number(user_id, invoice_number):
         """檢查發票號碼是否已存在"""
         conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = row_cursor(conn)
         
         cursor.execute('''
             SELECT id FROM invoice_records 
@@ -269,65 +309,148 @@ class InvoiceRecord:
     @staticmethod
     def update(record_id, invoice_data):
         """更新發票紀錄"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        execute_write(lambda conn: conn.execute('''
             UPDATE invoice_records 
             SET seller_name = ?, seller_id = ?, total_amount = ?, 
-                tax_amount = ?, raw_data = ?, updated_at = CURRENT_TIMESTAMP
+                tax_amount = ?, raw_data = ?, raw_hash = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id = ?
         ''', (
             invoice_data.get('seller_name'), invoice_data.get('seller_id'),
-            invoice_data['total_amount'], invoice_data.get('tax_amount', 0),
-            json.dumps(invoice_data), record_id
-        ))
-        
-        conn.commit()
-        conn.close()
+            to_cents(invoice_data['total_amount']), to_cents(invoice_data.get('tax_amount', 0)),
+            json.dumps(invoice_data), InvoiceRecord.payload_hash(invoice_data), record_id
+        )))
+    
+    @staticmethod
+    def upsert_many(user_id, carrier_id, invoices):
+        """批次寫入同步取得的發票，整批在同一個交易中完成
+
+        以 (user_id, invoice_number) 唯一索引 upsert：新發票新增，原始資料雜湊不同的更新
+        （保留原本的 carrier_id 與 is_processed），內容相同的不寫入。有寫入的發票明細整批重建。
+        回傳 {"new": ..., "updated": ..., "unchanged": ...}。
+        """
+        # 同一批內重複的發票號碼以最後一筆為準
+        payloads = {invoice['invoice_number']: invoice for invoice in invoices}
+        hashes = {number: InvoiceRecord.payload_hash(invoice) for number, invoice in payloads.items()}
+        numbers = list(payloads)
+        
+        def lookup(conn, columns):
+            rows = []
+            for start in range(0, len(numbers), InvoiceRecord.LOOKUP_CHUNK):
+                chunk = numbers[start:start + InvoiceRecord.LOOKUP_CHUNK]
+                rows.extend(conn.execute(f'''
+                    SELECT invoice_number, {columns} FROM invoice_records
+                    WHERE user_id = ? AND invoice_number IN ({', '.join('?' * len(chunk))})
+                ''', [user_id] + chunk).fetchall())
+            return {row[0]: row[1] for row in rows}
+        
+        def upsert(conn):
+            existing = lookup(conn, 'raw_hash')
+            changed = [number for number in numbers
+                       if number not in existing or existing[number] != hashes[number]]
+            if not changed:
+                return {"new": 0, "updated": 0, "unchanged": len(numbers)}
+            
+            conn.executemany('''
+                INSERT INTO invoice_records
+                (user_id, carrier_id, invoice_number, invoice_date, invoice_time,
+                 seller_name, seller_id, total_amount, tax_amount, raw_data, raw_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, invoice_number) DO UPDATE SET
+                    invoice_date = excluded.invoice_date, invoice_time = excluded.invoice_time,
+                    seller_name = excluded.seller_name, seller_id = excluded.seller_id,
+                    total_amount = excluded.total_amount, tax_amount = excluded.tax_amount,
+                    raw_data = excluded.raw_data, raw_hash = excluded.raw_hash,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE invoice_records.raw_hash IS NOT excluded.raw_hash
+            ''', [
+                (
+                    user_id, carrier_id, number, payloads[number]['invoice_date'],
+                    payloads[number].get('invoice_time'), payloads[number].get('seller_name'),
+                    payloads[number].get('seller_id'), to_cents(payloads[number]['total_amount']),
+                    to_cents(payloads[number].get('tax_amount', 0)), json.dumps(payloads[number]),
+                    hashes[number]
+                )
+                for number in changed
+            ])
+            
+            # 明細沒有自然鍵，有寫入的發票整批刪除後重建
+            record_ids = lookup(conn, 'id')
+            conn.executemany('DELETE FROM invoice_items WHERE invoice_record_id = ?',
+                             [(record_ids[number],) for number in changed if number in existing])
+            conn.executemany('''
+                INSERT INTO invoice_items 
+                (invoice_record_id, item_name, item_quantity, item_price, item_amount)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [
+                (
+                    record_ids[number], item['name'], item.get('quantity', 1),
+                    to_cents(item['price']), to_cents(item['amount'])
+                )
+                for number in changed
+                for item in payloads[number].get('items', [])
+            ])
+            
+            new = sum(1 for number in changed if number not in existing)
+            return {"new": new, "updated": len(changed) - new, "unchanged": len(numbers) - len(changed)}
+        
+        if not numbers:
+            return {"new": 0, "updated": 0, "unchanged": 0}
+        return execute_write(upsert)
 
 class SyncLog:
     """同步記錄模型"""
     
     @staticmethod
-    def create(user_id, carrier_id, sync_type='manual'):
+    def create(user_id, carrier_id, sync_type='manual', job_id=None):
         """創建同步記錄"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        return execute_write(lambda conn: conn.execute('''
             INSERT INTO sync_logs 
-            (user_id, carrier_id, sync_type, sync_status)
-            VALUES (?, ?, ?, 'running')
-        ''', (user_id, carrier_id, sync_type))
-        
-        log_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return log_id
+            (user_id, carrier_id, sync_type, sync_status, job_id)
+            VALUES (?, ?, ?, 'running', ?)
+        ''', (user_id, carrier_id, sync_type, job_id)).lastrowid)
     
     @staticmethod
     def update(log_id, status, message=None, invoices_found=0, invoices_new=0, invoices_updated=0):
         """更新同步記錄"""
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        execute_write(lambda conn: conn.execute('''
             UPDATE sync_logs 
             SET sync_status = ?, sync_message = ?, invoices_found = ?,
                 invoices_new = ?, invoices_updated = ?, sync_end_time = CURRENT_TIMESTAMP
             WHERE id = ?
-        ''', (status, message, invoices_found, invoices_new, invoices_updated, log_id))
+        ''', (status, message, invoices_found, invoices_new, invoices_updated, log_id)))
+    
+    @staticmethod
+    def update_progress(log_id, done, total):
+        """更新同步進度（已處理 / 總發票數）"""
+        execute_write(lambda conn: conn.execute('''
+            UPDATE sync_logs SET progress_done = ?, progress_total = ?
+            WHERE id = ?
+        ''', (done, total, log_id)))
+    
+    @staticmethod
+    def get_by_job_id(job_id):
+        """獲取同步工作底下各載具的同步記錄"""
+        conn = get_db_connection()
+        cursor = row_cursor(conn)
+        
+        cursor.execute('''
+            SELECT id, carrier_id, sync_status, sync_message, invoices_found, invoices_new,
+                   invoices_updated, progress_done, progress_total, sync_start_time, sync_end_time
+            FROM sync_logs
+            WHERE job_id = ?
+            ORDER BY id
+        ''', (job_id,))
         
-        conn.commit()
+        logs = cursor.fetchall()
         conn.close()
+        
+        return [dict(log) for log in logs]
     
     @staticmethod
     def get_by_user_id(user_id, limit=50):
         """獲取使用者的同步記錄"""
         conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = row_cursor(conn)
         
         cursor.execute('''
             SELECT sl.*, ic.carrier_name, ic.carrier_id as carrier_code
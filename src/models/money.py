@@ -0,0 +1,99 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import total_ordering
+
+
+@total_ordering
+class Money:
+    """金額，內部以最小貨幣單位（分）的整數表示
+
+    資料庫中的金額欄位一律存整數分（見 migration 0010），SUM 等彙總在整數上
+    計算，結果精確且可重現。輸入（JSON、CSV、發票 API）以 Money.parse() 轉成分，
+    輸出時以 float(money) 轉回元，API 的金額格式維持不變。
+    """
+
+    __slots__ = ('cents',)
+
+    MINOR_UNITS = 100
+    _QUANTUM = Decimal('0.01')
+    # SQLite INTEGER 為 64 位元有號整數
+    MAX_CENTS = 2 ** 63 - 1
+
+    def __init__(self, cents=0):
+        self.cents = int(cents)
+
+    @classmethod
+    def parse(cls, value):
+        """由元（字串、int、float 或 Decimal）建立，四捨五入到分；格式錯誤或超出範圍時拋出 ValueError"""
+        if isinstance(value, Money):
+            return value
+        if isinstance(value, bool) or value is None:
+            raise ValueError(f'無效的金額: {value!r}')
+        try:
+            # float 先轉字串，取最短的十進位表示（0.1 而不是 0.1000000000000000055...）
+            amount = Decimal(value if isinstance(value, (int, Decimal)) else str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f'無效的金額: {value!r}')
+        if not amount.is_finite():
+            raise ValueError(f'無效的金額: {value!r}')
+        try:
+            cents = int((amount * cls.MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        except InvalidOperation:
+            # 位數超過 Decimal 精度（例如 1e30）時 quantize 會失敗
+            raise ValueError(f'金額超出範圍: {value!r}')
+        if abs(cents) > cls.MAX_CENTS:
+            raise ValueError(f'金額超出範圍: {value!r}')
+        return cls(cents)
+
+    def to_decimal(self):
+        return (Decimal(self.cents) / self.MINOR_UNITS).quantize(self._QUANTUM)
+
+    def __float__(self):
+        return self.cents / self.MINOR_UNITS
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f'Money({self.to_decimal()})'
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __abs__(self):
+        return Money(abs(self.cents))
+
+
+def to_cents(value):
+    """元 → 分（寫入資料庫前使用），None 保持 None"""
+    return None if value is None else Money.parse(value).cents
+
+
+def to_amount(cents):
+    """分 → 元（序列化為 JSON 時使用），None 保持 None"""
+    return None if cents is None else float(Money(cents))
@@ -0,0 +1,233 @@
+import calendar
+from datetime import date, datetime, timedelta
+from db import execute_write
+from models.money import Money, to_amount
+from models.settlement import Settlement
+from services.statistics_cache import invalidate_statistics
+
+
+class RecurringRule:
+    """週期性交易規則（薪資、房租、訂閱等）
+
+    規則本身存在 recurring_rules（見 migration 0008），到期的發生日由
+    materialise_due() 批次產生為 transactions；同一規則同一天有唯一索引，
+    重跑或重啟都不會重複產生。
+    """
+
+    FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+
+    # 單一規則每次最多補產生的次數，超過的部分留給下一輪
+    MAX_OCCURRENCES_PER_RULE = 366
+
+    def __init__(self, db_connection):
+        self.db = db_connection
+
+    @staticmethod
+    def occurrence_date(start_date, frequency, interval, index):
+        """計算第 index 次發生日（以 start_date 為錨點，月底自動取當月最後一天）"""
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        step = index * interval
+
+        if frequency == 'daily':
+            return (start + timedelta(days=step)).isoformat()
+        if frequency == 'weekly':
+            return (start + timedelta(weeks=step)).isoformat()
+
+        months = step * 12 if frequency == 'yearly' else step
+        year, month = divmod(start.month - 1 + months, 12)
+        year += start.year
+        month += 1
+        day = min(start.day, calendar.monthrange(year, month)[1])
+        return date(year, month, day).isoformat()
+
+    def create_rule(self, user_id, description, amount, category, frequency, start_date,
+                    interval=1, end_date=None, group_id=None):
+        """創建週期性交易規則"""
+        try:
+            if not description or not amount or not category:
+                return {"success": False, "message": "描述、金額和分類都是必填的"}
+
+            if frequency not in self.FREQUENCIES:
+                return {"success": False, "message": f"不支援的週期: {frequency}"}
+
+            amount = Money.parse(amount).cents
+            if amount == 0:
+                return {"success": False, "message": "描述、金額和分類都是必填的"}
+
+            interval = int(interval or 1)
+            if interval < 1 or interval > 365:
+                return {"success": False, "message": "間隔必須介於 1 到 365"}
+
+            try:
+                datetime.strptime(start_date, '%Y-%m-%d')
+                if end_date:
+                    datetime.strptime(end_date, '%Y-%m-%d')
+            except (TypeError, ValueError):
+                return {"success": False, "message": "日期格式錯誤，應為 YYYY-MM-DD"}
+
+            if end_date and end_date < start_date:
+                return {"success": False, "message": "結束日期不能早於開始日期"}
+
+            def insert(conn):
+                cursor = conn.execute('''
+                    INSERT INTO recurring_rules (user_id, group_id, description, amount, category,
+                                                 frequency, interval, start_date, end_date,
+                                                 next_index, next_run_date, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)
+                ''', (user_id, group_id, description, amount, category, frequency, interval,
+                      start_date, end_date or None, start_date, datetime.now(), datetime.now()))
+                return cursor.lastrowid
+
+            rule_id = execute_write(insert, self.db)
+
+            return {
+                "success": True,
+                "message": "週期性交易規則創建成功",
+                "rule_id": rule_id
+            }
+
+        except Exception as e:
+            return {"success": False, "message": f"創建週期性交易規則失敗: {str(e)}"}
+
+    def get_user_rules(self, user_id):
+        """獲取用戶的週期性交易規則"""
+        try:
+            cursor = self.db.cursor()
+            cursor.execute('''
+                SELECT id, group_id, description, amount, category, frequency, interval,
+                       start_date, end_date, next_run_date, is_active, created_at
+                FROM recurring_rules
+                WHERE user_id = ?
+                ORDER BY is_active DESC, next_run_date
+            ''', (user_id,))
+
+            return [
+                {
+                    "id": rule[0],
+                    "group_id": rule[1],
+                    "description": rule[2],
+                    "amount": to_amount(rule[3]),
+                    "category": rule[4],
+                    "frequency": rule[5],
+                    "interval": rule[6],
+                    "start_date": rule[7],
+                    "end_date": rule[8],
+                    "next_run_date": rule[9] if rule[10] else None,
+                    "is_active": bool(rule[10]),
+                    "created_at": rule[11]
+                }
+                for rule in cursor.fetchall()
+            ]
+
+        except Exception as e:
+            return []
+
+    def deactivate_rule(self, rule_id, user_id):
+        """停用週期性交易規則（已產生的交易保留）"""
+        try:
+            def update(conn):
+                return conn.execute('''
+                    UPDATE recurring_rules SET is_active = 0, updated_at = ?
+                    WHERE id = ? AND user_id = ?
+                ''', (datetime.now(), rule_id, user_id)).rowcount
+
+            if execute_write(update, self.db) == 0:
+                return {"success": False, "message": "週期性交易規則不存在"}
+
+            return {"success": True, "message": "週期性交易規則已停用"}
+
+        except Exception as e:
+            return {"success": False, "message": f"停用週期性交易規則失敗: {str(e)}"}
+
+    def materialise_due(self, today=None, batch_size=100, rule_ids=None):
+        """產生所有到期的發生日（含停機期間錯過的），回傳 {"rules": 處理規則數, "created": 新增交易數}
+
+        每輪取出 batch_size 條到期規則，展開到 today 為止的所有發生日，
+        交易以 executemany 一次寫入，規則進度在同一個交易中更新；
+        批次不宜過大，以免長時間佔住寫入佇列。
+        """
+        today = today or date.today().isoformat()
+        totals = {"rules": 0, "created": 0}
+
+        while True:
+            processed = execute_write(
+                lambda conn: self._materialise_batch(conn, today, batch_size, rule_ids), self.db)
+            if not processed['rules']:
+                break
+
+            totals['rules'] += len(processed['rules'])
+            totals['created'] += processed['created']
+            for user_id, group_id in processed['rules']:
+                invalidate_statistics(user_id, [group_id])
+
+        return totals
+
+    def _materialise_batch(self, conn, today, batch_size, rule_ids=None):
+        """在寫入交易中處理一批到期規則"""
+        filters = ''
+        params = [today]
+        if rule_ids:
+            filters = f"AND id IN ({', '.join(['?'] * len(rule_ids))})"
+            params.extend(rule_ids)
+
+        rules = conn.execute(f'''
+            SELECT id, user_id, group_id, description, amount, category,
+                   frequency, interval, start_date, end_date, next_index
+            FROM recurring_rules
+            WHERE is_active = 1 AND next_run_date <= ? {filters}
+            ORDER BY next_run_date, id
+            LIMIT ?
+        ''', params + [batch_size]).fetchall()
+
+        if not rules:
+            return {"rules": [], "created": 0}
+
+        now = datetime.now()
+        rows = []
+        progress = []
+        for (rule_id, user_id, group_id, description, amount, category,
+             frequency, interval, start_date, end_date, index) in rules:
+            transaction_type = 'income' if amount > 0 else 'expense'
+            for _ in range(self.MAX_OCCURRENCES_PER_RULE):
+                occurrence = self.occurrence_date(start_date, frequency, interval, index)
+                if occurrence > today or (end_date and occurrence > end_date):
+                    break
+                rows.append((user_id, group_id, description, amount, category, occurrence,
+                             transaction_type, now, now, rule_id))
+                index += 1
+
+            next_run_date = self.occurrence_date(start_date, frequency, interval, index)
+            is_active = 0 if end_date and next_run_date > end_date else 1
+            progress.append((index, next_run_date, is_active, now, rule_id))
+
+        created = conn.executemany('''
+            INSERT INTO transactions (user_id, group_id, description, amount, category, date, type,
+                                      created_at, updated_at, recurring_rule_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (recurring_rule_id, date) WHERE recurring_rule_id IS NOT NULL DO NOTHING
+        ''', rows).rowcount if rows else 0
+
+        conn.executemany('''
+            UPDATE recurring_rules SET next_index = ?, next_run_date = ?, is_active = ?, updated_at = ?
+            WHERE id = ?
+        ''', progress)
+
+        # 群組支出：新產生的交易由目前的 active 成員平均分攤
+        group_rule_ids = [rule[0] for rule in rules if rule[2] is not None and rule[4] < 0]
+        if group_rule_ids and rows:
+            settlement = Settlement(conn)
+            members = {}
+            unsplit = conn.execute(f'''
+                SELECT t.id, t.group_id, t.user_id, t.amount FROM transactions t
+                WHERE t.recurring_rule_id IN ({', '.join(['?'] * len(group_rule_ids))})
+                  AND t.date >= ?
+                  AND NOT EXISTS (SELECT 1 FROM group_ledger l WHERE l.transaction_id = t.id)
+            ''', group_rule_ids + [min(row[5] for row in rows)]).fetchall()
+            for transaction_id, group_id, payer_id, amount in unsplit:
+                if group_id not in members:
+                    members[group_id] = settlement.get_active_member_ids(group_id)
+                if members[group_id]:
+                    Settlement.add_ledger_entries(conn, group_id, transaction_id, payer_id,
+                                                  Settlement.compute_shares(amount, members[group_id]))
+
+        return {"rules": [(rule[1], rule[2]) for rule in rules], "created": max(created, 0)}
@@ -0,0 +1,95 @@
+import sys
+
+# 由交易表重新計算彙總的 SQL（與觸發器的計算方式一致，migration 0002／0010 各有一份副本）
+_AGGREGATE_SQL = '''
+    SELECT 'user' as owner_type, user_id as owner_id, substr(date, 1, 7) as month, category, type,
+           SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) as income,
+           SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) as expense,
+           COUNT(*) as txn_count
+    FROM transactions
+    GROUP BY user_id, month, category, type
+    UNION ALL
+    SELECT 'group', group_id, substr(date, 1, 7) as month, category, type,
+           SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END),
+           SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END),
+           COUNT(*)
+    FROM transactions
+    WHERE group_id IS NOT NULL
+    GROUP BY group_id, month, category, type
+'''
+
+
+class MonthlyRollup:
+    """每月統計彙總表 (monthly_rollups)
+
+    表與維護用的觸發器由 db/migrations/0002_monthly_rollups.py 建立，
+    交易的新增、修改、刪除都會自動更新對應的彙總列。
+    """
+
+    def __init__(self, db_connection):
+        self.db = db_connection
+
+    def get_monthly_summary(self, owner_type, owner_id, start_month):
+        """獲取從 start_month ('YYYY-MM') 起每月每分類的收支 [(month, category, income, expense)]"""
+        cursor = self.db.cursor()
+        cursor.execute('''
+            SELECT month, category, SUM(income), SUM(expense)
+            FROM monthly_rollups
+            WHERE owner_type = ? AND owner_id = ? AND month >= ?
+            GROUP BY month, category
+        ''', (owner_type, owner_id, start_month))
+        return cursor.fetchall()
+
+    def rebuild(self, commit=True):
+        """清空並由交易表重新計算所有彙總"""
+        cursor = self.db.cursor()
+        cursor.execute('DELETE FROM monthly_rollups')
+        cursor.execute(f'''
+            INSERT INTO monthly_rollups (owner_type, owner_id, month, category, type, income, expense, txn_count)
+            {_AGGREGATE_SQL}
+        ''')
+        if commit:
+            self.db.commit()
+        return cursor.rowcount
+
+    def verify(self):
+        """比對彙總表與交易表，回傳不一致的列 [(key, 預期值, 實際值)]
+
+        金額為整數分，彙總必須與交易表逐位元一致，不容許誤差。
+        """
+        cursor = self.db.cursor()
+        cursor.execute(_AGGREGATE_SQL)
+        expected = {tuple(row[:5]): tuple(row[5:]) for row in cursor.fetchall()}
+
+        cursor.execute('''
+            SELECT owner_type, owner_id, month, category, type, income, expense, txn_count
+            FROM monthly_rollups
+        ''')
+        actual = {tuple(row[:5]): tuple(row[5:]) for row in cursor.fetchall()}
+
+        mismatches = []
+        for key in expected.keys() | actual.keys():
+            want = expected.get(key, (0, 0, 0))
+            got = actual.get(key, (0, 0, 0))
+            if want != got:
+                mismatches.append((key, want, got))
+        return mismatches
+
+
+if __name__ == '__main__':
+    # cd src && python -m models.rollup rebuild|verify
+    from db import get_pool
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    conn = get_pool().acquire()
+    try:
+        rollup = MonthlyRollup(conn)
+        if command == 'rebuild':
+            print(f'已重建 {rollup.rebuild()} 筆彙總')
+        mismatches = rollup.verify()
+        for key, want, got in mismatches:
+            print(f'[不一致] {key}: 預期 {want}，實際 {got}')
+        print('彙總表與交易表一致' if not mismatches else f'共 {len(mismatches)} 筆不一致')
+        sys.exit(1 if mismatches else 0)
+    finally:
+        conn.close()
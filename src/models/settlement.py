@@ -0,0 +1,216 @@
+import heapq
+from datetime import datetime
+from db import execute_write
+from models.money import Money, to_amount
+from services.membership_cache import get_member_role
+
+
+class Settlement:
+    """群組分帳與結算
+
+    群組支出寫入時依分攤方式產生 group_ledger 明細，group_balances 由觸發器
+    增量累計（見 migration 0007），結算時只需讀取每位成員一列的餘額，
+    再以貪婪法配對最大債權人與最大債務人，產生最少筆數的轉帳建議。
+    金額一律為整數分（與資料庫一致），只有 API 輸出時才換回元。
+    """
+
+    SPLIT_TYPES = ('equal', 'percentage', 'exact')
+
+    def __init__(self, db_connection):
+        self.db = db_connection
+
+    @staticmethod
+    def compute_shares(total_cents, participant_ids, split_type='equal', shares=None):
+        """依分攤方式計算每位參與者應負擔的金額（分），回傳 [(user_id, cents)]
+
+        - equal：participant_ids 平均分攤，除不盡的零頭依序分給前面的成員
+        - percentage：shares 為 {user_id: 百分比}，總和須為 100
+        - exact：shares 為 {user_id: 金額（元）}，總和須等於交易金額
+        驗證失敗時拋出 ValueError
+        """
+        total_cents = abs(int(total_cents))
+        if total_cents == 0:
+            raise ValueError('分攤金額不能為 0')
+
+        if split_type == 'equal':
+            participants = list(dict.fromkeys(int(uid) for uid in participant_ids))
+            if not participants:
+                raise ValueError('至少需要一位分攤成員')
+            base, remainder = divmod(total_cents, len(participants))
+            cents = [(uid, base + (1 if index < remainder else 0))
+                     for index, uid in enumerate(participants)]
+
+        elif split_type == 'percentage':
+            if not shares:
+                raise ValueError('請提供各成員的分攤百分比')
+            percents = [(int(uid), float(pct)) for uid, pct in shares.items()]
+            if any(pct < 0 for _, pct in percents):
+                raise ValueError('分攤百分比不能為負數')
+            if abs(sum(pct for _, pct in percents) - 100) > 0.01:
+                raise ValueError('分攤百分比總和必須為 100')
+            # 最大餘數法：先取整數分，剩下的分依小數部分大小補齊
+            pct_total = sum(pct for _, pct in percents)
+            raw = [(uid, total_cents * pct / pct_total) for uid, pct in percents]
+            cents = [(uid, int(amount)) for uid, amount in raw]
+            missing = total_cents - sum(amount for _, amount in cents)
+            order = sorted(range(len(raw)), key=lambda i: raw[i][1] - int(raw[i][1]), reverse=True)
+            for i in order[:missing]:
+                cents[i] = (cents[i][0], cents[i][1] + 1)
+
+        elif split_type == 'exact':
+            if not shares:
+                raise ValueError('請提供各成員的分攤金額')
+            cents = [(int(uid), abs(Money.parse(amount).cents)) for uid, amount in shares.items()]
+            if sum(amount for _, amount in cents) != total_cents:
+                raise ValueError('分攤金額總和必須等於交易金額')
+
+        else:
+            raise ValueError(f'不支援的分攤方式: {split_type}')
+
+        return [(uid, amount) for uid, amount in cents if amount > 0]
+
+    def get_active_member_ids(self, group_id):
+        """獲取群組的 active 成員ID（依加入順序）"""
+        rows = self.db.execute('''
+            SELECT user_id FROM group_members
+            WHERE group_id = ? AND status = 'active'
+            ORDER BY joined_at, user_id
+        ''', (group_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def build_split(self, group_id, amount_cents, split=None):
+        """依請求中的 split 設定（type/participants/shares）計算分攤，預設為全體成員平均分攤"""
+        split = split or {}
+        split_type = split.get('type', 'equal')
+        members = self.get_active_member_ids(group_id)
+
+        if split_type == 'equal':
+            participants = split.get('participants') or members
+            shares = None
+        else:
+            shares = split.get('shares') or {}
+            participants = list(shares)
+
+        outsiders = {int(uid) for uid in participants} - set(members)
+        if outsiders:
+            raise ValueError('分攤成員必須是群組成員')
+
+        return self.compute_shares(amount_cents, participants, split_type, shares)
+
+    @staticmethod
+    def add_ledger_entries(conn, group_id, transaction_id, payer_id, shares, kind='split'):
+        """寫入分攤明細（金額為分，在呼叫端的交易中執行），餘額由觸發器更新"""
+        conn.executemany('''
+            INSERT INTO group_ledger (group_id, transaction_id, payer_id, user_id, amount, kind, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(group_id, transaction_id, payer_id, user_id, amount, kind, datetime.now())
+              for user_id, amount in shares])
+
+    def can_record_payment(self, group_id, recorded_by, from_user_id):
+        """只有付款人本人或群組管理員 (admin) 可以記錄還款"""
+        return recorded_by == from_user_id or get_member_role(self.db, recorded_by, group_id) == 'admin'
+
+    def record_payment(self, group_id, from_user_id, to_user_id, amount, recorded_by):
+        """記錄成員之間的還款，recorded_by 為記錄者的用戶ID（權限見 can_record_payment）"""
+        try:
+            amount = Money.parse(amount).cents
+            if amount <= 0:
+                return {"success": False, "message": "還款金額必須大於 0"}
+            if from_user_id == to_user_id:
+                return {"success": False, "message": "不能付款給自己"}
+
+            if not self.can_record_payment(group_id, recorded_by, from_user_id):
+                return {"success": False, "message": "只有群組管理員可以代其他成員記錄還款"}
+
+            members = set(self.get_active_member_ids(group_id))
+            if from_user_id not in members or to_user_id not in members:
+                return {"success": False, "message": "付款人與收款人都必須是群組成員"}
+
+            def insert(conn):
+                self.add_ledger_entries(conn, group_id, None, from_user_id,
+                                        [(to_user_id, amount)], kind='payment')
+
+            execute_write(insert, self.db)
+
+            return {"success": True, "message": "還款已記錄"}
+
+        except Exception as e:
+            return {"success": False, "message": f"記錄還款失敗: {str(e)}"}
+
+    def get_balances(self, group_id):
+        """讀取群組成員的累計餘額（分），net 為正表示應收、為負表示應付"""
+        rows = self.db.execute('''
+            SELECT b.user_id, u.username, u.full_name, b.paid, b.owed
+            FROM group_balances b
+            JOIN users u ON u.id = b.user_id
+            WHERE b.group_id = ?
+            ORDER BY b.user_id
+        ''', (group_id,)).fetchall()
+        return [
+            {
+                "user_id": row[0],
+                "username": row[1],
+                "full_name": row[2],
+                "paid": row[3],
+                "owed": row[4],
+                "net": row[3] - row[4]
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def minimize_transfers(balances):
+        """貪婪配對最大債權人與最大債務人，產生最少筆數的轉帳建議
+
+        balances 為 {user_id: 淨額（分）}，回傳 [(from_user_id, to_user_id, cents)]
+        """
+        creditors = []
+        debtors = []
+        for user_id, cents in balances.items():
+            if cents > 0:
+                heapq.heappush(creditors, (-cents, user_id))
+            elif cents < 0:
+                heapq.heappush(debtors, (cents, user_id))
+
+        transfers = []
+        while creditors and debtors:
+            credit, creditor = heapq.heappop(creditors)
+            debt, debtor = heapq.heappop(debtors)
+            amount = min(-credit, -debt)
+            transfers.append((debtor, creditor, amount))
+
+            if -credit > amount:
+                heapq.heappush(creditors, (credit + amount, creditor))
+            if -debt > amount:
+                heapq.heappush(debtors, (debt + amount, debtor))
+
+        return transfers
+
+    def get_settlement(self, group_id):
+        """獲取群組的成員餘額與建議轉帳"""
+        try:
+            balances = self.get_balances(group_id)
+            names = {b["user_id"]: b["full_name"] or b["username"] for b in balances}
+            transfers = self.minimize_transfers({b["user_id"]: b["net"] for b in balances})
+
+            return {
+                "success": True,
+                "balances": [
+                    dict(balance, paid=to_amount(balance["paid"]), owed=to_amount(balance["owed"]),
+                         net=to_amount(balance["net"]))
+                    for balance in balances
+                ],
+                "transfers": [
+                    {
+                        "from_user_id": from_user_id,
+                        "from_name": names.get(from_user_id),
+                        "to_user_id": to_user_id,
+                        "to_name": names.get(to_user_id),
+                        "amount": to_amount(amount)
+                    }
+                    for from_user_id, to_user_id, amount in transfers
+                ]
+            }
+
+        except Exception as e:
+            return {"success": False, "message": f"計算結算失敗: {str(e)}"}
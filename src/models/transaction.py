@@ -1,10 +1,15 @@
-from datetime import datetime, timedelta
-import calendar
+from datetime import datetime
+from db import ensure_schema, execute_write
+from db.fts import build_search_query
+from models.money import Money, to_amount, to_cents
+from models.rollup import MonthlyRollup
+from models.settlement import Settlement
+from services.statistics_cache import statistics_cache, invalidate_statistics
 
 class Transaction:
     def __init__(self, db_connection):
         self.db = db_connection
-        self.create_table()
+        ensure_schema('transactions', self.create_table)
     
     def create_table(self):
         """創建交易表"""
@@ -15,7 +20,7 @@ class Transaction:
                 user_id INTEGER NOT NULL,
                 group_id INTEGER,
                 description TEXT NOT NULL,
-                amount REAL NOT NULL,
+                amount INTEGER NOT NULL,
                 category TEXT NOT NULL,
                 date TEXT NOT NULL,
                 type TEXT NOT NULL,
@@ -27,7 +32,7 @@ class Transaction:
         ''')
         self.db.commit()
     
-    def create_transaction(self, user_id, description, amount, category, date=None, group_id=None):
+    def create_transaction(self, user_id, description, amount, category, date=None, group_id=None, split=None):
         """創建交易記錄"""
         try:
             if not description or not amount or not category:
@@ -36,16 +41,33 @@ class Transaction:
             if date is None:
                 date = datetime.now().strftime('%Y-%m-%d')
             
-            transaction_type = 'income' if float(amount) > 0 else 'expense'
-            
-            cursor = self.db.cursor()
-            cursor.execute('''
-                INSERT INTO transactions (user_id, group_id, description, amount, category, date, type, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, group_id, description, float(amount), category, date, transaction_type, datetime.now(), datetime.now()))
-            
-            transaction_id = cursor.lastrowid
-            self.db.commit()
+            try:
+                amount = Money.parse(amount).cents
+            except ValueError as e:
+                return {"success": False, "message": str(e)}
+            
+            transaction_type = 'income' if amount > 0 else 'expense'
+            
+            # 群組支出依 split 設定分攤（預設全體成員平均分攤）
+            shares = []
+            if group_id and amount < 0:
+                try:
+                    shares = Settlement(self.db).build_split(group_id, amount, split)
+                except (TypeError, ValueError) as e:
+                    return {"success": False, "message": str(e)}
+            
+            def insert(conn):
+                cursor = conn.execute('''
+                    INSERT INTO transactions (user_id, group_id, description, amount, category, date, type, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, group_id, description, amount, category, date, transaction_type, datetime.now(), datetime.now()))
+                if shares:
+                    Settlement.add_ledger_entries(conn, group_id, cursor.lastrowid, user_id, shares)
+                return cursor.lastrowid
+            
+            # 交由寫入佇列執行，避免並發寫入互相鎖住
+            transaction_id = execute_write(insert, self.db)
+            invalidate_statistics(user_id, [group_id])
             
             # 獲取創建的交易記錄
             created_transaction = self.get_transaction_by_id(transaction_id)
@@ -83,7 +105,7 @@ class Transaction:
                 "user_id": transaction[1],
                 "group_id": transaction[2],
                 "描述": transaction[3],  # 保持中文欄位名稱以兼容前端
-                "金額": transaction[4],
+                "金額": to_amount(transaction[4]),
                 "category": transaction[5],
                 "日期": transaction[6],
                 "type": transaction[7],
@@ -97,6 +119,12 @@ class Transaction:
         except Exception as e:
             return None
     
+    def _get_owner(self, transaction_id):
+        """獲取交易的 (user_id, group_id)，用於清除統計快取"""
+        cursor = self.db.cursor()
+        cursor.execute('SELECT user_id, group_id FROM transactions WHERE id = ?', (transaction_id,))
+        return cursor.fetchone()
+    
     def get_user_transactions(self, user_id, page=1, per_page=20):
         """獲取用戶的交易記錄"""
         try:
@@ -130,7 +158,7 @@ class Transaction:
                         "user_id": t[1],
                         "group_id": t[2],
                         "描述": t[3],  # 保持中文欄位名稱
-                        "金額": t[4],
+                        "金額": to_amount(t[4]),
                         "category": t[5],
                         "日期": t[6],
                         "type": t[7],
@@ -183,7 +211,7 @@ class Transaction:
                         "user_id": t[1],
                         "group_id": t[2],
                         "描述": t[3],
-                        "金額": t[4],
+                        "金額": to_amount(t[4]),
                         "category": t[5],
                         "日期": t[6],
                         "type": t[7],
@@ -203,6 +231,82 @@ class Transaction:
         except Exception as e:
             return {"transactions": [], "total": 0, "current_page": 1, "pages": 0}
     
+    def search_transactions(self, query, user_id=None, group_id=None, category=None,
+                            min_amount=None, max_amount=None, start_date=None, end_date=None, limit=50):
+        """全文搜尋交易描述，依相關度排序
+
+        user_id/group_id 決定搜尋範圍（在全文索引內過濾）；
+        min_amount/max_amount 以金額絕對值比較。
+        """
+        try:
+            search = build_search_query(query or '')
+            if not search:
+                return {"success": False, "message": "請輸入搜尋關鍵字"}
+            match, like_patterns = search
+            
+            scope = f'<g{int(group_id)}>' if group_id else f'<u{int(user_id)}>'
+            conditions = ['transactions_fts MATCH ?']
+            params = [f'scope : "{scope}"' + (f' AND description : ({match})' if match else '')]
+            for pattern in like_patterns:
+                # 比對 transactions 的欄位：trigram 表上少於 3 個 CJK 字元的 LIKE 找不到資料
+                conditions.append("t.description LIKE ? ESCAPE '\\'")
+                params.append(pattern)
+            
+            if category:
+                conditions.append('t.category = ?')
+                params.append(category)
+            if min_amount is not None:
+                conditions.append('ABS(t.amount) >= ?')
+                params.append(to_cents(min_amount))
+            if max_amount is not None:
+                conditions.append('ABS(t.amount) <= ?')
+                params.append(to_cents(max_amount))
+            if start_date:
+                conditions.append('t.date >= ?')
+                params.append(start_date)
+            if end_date:
+                conditions.append('t.date <= ?')
+                params.append(end_date)
+            
+            cursor = self.db.cursor()
+            cursor.execute(f'''
+                SELECT t.id, t.user_id, t.group_id, t.description, t.amount, t.category,
+                       t.date, t.type, t.created_at, t.updated_at,
+                       u.full_name as user_name, u.username,
+                       bm25(transactions_fts) as rank
+                FROM transactions_fts
+                JOIN transactions t ON t.id = transactions_fts.rowid
+                LEFT JOIN users u ON t.user_id = u.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY rank, t.date DESC
+                LIMIT ?
+            ''', params + [limit])
+            
+            return {
+                "success": True,
+                "transactions": [
+                    {
+                        "id": t[0],
+                        "user_id": t[1],
+                        "group_id": t[2],
+                        "description": t[3],
+                        "amount": to_amount(t[4]),
+                        "category": t[5],
+                        "date": t[6],
+                        "type": t[7],
+                        "created_at": t[8],
+                        "updated_at": t[9],
+                        "user_name": t[10],
+                        "username": t[11],
+                        "score": -t[12]
+                    }
+                    for t in cursor.fetchall()
+                ]
+            }
+            
+        except Exception as e:
+            return {"success": False, "message": f"搜尋交易失敗: {str(e)}"}
+    
     def update_transaction(self, transaction_id, **kwargs):
         """更新交易記錄"""
         try:
@@ -214,7 +318,8 @@ class Transaction:
                 if field in allowed_fields and value is not None:
                     if field == 'amount':
                         # 根據金額更新類型
-                        transaction_type = 'income' if float(value) > 0 else 'expense'
+                        value = Money.parse(value).cents
+                        transaction_type = 'income' if value > 0 else 'expense'
                         update_fields.append("type = ?")
                         values.append(transaction_type)
                     
@@ -227,16 +332,21 @@ class Transaction:
             values.append(datetime.now())
             values.append(transaction_id)
             
-            cursor = self.db.cursor()
-            cursor.execute(f'''
-                UPDATE transactions 
-                SET {', '.join(update_fields)}, updated_at = ?
-                WHERE id = ?
-            ''', values)
+            owner = self._get_owner(transaction_id)
+            
+            def update(conn):
+                return conn.execute(f'''
+                    UPDATE transactions 
+                    SET {', '.join(update_fields)}, updated_at = ?
+                    WHERE id = ?
+                ''', values).rowcount
             
-            self.db.commit()
+            updated = execute_write(update, self.db)
             
-            if cursor.rowcount > 0:
+            if owner:
+                invalidate_statistics(owner[0], [owner[1], kwargs.get('group_id')])
+            
+            if updated > 0:
                 updated_transaction = self.get_transaction_by_id(transaction_id)
                 return {
                     "success": True, 
@@ -252,11 +362,17 @@ class Transaction:
     def delete_transaction(self, transaction_id):
         """刪除交易記錄"""
         try:
-            cursor = self.db.cursor()
-            cursor.execute('DELETE FROM transactions WHERE id = ?', (transaction_id,))
-            self.db.commit()
+            owner = self._get_owner(transaction_id)
+            
+            deleted = execute_write(
+                lambda conn: conn.execute('DELETE FROM transactions WHERE id = ?', (transaction_id,)).rowcount,
+                self.db
+            )
+            
+            if owner:
+                invalidate_statistics(owner[0], [owner[1]])
             
-            if cursor.rowcount > 0:
+            if deleted > 0:
                 return {"success": True, "message": "交易記錄刪除成功"}
             else:
                 return {"success": False, "message": "交易記錄不存在"}
@@ -264,70 +380,76 @@ class Transaction:
         except Exception as e:
             return {"success": False, "message": f"刪除交易記錄失敗: {str(e)}"}
     
+    @staticmethod
+    def month_window(months, today=None):
+        """回傳最近 months 個日曆月份的 'YYYY-MM' 列表（由舊到新）"""
+        today = today or datetime.now().date()
+        year, month = today.year, today.month
+        keys = []
+        for _ in range(months):
+            keys.append(f'{year:04d}-{month:02d}')
+            month -= 1
+            if month == 0:
+                year -= 1
+                month = 12
+        keys.reverse()
+        return keys
+    
+    def _aggregate_statistics(self, owner_type, owner_id, months):
+        """由每月彙總表計算總收支、支出分類與月度趨勢（成本與交易筆數無關）
+
+        彙總在整數分上進行，只在輸出時換回元，結果與交易明細逐筆加總完全一致。
+        """
+        month_keys = self.month_window(months)
+        start_date = f'{month_keys[0]}-01'
+        
+        rows = MonthlyRollup(self.db).get_monthly_summary(owner_type, owner_id, month_keys[0])
+        
+        total_income = 0
+        total_expense = 0
+        categories = {}
+        monthly = {key: [0, 0] for key in month_keys}
+        
+        for month, category, income, expense in rows:
+            income = income or 0
+            expense = expense or 0
+            total_income += income
+            total_expense += expense
+            if expense:
+                categories[category] = categories.get(category, 0) + expense
+            if month in monthly:
+                monthly[month][0] += income
+                monthly[month][1] += expense
+        
+        return {
+            "total_income": to_amount(total_income),
+            "total_expense": to_amount(total_expense),
+            "balance": to_amount(total_income - total_expense),
+            "categories": [
+                {"name": name, "amount": to_amount(amount)}
+                for name, amount in sorted(categories.items(), key=lambda item: item[1], reverse=True)
+            ],
+            "monthly_trends": [
+                {
+                    "month": key,
+                    "income": to_amount(monthly[key][0]),
+                    "expense": to_amount(monthly[key][1]),
+                    "balance": to_amount(monthly[key][0] - monthly[key][1])
+                }
+                for key in month_keys
+            ]
+        }, start_date
+    
     def get_user_statistics(self, user_id, months=6):
         """獲取用戶統計數據"""
         try:
-            cursor = self.db.cursor()
-            
-            # 計算日期範圍
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=months * 30)
-            
-            # 總收支統計
-            cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) as total_income,
-                    SUM(CASE WHEN amount < 0 THEN ABS(amount) ELSE 0 END) as total_expense,
-                    SUM(amount) as balance
-                FROM transactions 
-                WHERE user_id = ? AND date >= ?
-            ''', (user_id, start_date.strftime('%Y-%m-%d')))
-            
-            totals = cursor.fetchone()
-            
-            # 分類統計
-            cursor.execute('''
-                SELECT category, SUM(ABS(amount)) as total
-                FROM transactions 
-                WHERE user_id = ? AND amount < 0 AND date >= ?
-                GROUP BY category
-                ORDER BY total DESC
-            ''', (user_id, start_date.strftime('%Y-%m-%d')))
-            
-            categories = cursor.fetchall()
-            
-            # 月度趨勢
-            monthly_stats = []
-            for i in range(months):
-                month_start = datetime(end_date.year, end_date.month, 1) - timedelta(days=i*30)
-                month_end = month_start + timedelta(days=calendar.monthrange(month_start.year, month_start.month)[1] - 1)
-                
-                cursor.execute('''
-                    SELECT 
-                        SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) as income,
-                        SUM(CASE WHEN amount < 0 THEN ABS(amount) ELSE 0 END) as expense
-                    FROM transactions 
-                    WHERE user_id = ? AND date >= ? AND date <= ?
-                ''', (user_id, month_start.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d')))
-                
-                month_data = cursor.fetchone()
-                monthly_stats.append({
-                    "month": month_start.strftime('%Y-%m'),
-                    "income": month_data[0] or 0,
-                    "expense": month_data[1] or 0,
-                    "balance": (month_data[0] or 0) - (month_data[1] or 0)
-                })
+            cached = statistics_cache.get('user', user_id, months)
+            if cached is not None:
+                return cached
             
-            return {
-                "total_income": totals[0] or 0,
-                "total_expense": totals[1] or 0,
-                "balance": totals[2] or 0,
-                "categories": [
-                    {"name": cat[0], "amount": cat[1]}
-                    for cat in categories
-                ],
-                "monthly_trends": list(reversed(monthly_stats))
-            }
+            stats, _ = self._aggregate_statistics('user', user_id, months)
+            statistics_cache.set('user', user_id, months, stats)
+            return stats
             
         except Exception as e:
             return {
@@ -341,69 +463,47 @@ class Transaction:
     def get_group_statistics(self, group_id, months=6):
         """獲取群組統計數據"""
         try:
-            cursor = self.db.cursor()
+            cached = statistics_cache.get('group', group_id, months)
+            if cached is not None:
+                return cached
             
-            # 計算日期範圍
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=months * 30)
-            
-            # 總收支統計
-            cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) as total_income,
-                    SUM(CASE WHEN amount < 0 THEN ABS(amount) ELSE 0 END) as total_expense,
-                    SUM(amount) as balance
-                FROM transactions 
-                WHERE group_id = ? AND date >= ?
-            ''', (group_id, start_date.strftime('%Y-%m-%d')))
-            
-            totals = cursor.fetchone()
+            stats, start_date = self._aggregate_statistics('group', group_id, months)
             
             # 成員貢獻統計
+            cursor = self.db.cursor()
             cursor.execute('''
                 SELECT u.full_name, u.username,
                        SUM(CASE WHEN t.amount > 0 THEN t.amount ELSE 0 END) as income,
-                       SUM(CASE WHEN t.amount < 0 THEN ABS(t.amount) ELSE 0 END) as expense,
+                       SUM(CASE WHEN t.amount < 0 THEN -t.amount ELSE 0 END) as expense,
                        COUNT(*) as transaction_count
                 FROM transactions t
                 JOIN users u ON t.user_id = u.id
                 WHERE t.group_id = ? AND t.date >= ?
                 GROUP BY t.user_id, u.full_name, u.username
                 ORDER BY (income + expense) DESC
-            ''', (group_id, start_date.strftime('%Y-%m-%d')))
+            ''', (group_id, start_date))
             
             members = cursor.fetchall()
             
-            # 分類統計
-            cursor.execute('''
-                SELECT category, SUM(ABS(amount)) as total
-                FROM transactions 
-                WHERE group_id = ? AND amount < 0 AND date >= ?
-                GROUP BY category
-                ORDER BY total DESC
-            ''', (group_id, start_date.strftime('%Y-%m-%d')))
-            
-            categories = cursor.fetchall()
-            
-            return {
-                "total_income": totals[0] or 0,
-                "total_expense": totals[1] or 0,
-                "balance": totals[2] or 0,
+            group_stats = {
+                "total_income": stats["total_income"],
+                "total_expense": stats["total_expense"],
+                "balance": stats["balance"],
                 "member_contributions": [
                     {
                         "name": member[0],
                         "username": member[1],
-                        "income": member[2] or 0,
-                        "expense": member[3] or 0,
+                        "income": to_amount(member[2] or 0),
+                        "expense": to_amount(member[3] or 0),
                         "transaction_count": member[4]
                     }
                     for member in members
                 ],
-                "categories": [
-                    {"name": cat[0], "amount": cat[1]}
-                    for cat in categories
-                ]
+                "categories": stats["categories"],
+                "monthly_trends": stats["monthly_trends"]
             }
+            statistics_cache.set('group', group_id, months, group_stats)
+            return group_stats
             
         except Exception as e:
             return {
@@ -411,6 +511,6 @@ class Transaction:
                 "total_expense": 0,
                 "balance": 0,
                 "member_contributions": [],
-                "categories": []
+                "categories": [],
+                "monthly_trends": []
             }
-
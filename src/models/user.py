@@ -2,11 +2,12 @@ import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 import re
 from datetime import datetime
+from db import ensure_schema, execute_write
 
 class User:
     def __init__(self, db_connection):
         self.db = db_connection
-        self.create_table()
+        ensure_schema('users', self.create_table)
     
     def create_table(self):
         """創建用戶表"""
@@ -71,13 +72,10 @@ class User:
             
             # 創建用戶
             password_hash = generate_password_hash(password)
-            cursor.execute('''
+            user_id = execute_write(lambda conn: conn.execute('''
                 INSERT INTO users (username, email, full_name, password_hash, phone, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (username, email, full_name, password_hash, phone, datetime.now(), datetime.now()))
-            
-            user_id = cursor.lastrowid
-            self.db.commit()
+            ''', (username, email, full_name, password_hash, phone, datetime.now(), datetime.now())).lastrowid, self.db)
             
             return {
                 "success": True, 
@@ -107,9 +105,8 @@ class User:
                 return {"success": False, "message": "密碼錯誤"}
             
             # 更新最後登入時間
-            cursor.execute('UPDATE users SET last_login = ? WHERE id = ?', 
-                         (datetime.now(), user[0]))
-            self.db.commit()
+            execute_write(lambda conn: conn.execute('UPDATE users SET last_login = ? WHERE id = ?',
+                                                    (datetime.now(), user[0])), self.db)
             
             return {
                 "success": True,
@@ -190,17 +187,49 @@ class User:
             # 獲取用戶信息失敗
             return None
     
+    # trigram 分詞器至少需要 3 個字元才能走索引
+    TRIGRAM_MIN_LENGTH = 3
+
+    @staticmethod
+    def _trigram_phrase(text, column=None):
+        """把查詢字串包成 FTS5 片語，避免使用者輸入被當成查詢語法"""
+        phrase = '"' + text.replace('"', '""') + '"'
+        return f'{column} : {phrase}' if column else phrase
+
+    @staticmethod
+    def _prefix_pattern(text):
+        """姓名開頭比對用的 LIKE 樣式（跳脫 % 與 _），配合 idx_users_full_name_nocase 走索引"""
+        return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
     def search_users_by_name(self, name_query, limit=10):
-        """根據姓名搜索用戶"""
+        """根據姓名搜索用戶
+
+        3 個字元以上的關鍵字以 trigram 索引比對姓名中的任一位置；
+        較短的關鍵字 trigram 無法查詢，改以索引比對姓名開頭（不分大小寫）。
+        """
         try:
+            name_query = (name_query or '').strip()
+            if not name_query:
+                return []
+
             cursor = self.db.cursor()
-            cursor.execute('''
-                SELECT id, username, full_name, email, avatar_url
-                FROM users 
-                WHERE full_name LIKE ? AND is_active = 1
-                ORDER BY full_name
-                LIMIT ?
-            ''', (f'%{name_query}%', limit))
+            if len(name_query) >= self.TRIGRAM_MIN_LENGTH:
+                cursor.execute('''
+                    SELECT u.id, u.username, u.full_name, u.email, u.avatar_url
+                    FROM users_fts
+                    JOIN users u ON u.id = users_fts.rowid
+                    WHERE users_fts MATCH ? AND u.is_active = 1
+                    ORDER BY u.full_name
+                    LIMIT ?
+                ''', (self._trigram_phrase(name_query, 'full_name'), limit))
+            else:
+                cursor.execute('''
+                    SELECT id, username, full_name, email, avatar_url
+                    FROM users 
+                    WHERE full_name LIKE ? ESCAPE '\\' AND is_active = 1
+                    ORDER BY full_name
+                    LIMIT ?
+                ''', (self._prefix_pattern(name_query), limit))
             
             users = cursor.fetchall()
             return [
@@ -217,6 +246,64 @@ class User:
         except Exception as e:
             # 搜索用戶失敗
             return []
+
+    def resolve_users_by_names(self, names):
+        """以單一查詢批次解析姓名 -> 用戶
+
+        完全相符優先，其次為姓名包含該字串（少於 3 個字元時為以該字串開頭）的最早註冊用戶。
+        """
+        try:
+            wanted = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+            if not wanted:
+                return {}
+
+            long_names = [n for n in wanted if len(n) >= self.TRIGRAM_MIN_LENGTH]
+            short_names = [n for n in wanted if len(n) < self.TRIGRAM_MIN_LENGTH]
+
+            ctes, selects, params = [], [], []
+            if long_names:
+                ctes.append('long_names(name, pattern) AS (VALUES '
+                            + ', '.join(['(?, ?)'] * len(long_names)) + ')')
+                for n in long_names:
+                    params.extend([n, self._trigram_phrase(n, 'full_name')])
+                selects.append('''
+                    SELECT w.name, u.id, u.full_name, u.username
+                    FROM long_names w
+                    JOIN users_fts ON users_fts MATCH w.pattern
+                    JOIN users u ON u.id = users_fts.rowid
+                    WHERE u.is_active = 1
+                ''')
+            if short_names:
+                ctes.append('short_names(name) AS (VALUES '
+                            + ', '.join(['(?)'] * len(short_names)) + ')')
+                params.extend(short_names)
+                # 過短的姓名無法使用 trigram 索引，以姓名開頭的範圍查詢走 NOCASE 索引
+                selects.append('''
+                    SELECT w.name, u.id, u.full_name, u.username
+                    FROM short_names w
+                    JOIN users u ON u.full_name COLLATE NOCASE >= w.name
+                                AND u.full_name COLLATE NOCASE < w.name || char(1114111)
+                    WHERE u.is_active = 1
+                ''')
+
+            cursor = self.db.cursor()
+            cursor.execute('WITH ' + ', '.join(ctes) + ' UNION ALL '.join(selects), params)
+
+            resolved = {}
+            for name, user_id, full_name, username in cursor.fetchall():
+                rank = (full_name != name, user_id)
+                current = resolved.get(name)
+                if current is None or rank < current[0]:
+                    resolved[name] = (rank, {
+                        "id": user_id,
+                        "full_name": full_name,
+                        "username": username
+                    })
+            return {name: user for name, (rank, user) in resolved.items()}
+
+        except Exception as e:
+            # 批次解析用戶失敗
+            return {}
     
     def update_user_profile(self, user_id, **kwargs):
         """更新用戶資料"""
@@ -236,16 +323,13 @@ class User:
             values.append(datetime.now())
             values.append(user_id)
             
-            cursor = self.db.cursor()
-            cursor.execute(f'''
+            updated = execute_write(lambda conn: conn.execute(f'''
                 UPDATE users 
                 SET {', '.join(update_fields)}, updated_at = ?
                 WHERE id = ?
-            ''', values)
+            ''', values).rowcount, self.db)
             
-            self.db.commit()
-            
-            if cursor.rowcount > 0:
+            if updated > 0:
                 return {
                     "success": True, 
                     "message": "用戶資料更新成功",
@@ -275,13 +359,11 @@ class User:
             
             # 更新密碼
             new_password_hash = generate_password_hash(new_password)
-            cursor.execute('''
+            execute_write(lambda conn: conn.execute('''
                 UPDATE users 
                 SET password_hash = ?, updated_at = ?
                 WHERE id = ?
-            ''', (new_password_hash, datetime.now(), user_id))
-            
-            self.db.commit()
+            ''', (new_password_hash, datetime.now(), user_id)), self.db)
             
             return {"success": True, "message": "密碼修改成功"}
             
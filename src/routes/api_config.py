@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify, session
-from services.real_invoice_service import RealInvoiceService
+from services.real_invoice_service import real_invoice_service
 
 api_config_bp = Blueprint('api_config', __name__)
 
@@ -25,7 +25,6 @@ def set_api_credentials():
             }), 400
         
         # 設定 API 憑證
-        from routes.invoice import real_invoice_service
         real_invoice_service.set_real_api_credentials(
             data['app_id'], 
             data['api_key']
@@ -55,7 +54,6 @@ def enable_test_mode():
             }), 401
         
         # 啟用測試模式
-        from routes.invoice import real_invoice_service
         real_invoice_service.enable_test_mode()
         
         return jsonify({
@@ -82,7 +80,6 @@ def disable_test_mode():
             }), 401
         
         # 停用測試模式
-        from routes.invoice import real_invoice_service
         real_invoice_service.disable_test_mode()
         
         return jsonify({
@@ -109,8 +106,6 @@ def get_api_status():
             }), 401
         
         # 獲取 API 狀態
-        from routes.invoice import real_invoice_service
-        
         return jsonify({
             'success': True,
             'data': {
@@ -119,7 +114,8 @@ def get_api_status():
                     real_invoice_service.app_id != "YOUR_APP_ID" and 
                     real_invoice_service.api_key != "YOUR_API_KEY"
                 ),
-                'app_id_set': real_invoice_service.app_id != "YOUR_APP_ID"
+                'app_id_set': real_invoice_service.app_id != "YOUR_APP_ID",
+                'http': real_invoice_service.http.metrics.get_stats()
             }
         })
         
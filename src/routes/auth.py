@@ -1,15 +1,9 @@
 from flask import Blueprint, request, jsonify, session
 from models.user import User
-import sqlite3
-import os
+from db import execute_write, get_db_connection
 
 auth_bp = Blueprint('auth', __name__)
 
-def get_db_connection():
-    """獲取資料庫連接"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database.db')
-    return sqlite3.connect(db_path)
-
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """用戶註冊"""
@@ -43,19 +37,12 @@ def register():
                 # 為新用戶創建預設分類
                 user_id = result['user_id']
                 default_categories = ['餐飲', '交通', '購物', '娛樂', '薪資', '投資']
-                cursor = db.cursor()
-                
-                for category_name in default_categories:
-                    try:
-                        cursor.execute('''
-                            INSERT INTO user_categories (user_id, name, is_default)
-                            VALUES (?, ?, 1)
-                        ''', (user_id, category_name))
-                    except sqlite3.IntegrityError:
-                        # 分類已存在，跳過
-                        pass
                 
-                db.commit()
+                # 分類已存在則跳過
+                execute_write(lambda conn: conn.executemany('''
+                    INSERT OR IGNORE INTO user_categories (user_id, name, is_default)
+                    VALUES (?, ?, 1)
+                ''', [(user_id, category_name) for category_name in default_categories]), db)
             except Exception as e:
                 import traceback
                 traceback.print_exc()
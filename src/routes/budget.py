@@ -0,0 +1,199 @@
+from flask import Blueprint, request, jsonify, session
+from db import get_db_connection
+from models.budget import Budget
+from models.money import Money
+from services.membership_cache import get_member_role
+
+budget_bp = Blueprint('budget', __name__)
+
+def require_login():
+    """檢查登入狀態"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+    return user_id
+
+def resolve_owner(db, user_id, group_id, manage=False):
+    """解析預算擁有者，回傳 ((owner_type, owner_id), None) 或 (None, (錯誤回應, 狀態碼))
+
+    群組預算：成員可查看，只有管理員可以建立、修改或刪除。
+    """
+    if group_id in (None, ''):
+        return ('user', user_id), None
+
+    try:
+        group_id = int(group_id)
+    except (TypeError, ValueError):
+        return None, ({'success': False, 'message': '無效的群組ID'}, 400)
+
+    role = get_member_role(db, user_id, group_id)
+    if role is None:
+        return None, ({'success': False, 'message': '您不是該群組成員'}, 403)
+    if manage and role != 'admin':
+        return None, ({'success': False, 'message': '只有群組管理員可以管理群組預算'}, 403)
+
+    return ('group', group_id), None
+
+def resolve_budget(db, user_id, budget_id):
+    """確認用戶可以管理指定預算，回傳 None 或 (錯誤回應, 狀態碼)"""
+    owner = Budget(db).get_budget_owner(budget_id)
+    if owner is None:
+        return {'success': False, 'message': '預算不存在'}, 404
+
+    owner_type, owner_id = owner
+    if owner_type == 'user':
+        if owner_id != user_id:
+            return {'success': False, 'message': '預算不存在'}, 404
+        return None
+
+    _, error = resolve_owner(db, user_id, owner_id, manage=True)
+    return error
+
+@budget_bp.route('/budgets', methods=['GET'])
+def get_budgets():
+    """獲取預算列表（帶 group_id 時為群組預算）"""
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False,
+            "message": "請先登入"
+        }), 401
+
+    db = get_db_connection()
+    owner, error = resolve_owner(db, user_id, request.args.get('group_id'))
+    if error:
+        db.close()
+        return jsonify(error[0]), error[1]
+
+    budgets = Budget(db).get_budgets(*owner)
+    db.close()
+
+    return jsonify({
+        "success": True,
+        "budgets": budgets
+    }), 200
+
+@budget_bp.route('/budgets/status', methods=['GET'])
+def get_budget_status():
+    """獲取預算在目前期間的花費、剩餘金額與消耗速度"""
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False,
+            "message": "請先登入"
+        }), 401
+
+    db = get_db_connection()
+    owner, error = resolve_owner(db, user_id, request.args.get('group_id'))
+    if error:
+        db.close()
+        return jsonify(error[0]), error[1]
+
+    result = Budget(db).get_status(*owner)
+    db.close()
+
+    if result['success']:
+        return jsonify(result), 200
+    else:
+        return jsonify(result), 500
+
+@budget_bp.route('/budgets', methods=['POST'])
+def create_budget():
+    """建立預算"""
+    try:
+        user_id = require_login()
+        if not user_id:
+            return jsonify({
+                "success": False,
+                "message": "請先登入"
+            }), 401
+
+        data = request.get_json(silent=True) or {}
+
+        for field in ['amount', 'period']:
+            if data.get(field) in (None, ''):
+                return jsonify({'success': False, 'message': f'Missing field: {field}'}), 400
+
+        try:
+            amount = Money.parse(data['amount'])
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': '金額格式錯誤'}), 400
+
+        db = get_db_connection()
+        owner, error = resolve_owner(db, user_id, data.get('group_id'), manage=True)
+        if error:
+            db.close()
+            return jsonify(error[0]), error[1]
+
+        result = Budget(db).create_budget(
+            owner_type=owner[0],
+            owner_id=owner[1],
+            amount=amount,
+            period=data['period'],
+            created_by=user_id,
+            category=data.get('category'),
+            start_date=data.get('start_date'),
+            end_date=data.get('end_date')
+        )
+        db.close()
+
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"建立預算失敗: {str(e)}"
+        }), 500
+
+@budget_bp.route('/budgets/<int:budget_id>', methods=['PUT'])
+def update_budget(budget_id):
+    """更新預算金額或結束日期"""
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False,
+            "message": "請先登入"
+        }), 401
+
+    data = request.get_json(silent=True) or {}
+
+    db = get_db_connection()
+    error = resolve_budget(db, user_id, budget_id)
+    if error:
+        db.close()
+        return jsonify(error[0]), error[1]
+
+    result = Budget(db).update_budget(budget_id, amount=data.get('amount'), end_date=data.get('end_date'))
+    db.close()
+
+    if result['success']:
+        return jsonify(result), 200
+    else:
+        return jsonify(result), 400
+
+@budget_bp.route('/budgets/<int:budget_id>', methods=['DELETE'])
+def delete_budget(budget_id):
+    """刪除預算"""
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False,
+            "message": "請先登入"
+        }), 401
+
+    db = get_db_connection()
+    error = resolve_budget(db, user_id, budget_id)
+    if error:
+        db.close()
+        return jsonify(error[0]), error[1]
+
+    result = Budget(db).delete_budget(budget_id)
+    db.close()
+
+    if result['success']:
+        return jsonify(result), 200
+    else:
+        return jsonify(result), 404
@@ -1,8 +1,7 @@
 from flask import Blueprint, request, jsonify, session
 from google.oauth2 import id_token
 from google.auth.transport import requests
-import sqlite3
-import os
+from db import execute_write, get_db_connection
 from datetime import datetime
 
 google_auth_bp = Blueprint('google_auth', __name__)
@@ -10,11 +9,6 @@ google_auth_bp = Blueprint('google_auth', __name__)
 # Google OAuth 配置
 GOOGLE_CLIENT_ID = "YOUR_GOOGLE_CLIENT_ID"  # 需要從Google Console獲取
 
-def get_db_connection():
-    """獲取資料庫連接"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database.db')
-    return sqlite3.connect(db_path)
-
 def create_or_get_google_user(google_user_info):
     """創建或獲取Google用戶"""
     try:
@@ -32,9 +26,8 @@ def create_or_get_google_user(google_user_info):
         
         if existing_user:
             # 更新最後登入時間
-            cursor.execute('UPDATE users SET last_login = ? WHERE id = ?', 
-                         (datetime.now(), existing_user[0]))
-            db.commit()
+            execute_write(lambda conn: conn.execute('UPDATE users SET last_login = ? WHERE id = ?',
+                                                    (datetime.now(), existing_user[0])), db)
             db.close()
             
             return {
@@ -61,26 +54,23 @@ def create_or_get_google_user(google_user_info):
                 username = f"{original_username}{counter}"
                 counter += 1
             
-            # 插入新用戶
-            cursor.execute('''
-                INSERT INTO users (username, email, full_name, password_hash, avatar_url, is_active, email_verified, created_at, updated_at, last_login)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (username, email, name, 'GOOGLE_AUTH', picture, 1, 1, datetime.now(), datetime.now(), datetime.now()))
-            
-            user_id = cursor.lastrowid
-            
-            # 為新用戶創建預設分類
             default_categories = ['餐飲', '交通', '購物', '娛樂', '薪資', '投資', '載具']
-            for category_name in default_categories:
-                try:
-                    cursor.execute('''
-                        INSERT INTO user_categories (user_id, name, is_default)
-                        VALUES (?, ?, 1)
-                    ''', (user_id, category_name))
-                except sqlite3.IntegrityError:
-                    pass
             
-            db.commit()
+            def insert(conn):
+                # 插入新用戶
+                user_id = conn.execute('''
+                    INSERT INTO users (username, email, full_name, password_hash, avatar_url, is_active, email_verified, created_at, updated_at, last_login)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (username, email, name, 'GOOGLE_AUTH', picture, 1, 1, datetime.now(), datetime.now(), datetime.now())).lastrowid
+                
+                # 為新用戶創建預設分類
+                conn.executemany('''
+                    INSERT OR IGNORE INTO user_categories (user_id, name, is_default)
+                    VALUES (?, ?, 1)
+                ''', [(user_id, category_name) for category_name in default_categories])
+                return user_id
+            
+            user_id = execute_write(insert, db)
             db.close()
             
             return {
@@ -1,15 +1,12 @@
 from flask import Blueprint, request, jsonify, session
 from models.group import Group
-import sqlite3
-import os
+from models.settlement import Settlement
+from models.money import Money
+from db import get_db_connection
+from services.membership_cache import require_group_member
 
 group_bp = Blueprint('group', __name__)
 
-def get_db_connection():
-    """獲取資料庫連接"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database.db')
-    return sqlite3.connect(db_path)
-
 def require_login():
     """檢查登入狀態"""
     user_id = session.get('user_id')
@@ -96,34 +93,13 @@ def create_group():
         }), 500
 
 @group_bp.route('/groups/<int:group_id>', methods=['GET'])
+@require_group_member()
 def get_group(group_id):
     """獲取群組詳細信息"""
     try:
-        user_id = require_login()
-        if not user_id:
-            return jsonify({
-                "success": False, 
-                "message": "請先登入"
-            }), 401
-        
         db = get_db_connection()
         group_model = Group(db)
         
-        # 檢查用戶是否是群組成員
-        cursor = db.cursor()
-        cursor.execute('''
-            SELECT role FROM group_members 
-            WHERE group_id = ? AND user_id = ? AND status = 'active'
-        ''', (group_id, user_id))
-        
-        member = cursor.fetchone()
-        if not member:
-            db.close()
-            return jsonify({
-                "success": False, 
-                "message": "您不是該群組成員"
-            }), 403
-        
         group = group_model.get_group_by_id(group_id)
         
         db.close()
@@ -309,6 +285,67 @@ def leave_group(group_id):
             "message": f"離開群組失敗: {str(e)}"
         }), 500
 
+@group_bp.route('/groups/<int:group_id>/settlement', methods=['GET'])
+@require_group_member()
+def get_group_settlement(group_id):
+    """獲取群組成員餘額與最少轉帳建議"""
+    try:
+        db = get_db_connection()
+        result = Settlement(db).get_settlement(group_id)
+        db.close()
+
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 500
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"獲取結算失敗: {str(e)}"
+        }), 500
+
+@group_bp.route('/groups/<int:group_id>/settlement/payments', methods=['POST'])
+@require_group_member()
+def record_settlement_payment(group_id):
+    """記錄成員還款（付款人為目前用戶；群組管理員可用 from_user_id 代其他成員記錄）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        user_id = session['user_id']
+
+        try:
+            from_user_id = int(data.get('from_user_id') or user_id)
+            to_user_id = int(data['to_user_id'])
+            amount = Money.parse(data['amount'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                "success": False,
+                "message": "請提供有效的 to_user_id 與 amount"
+            }), 400
+
+        db = get_db_connection()
+        settlement = Settlement(db)
+        if not settlement.can_record_payment(group_id, user_id, from_user_id):
+            db.close()
+            return jsonify({
+                "success": False,
+                "message": "只有群組管理員可以代其他成員記錄還款"
+            }), 403
+
+        result = settlement.record_payment(group_id, from_user_id, to_user_id, amount, user_id)
+        db.close()
+
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"記錄還款失敗: {str(e)}"
+        }), 500
+
 @group_bp.route('/invitations', methods=['GET'])
 def get_invitations():
     """獲取用戶的群組邀請"""
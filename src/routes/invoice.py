@@ -1,17 +1,53 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, url_for
 from models.invoice import InvoiceCarrier, InvoiceRecord, SyncLog, init_invoice_tables
 from services.invoice_service import InvoiceService
-from services.real_invoice_service import RealInvoiceService
+from services.real_invoice_service import real_invoice_service
+from services.invoice_sync import create_sync_runner
+from services.sync_queue import FINISHED_STATUSES, create_sync_queue, create_sync_worker
+from db import execute_write, get_db_connection
+from services.statistics_cache import invalidate_statistics
 from datetime import datetime
 import json
+import os
+import time
 
 invoice_bp = Blueprint('invoice', __name__)
 
 # 初始化發票資料表
 init_invoice_tables()
 
-# 全域發票服務實例
-real_invoice_service = RealInvoiceService()
+# 多載具並行同步（執行緒池與每個主機的並行上限由所有請求共用）
+sync_runner = create_sync_runner(real_invoice_service)
+
+# 同步請求只加入工作佇列並立即回傳 job id，由背景 worker 執行
+# 另外以 python -m services.sync_queue 執行獨立 worker 時，可設 INVOICE_SYNC_INLINE_WORKER=false
+sync_queue = create_sync_queue()
+sync_worker = create_sync_worker(sync_runner, sync_queue)
+INLINE_WORKER = os.environ.get('INVOICE_SYNC_INLINE_WORKER', 'true').lower() == 'true'
+
+@invoice_bp.record_once
+def start_inline_worker(state):
+    """註冊 blueprint 時啟動行程內 worker
+
+    重啟前仍在排隊、由 python -m services.sync_queue enqueue-all 加入，或前一個行程留下且
+    租約已過期的工作（claim 時收回）都會立即執行，不必等使用者按下同步。
+    worker 在背景執行緒認領工作，資料表尚未遷移完成時會在下一輪輪詢重試。
+    """
+    if INLINE_WORKER:
+        sync_worker.start()
+
+def enqueue_sync(user_id, carrier_id=None):
+    """加入同步工作並回傳 202 回應"""
+    job_id, created = sync_queue.enqueue(user_id, carrier_id, 'manual')
+    
+    return jsonify({
+        'success': True,
+        'message': 'Sync job queued' if created else 'Sync job already in progress',
+        'data': {
+            'job_id': job_id,
+            'status_url': url_for('invoice.get_sync_job', job_id=job_id)
+        }
+    }), 202
 
 @invoice_bp.route('/carriers', methods=['GET'])
 def get_carriers():
@@ -124,36 +160,28 @@ def sync_invoices(carrier_id):
                 'message': 'Carrier not found or access denied'
             }), 404
         
-        # 建立同步記錄
-        sync_log_id = SyncLog.create(user_id, carrier_id, 'manual')
-        
-        try:
-            # 執行同步（使用真實 API 服務）
-            sync_result = real_invoice_service.sync_carrier_invoices(carrier)
-            
-            # 更新同步記錄
-            SyncLog.update(
-                sync_log_id,
-                'success' if sync_result['success'] else 'failed',
-                sync_result['message'],
-                sync_result.get('invoices_found', 0),
-                sync_result.get('invoices_new', 0),
-                sync_result.get('invoices_updated', 0)
-            )
+        # 加入同步工作，進度以 GET /jobs/<job_id> 查詢
+        return enqueue_sync(user_id, carrier_id)
             
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@invoice_bp.route('/sync', methods=['POST'])
+def sync_all_invoices():
+    """同步使用者所有載具的發票資料（背景並行執行）"""
+    try:
+        # 從 session 獲取 user_id
+        user_id = session.get('user_id')
+        if not user_id:
             return jsonify({
-                'success': sync_result['success'],
-                'message': sync_result['message'],
-                'data': {
-                    'invoices_found': sync_result.get('invoices_found', 0),
-                    'invoices_new': sync_result.get('invoices_new', 0),
-                    'invoices_updated': sync_result.get('invoices_updated', 0)
-                }
-            })
-        except Exception as e:
-            # 更新同步記錄為失敗
-            SyncLog.update(sync_log_id, 'failed', str(e))
-            raise e
+                'success': False,
+                'message': 'User not logged in'
+            }), 401
+        
+        return enqueue_sync(user_id)
             
     except Exception as e:
         return jsonify({
@@ -161,6 +189,73 @@ def sync_invoices(carrier_id):
             'message': str(e)
         }), 500
 
+@invoice_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_sync_job(job_id):
+    """查詢同步工作狀態與進度"""
+    try:
+        # 從 session 獲取 user_id
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'message': 'User not logged in'
+            }), 401
+        
+        job = sync_queue.get(job_id)
+        if not job or job['user_id'] != user_id:
+            return jsonify({
+                'success': False,
+                'message': 'Sync job not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': job
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@invoice_bp.route('/jobs/<int:job_id>/events', methods=['GET'])
+def stream_sync_job(job_id):
+    """以 Server-Sent Events 推送同步工作狀態，工作結束後關閉連線"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({
+            'success': False,
+            'message': 'User not logged in'
+        }), 401
+    
+    job = sync_queue.get(job_id)
+    if not job or job['user_id'] != user_id:
+        return jsonify({
+            'success': False,
+            'message': 'Sync job not found'
+        }), 404
+    
+    def generate(job):
+        # 只在狀態或進度改變時送出事件；閒置時送註解行維持連線
+        last = None
+        while True:
+            snapshot = (job['status'], job['progress']['done'], job['progress']['total'])
+            if snapshot != last:
+                yield f"event: {job['status']}\ndata: {json.dumps(job, ensure_ascii=False, default=str)}\n\n"
+                last = snapshot
+            else:
+                yield ': keep-alive\n\n'
+            if job['status'] in FINISHED_STATUSES:
+                return
+            time.sleep(1)
+            job = sync_queue.get(job_id)
+    
+    return Response(
+        generate(job),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @invoice_bp.route('/records', methods=['GET'])
 def get_invoice_records():
     """獲取發票紀錄列表"""
@@ -248,75 +343,71 @@ def auto_import_to_transactions():
             }), 400
         
         # 匯入發票紀錄為交易紀錄
-        from models.transaction import Transaction
-        import sqlite3
-        import os
-        
-        # 使用與 main.py 相同的資料庫路徑方法
-        DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'database.db')
-        conn = sqlite3.connect(DATABASE_PATH)
-        
-        transaction_model = Transaction(conn)
-        
-        imported_count = 0
-        failed_count = 0
-        
-        for record_id in invoice_record_ids:
-            try:
-                # 獲取發票紀錄
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT * FROM invoice_records 
-                    WHERE id = ? AND user_id = ?
-                ''', (record_id, user_id))
-                
-                invoice_record = cursor.fetchone()
-                
-                if not invoice_record:
-                    failed_count += 1
-                    continue
-                
-                # 檢查是否已經匯入
-                if invoice_record[13]:  # is_processed column (0-based index 13)
-                    continue
-                
-                # 創建交易紀錄
-                transaction_data = {
-                    'amount': -float(invoice_record[9]),  # total_amount (負數表示支出)
-                    'category': '載具',
-                    'description': f"發票載具匯入 - {invoice_record[6] or '未知商家'}",  # seller_name (index 6)
-                    'date': invoice_record[4],  # invoice_date
-                    'type': 'expense'
-                }
-                
-                
-                # 直接使用 SQL 創建交易，不依賴 Transaction 模型
-                cursor.execute('''
-                    INSERT INTO transactions (user_id, amount, category, description, date, type, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                ''', (user_id, transaction_data['amount'], transaction_data['category'], 
-                      transaction_data['description'], transaction_data['date'], transaction_data['type']))
-                
-                transaction_id = cursor.lastrowid
-                
-                if transaction_id:
-                    # 標記發票紀錄為已處理
+        def import_records(conn):
+            imported_count = 0
+            failed_count = 0
+            
+            for record_id in invoice_record_ids:
+                try:
+                    # 獲取發票紀錄
+                    cursor = conn.cursor()
                     cursor.execute('''
-                        UPDATE invoice_records 
-                        SET is_processed = 1, updated_at = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                    ''', (record_id,))
-                    imported_count += 1
-                else:
-                    failed_count += 1
+                        SELECT * FROM invoice_records 
+                        WHERE id = ? AND user_id = ?
+                    ''', (record_id, user_id))
+                    
+                    invoice_record = cursor.fetchone()
+                    
+                    if not invoice_record:
+                        failed_count += 1
+                        continue
+                    
+                    # 檢查是否已經匯入
+                    if invoice_record[13]:  # is_processed column (0-based index 13)
+                        continue
                     
-            except Exception as e:
-                failed_count += 1
-                continue
+                    # 創建交易紀錄
+                    transaction_data = {
+                        'amount': -invoice_record[9],  # total_amount，整數分 (負數表示支出)
+                        'category': '載具',
+                        'description': f"發票載具匯入 - {invoice_record[6] or '未知商家'}",  # seller_name (index 6)
+                        'date': invoice_record[4],  # invoice_date
+                        'type': 'expense'
+                    }
+                    
+                    # 直接使用 SQL 創建交易，不依賴 Transaction 模型
+                    cursor.execute('''
+                        INSERT INTO transactions (user_id, amount, category, description, date, type, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                    ''', (user_id, transaction_data['amount'], transaction_data['category'], 
+                          transaction_data['description'], transaction_data['date'], transaction_data['type']))
+                    
+                    transaction_id = cursor.lastrowid
+                    
+                    if transaction_id:
+                        # 標記發票紀錄為已處理
+                        cursor.execute('''
+                            UPDATE invoice_records 
+                            SET is_processed = 1, updated_at = CURRENT_TIMESTAMP
+                            WHERE id = ?
+                        ''', (record_id,))
+                        imported_count += 1
+                    else:
+                        failed_count += 1
+                        
+                except Exception as e:
+                    failed_count += 1
+                    continue
+            
+            return imported_count, failed_count
         
-        conn.commit()
+        conn = get_db_connection()
+        imported_count, failed_count = execute_write(import_records, conn)
         conn.close()
         
+        if imported_count:
+            invalidate_statistics(user_id)
+        
         return jsonify({
             'success': True,
             'message': f'Successfully imported {imported_count} invoice records',
@@ -0,0 +1,121 @@
+from flask import Blueprint, request, jsonify, session
+from datetime import date
+from db import get_db_connection
+from models.recurring import RecurringRule
+from models.money import Money
+from services.membership_cache import get_member_role
+
+recurring_bp = Blueprint('recurring', __name__)
+
+def require_login():
+    """檢查登入狀態"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+    return user_id
+
+@recurring_bp.route('/recurring-rules', methods=['GET'])
+def get_recurring_rules():
+    """獲取用戶的週期性交易規則"""
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False,
+            "message": "請先登入"
+        }), 401
+
+    db = get_db_connection()
+    rules = RecurringRule(db).get_user_rules(user_id)
+    db.close()
+
+    return jsonify({
+        "success": True,
+        "rules": rules
+    }), 200
+
+@recurring_bp.route('/recurring-rules', methods=['POST'])
+def create_recurring_rule():
+    """創建週期性交易規則，開始日期已過的發生日會立即補產生"""
+    try:
+        user_id = require_login()
+        if not user_id:
+            return jsonify({
+                "success": False,
+                "message": "請先登入"
+            }), 401
+
+        data = request.get_json(silent=True) or {}
+
+        for field in ['amount', 'category', 'description', 'frequency']:
+            if data.get(field) in (None, ''):
+                return jsonify({'success': False, 'message': f'Missing field: {field}'}), 400
+
+        try:
+            amount = Money.parse(data['amount'])
+            interval = int(data.get('interval', 1))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': '金額或間隔格式錯誤'}), 400
+
+        db = get_db_connection()
+
+        group_id = data.get('group_id')
+        if group_id not in (None, ''):
+            try:
+                group_id = int(group_id)
+            except (TypeError, ValueError):
+                db.close()
+                return jsonify({'success': False, 'message': '無效的群組ID'}), 400
+
+            if get_member_role(db, user_id, group_id) is None:
+                db.close()
+                return jsonify({'success': False, 'message': '您不是該群組成員'}), 403
+        else:
+            group_id = None
+
+        rule_model = RecurringRule(db)
+        result = rule_model.create_rule(
+            user_id=user_id,
+            description=data['description'],
+            amount=amount,
+            category=data['category'],
+            frequency=data['frequency'],
+            start_date=data.get('start_date') or date.today().isoformat(),
+            interval=interval,
+            end_date=data.get('end_date'),
+            group_id=group_id
+        )
+
+        if result['success']:
+            result['materialised'] = rule_model.materialise_due(rule_ids=[result['rule_id']])['created']
+
+        db.close()
+
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"創建週期性交易規則失敗: {str(e)}"
+        }), 500
+
+@recurring_bp.route('/recurring-rules/<int:rule_id>', methods=['DELETE'])
+def deactivate_recurring_rule(rule_id):
+    """停用週期性交易規則"""
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False,
+            "message": "請先登入"
+        }), 401
+
+    db = get_db_connection()
+    result = RecurringRule(db).deactivate_rule(rule_id, user_id)
+    db.close()
+
+    if result['success']:
+        return jsonify(result), 200
+    else:
+        return jsonify(result), 404
@@ -1,14 +1,21 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app, Response
 from datetime import datetime
-import sqlite3
-import os
+import base64
+import csv
+import io
+import json
+from db import get_db_connection, get_pool, execute_write
+from services.statistics_cache import invalidate_statistics
+from services.membership_cache import get_member_role
+from services.transaction_import import StatementImporter
+from models.transaction import Transaction
+from models.settlement import Settlement
+from models.money import Money, to_amount
 
 transaction_bp = Blueprint('transaction', __name__)
 
-def get_db_connection():
-    """獲取資料庫連接"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'database.db')
-    return sqlite3.connect(db_path)
+# 交易列表每頁筆數上限
+MAX_PER_PAGE = 100
 
 def require_login():
     """檢查登入狀態的統一函數"""
@@ -18,9 +25,33 @@ def require_login():
     return user_id
 
 
+def encode_cursor(date, transaction_id):
+    """將 (date, id) 編碼為不透明的分頁游標"""
+    raw = json.dumps([date, transaction_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解碼分頁游標，格式錯誤時拋出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, transaction_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return str(date), int(transaction_id)
+    except Exception:
+        raise ValueError('無效的分頁游標')
+
+
 @transaction_bp.route('/transactions', methods=['GET'])
 def get_transactions():
-    """獲取交易記錄"""
+    """獲取交易記錄
+
+    支援兩種分頁方式：
+    - page/per_page：舊版 OFFSET 分頁，回傳 total/pages
+    - cursor：keyset 分頁，依 (date, id) 直接定位下一頁，回傳 next_cursor；
+      第一頁傳空字串 cursor=，需要總數時加上 include_total=true
+    per_page 至少為 1；cursor 模式另外限制在 MAX_PER_PAGE 以內，page/per_page 模式維持原本不設上限。
+    page/per_page 不是整數或游標無效時回傳 400。
+    """
     # 使用統一的登入檢查函數
     user_id = require_login()
     
@@ -30,100 +61,142 @@ def get_transactions():
             "message": "請先登入"
         }), 401
     
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+    except ValueError:
+        return jsonify({"success": False, "message": "page 與 per_page 必須是整數"}), 400
+    if page < 1:
+        return jsonify({"success": False, "message": "page 必須大於 0"}), 400
     group_id = request.args.get("group_id")
+    cursor_mode = 'cursor' in request.args
+    per_page = max(per_page, 1)
+    if cursor_mode:
+        per_page = min(per_page, MAX_PER_PAGE)
+    include_total = not cursor_mode or request.args.get('include_total', 'false').lower() == 'true'
     
     try:
         # 使用原生SQLite連接
         db = get_db_connection()
         cursor = db.cursor()
         
-        # 如果指定了group_id，則獲取該群組所有成員的交易
+        # 如果指定了group_id，則獲取該群組的交易（依 transactions.group_id，走 (group_id, date, id) 索引）
         if group_id:
             try:
                 group_id = int(group_id)
-                # 獲取群組所有成員的ID
-                cursor.execute('SELECT user_id FROM group_members WHERE group_id = ?', (group_id,))
-                member_data = cursor.fetchall()
-                member_ids = [row[0] for row in member_data]
-                
-                if not member_ids:
-                    db.close()
-                    return jsonify({
-                        'success': True,
-                        'transactions': [],
-                        'total': 0,
-                        'pages': 0,
-                        'current_page': page
-                    })
-                
-                # 查詢所有成員的交易 - 計算總數
-                placeholders = ','.join(['?' for _ in member_ids])
-                cursor.execute(f'SELECT COUNT(*) FROM transactions WHERE user_id IN ({placeholders})', member_ids)
-                total = cursor.fetchone()[0]
-                
-                # 查詢分頁數據，加入用戶名稱
-                cursor.execute(f'''
-                    SELECT t.*, u.username, u.full_name 
-                    FROM transactions t
-                    LEFT JOIN users u ON t.user_id = u.id
-                    WHERE t.user_id IN ({placeholders})
-                    ORDER BY t.date DESC, t.id DESC
-                    LIMIT ? OFFSET ?
-                ''', member_ids + [per_page, (page - 1) * per_page])
-                
             except ValueError:
                 db.close()
                 return jsonify({
                     "success": False, 
                     "message": "無效的群組ID"
                 }), 400
+            
+            if get_member_role(db, user_id, group_id) is None:
+                db.close()
+                return jsonify({
+                    "success": False, 
+                    "message": "您不是該群組成員"
+                }), 403
+            
+            where_clause = 't.group_id = ?'
+            where_params = [group_id]
         else:
             # 如果沒有group_id，則只獲取當前用戶的個人交易
-            cursor.execute('SELECT COUNT(*) FROM transactions WHERE user_id = ?', (user_id,))
-            total = cursor.fetchone()[0]
+            where_clause = 't.user_id = ?'
+            where_params = [user_id]
+        
+        total = None
+        if include_total:
+            if group_id:
+                # 群組交易數由觸發器維護在 groups.transaction_count
+                cursor.execute('SELECT transaction_count FROM groups WHERE id = ?', (group_id,))
+                row = cursor.fetchone()
+                total = row[0] if row else 0
+            else:
+                cursor.execute(f'SELECT COUNT(*) FROM transactions t WHERE {where_clause}', where_params)
+                total = cursor.fetchone()[0]
+        
+        if cursor_mode:
+            # keyset 分頁：從游標位置往後找，多取一筆判斷是否還有下一頁
+            seek_clause = ''
+            seek_params = []
+            if request.args.get('cursor'):
+                try:
+                    seek_params = list(decode_cursor(request.args['cursor']))
+                except ValueError as e:
+                    db.close()
+                    return jsonify({"success": False, "message": str(e)}), 400
+                seek_clause = 'AND (t.date, t.id) < (?, ?)'
             
-            cursor.execute('''
-                SELECT t.*, u.username, u.full_name 
+            cursor.execute(f'''
+                SELECT t.id, t.user_id, t.group_id, t.description, t.amount, t.category,
+                       t.date, t.type, t.created_at, t.updated_at, u.username, u.full_name
                 FROM transactions t
                 LEFT JOIN users u ON t.user_id = u.id
-                WHERE t.user_id = ?
+                WHERE {where_clause} {seek_clause}
+                ORDER BY t.date DESC, t.id DESC
+                LIMIT ?
+            ''', where_params + seek_params + [per_page + 1])
+        else:
+            # 查詢分頁數據，加入用戶名稱
+            cursor.execute(f'''
+                SELECT t.id, t.user_id, t.group_id, t.description, t.amount, t.category,
+                       t.date, t.type, t.created_at, t.updated_at, u.username, u.full_name
+                FROM transactions t
+                LEFT JOIN users u ON t.user_id = u.id
+                WHERE {where_clause}
                 ORDER BY t.date DESC, t.id DESC
                 LIMIT ? OFFSET ?
-            ''', (user_id, per_page, (page - 1) * per_page))
+            ''', where_params + [per_page, (page - 1) * per_page])
         
         transactions_data = cursor.fetchall()
         
+        next_cursor = None
+        if cursor_mode and len(transactions_data) > per_page:
+            transactions_data = transactions_data[:per_page]
+            last = transactions_data[-1]
+            next_cursor = encode_cursor(last[6], last[0])
+        
         transactions = []
         
         for trans_data in transactions_data:
             transactions.append({
                 'id': trans_data[0],
                 'user_id': trans_data[1],
-                'description': trans_data[2],
-                'amount': trans_data[3],
-                'category': trans_data[4],
-                'date': trans_data[5],
-                'type': trans_data[6],
-                'created_at': trans_data[7],
-                'updated_at': trans_data[8] if len(trans_data) > 8 else None,
-                'username': trans_data[9] if len(trans_data) > 9 else None,
-                'full_name': trans_data[10] if len(trans_data) > 10 else None,
-                'user_name': trans_data[10] if len(trans_data) > 10 else trans_data[9] if len(trans_data) > 9 else None
+                'group_id': trans_data[2],
+                'description': trans_data[3],
+                'amount': to_amount(trans_data[4]),
+                'category': trans_data[5],
+                'date': trans_data[6],
+                'type': trans_data[7],
+                'created_at': trans_data[8],
+                'updated_at': trans_data[9],
+                'username': trans_data[10],
+                'full_name': trans_data[11],
+                'user_name': trans_data[11] or trans_data[10]
             })
         
         db.close()
         
-        pages = (total + per_page - 1) // per_page
-        
-        result = {
-            'success': True,
-            'transactions': transactions,
-            'total': total,
-            'pages': pages,
-            'current_page': page
-        }
+        if cursor_mode:
+            result = {
+                'success': True,
+                'transactions': transactions,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+            if include_total:
+                result['total'] = total
+        else:
+            pages = (total + per_page - 1) // per_page
+            
+            result = {
+                'success': True,
+                'transactions': transactions,
+                'total': total,
+                'pages': pages,
+                'current_page': page
+            }
         
         
         return jsonify(result)
@@ -154,21 +227,50 @@ def create_transaction():
 
     try:
         # 根據金額自動判斷交易類型
-        amount = float(data['amount'])
+        try:
+            amount = Money.parse(data['amount']).cents
+        except ValueError as e:
+            return jsonify({'message': str(e), 'success': False}), 400
         transaction_type = data.get('type', 'income' if amount > 0 else 'expense')
         
-        # 使用原生SQLite連接
-        db = get_db_connection()
-        cursor = db.cursor()
-        
-        cursor.execute('''
-            INSERT INTO transactions (user_id, type, amount, category, description, date, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-        ''', (user_id, transaction_type, amount, data['category'], data['description'], data['date']))
-        
-        transaction_id = cursor.lastrowid
-        db.commit()
-        db.close()
+        # 可選的群組交易，需為該群組成員
+        group_id = data.get('group_id')
+        if group_id not in (None, ''):
+            try:
+                group_id = int(group_id)
+            except (TypeError, ValueError):
+                return jsonify({'message': '無效的群組ID', 'success': False}), 400
+            
+            db = get_db_connection()
+            if get_member_role(db, user_id, group_id) is None:
+                db.close()
+                return jsonify({'message': '您不是該群組成員', 'success': False}), 403
+            
+            # 群組支出依 split 設定分攤（預設全體成員平均分攤）
+            shares = []
+            if amount < 0:
+                try:
+                    shares = Settlement(db).build_split(group_id, amount, data.get('split'))
+                except (TypeError, ValueError) as e:
+                    db.close()
+                    return jsonify({'message': str(e), 'success': False}), 400
+            db.close()
+        else:
+            group_id = None
+            shares = []
+        
+        def insert(conn):
+            cursor = conn.execute('''
+                INSERT INTO transactions (user_id, group_id, type, amount, category, description, date, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+            ''', (user_id, group_id, transaction_type, amount, data['category'], data['description'], data['date']))
+            if shares:
+                Settlement.add_ledger_entries(conn, group_id, cursor.lastrowid, user_id, shares)
+            return cursor.lastrowid
+        
+        # 交由寫入佇列執行，並發新增時不會出現 database is locked
+        transaction_id = execute_write(insert)
+        invalidate_statistics(user_id, [group_id])
         
         return jsonify({
             'message': '交易記錄新增成功',
@@ -179,6 +281,296 @@ def create_transaction():
     except Exception as e:
         return jsonify({'message': f'錯誤: {str(e)}', 'success': False}), 500
 
+def validate_batch_item(item):
+    """驗證批次新增中的單筆交易，回傳 (欄位值, 錯誤訊息)"""
+    if not isinstance(item, dict):
+        return None, '資料格式錯誤'
+    
+    for field in ['amount', 'category', 'description', 'date']:
+        if item.get(field) in (None, ''):
+            return None, f'Missing field: {field}'
+    
+    try:
+        amount = Money.parse(item['amount']).cents
+    except ValueError:
+        return None, '金額格式錯誤'
+    
+    try:
+        datetime.strptime(str(item['date']), '%Y-%m-%d')
+    except ValueError:
+        return None, '日期格式錯誤，應為 YYYY-MM-DD'
+    
+    transaction_type = item.get('type', 'income' if amount > 0 else 'expense')
+    return (transaction_type, amount, item['category'], item['description'], item['date']), None
+
+
+@transaction_bp.route('/transactions/batch', methods=['POST'])
+def create_transactions_batch():
+    """批次新增交易記錄（離線同步用），所有有效項目在同一個交易中寫入"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({
+            "success": False, 
+            "message": "請先登入"
+        }), 401
+    
+    data = request.get_json(silent=True) or {}
+    items = data.get('transactions')
+    max_batch_size = current_app.config.get('TRANSACTION_BATCH_MAX', 200)
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': '請提供 transactions 列表'}), 400
+    
+    if len(items) > max_batch_size:
+        return jsonify({
+            'success': False,
+            'message': f'單次最多新增 {max_batch_size} 筆交易'
+        }), 400
+    
+    results = []
+    rows = []
+    for index, item in enumerate(items):
+        values, error = validate_batch_item(item)
+        if error:
+            results.append({'index': index, 'success': False, 'message': error})
+        else:
+            results.append({'index': index, 'success': True})
+            rows.append((user_id,) + values)
+    
+    try:
+        if rows:
+            def insert(conn):
+                conn.executemany('''
+                    INSERT INTO transactions (user_id, type, amount, category, description, date, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+                ''', rows)
+                # 同一個寫入交易內 AUTOINCREMENT 的 id 是連續的
+                return conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            
+            last_id = execute_write(insert)
+            invalidate_statistics(user_id)
+            
+            next_id = last_id - len(rows) + 1
+            for result in results:
+                if result['success']:
+                    result['transaction_id'] = next_id
+                    next_id += 1
+        
+        return jsonify({
+            'success': bool(rows),
+            'message': f'已新增 {len(rows)} 筆交易',
+            'created': len(rows),
+            'failed': len(items) - len(rows),
+            'results': results
+        }), 201 if rows else 400
+        
+    except Exception as e:
+        return jsonify({'message': f'錯誤: {str(e)}', 'success': False}), 500
+
+EXPORT_COLUMNS = ['id', 'date', 'type', 'category', 'description', 'amount', 'user_id', 'username', 'group_id']
+
+
+@transaction_bp.route('/transactions/export', methods=['GET'])
+def export_transactions():
+    """匯出交易記錄（CSV 或 NDJSON），逐列串流輸出，記憶體用量與資料量無關
+
+    參數：format=csv|ndjson、start_date、end_date（YYYY-MM-DD）、group_id
+    """
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False, 
+            "message": "請先登入"
+        }), 401
+    
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"success": False, "message": "不支援的匯出格式"}), 400
+    
+    conditions = []
+    params = []
+    
+    group_id = request.args.get('group_id')
+    if group_id:
+        try:
+            group_id = int(group_id)
+        except ValueError:
+            return jsonify({"success": False, "message": "無效的群組ID"}), 400
+        
+        db = get_db_connection()
+        is_member = get_member_role(db, user_id, group_id) is not None
+        db.close()
+        
+        if not is_member:
+            return jsonify({"success": False, "message": "您不是該群組成員"}), 403
+        
+        conditions.append('t.group_id = ?')
+        params.append(group_id)
+    else:
+        conditions.append('t.user_id = ?')
+        params.append(user_id)
+    
+    for arg, condition in (('start_date', 't.date >= ?'), ('end_date', 't.date <= ?')):
+        value = request.args.get(arg)
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({"success": False, "message": f"{arg} 格式錯誤，應為 YYYY-MM-DD"}), 400
+            conditions.append(condition)
+            params.append(value)
+    
+    sql = f'''
+        SELECT t.id, t.date, t.type, t.category, t.description, t.amount,
+               t.user_id, u.username, t.group_id
+        FROM transactions t
+        LEFT JOIN users u ON t.user_id = u.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY t.date, t.id
+    '''
+    
+    def generate():
+        # 使用獨立連接：串流期間請求的連接可能已被歸還
+        conn = get_pool().acquire()
+        try:
+            cursor = conn.execute(sql, params)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            
+            if export_format == 'csv':
+                # BOM 讓 Excel 正確辨識 UTF-8 中文
+                writer.writerow(EXPORT_COLUMNS)
+                yield '\ufeff' + buffer.getvalue()
+            
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                
+                buffer.seek(0)
+                buffer.truncate()
+                if export_format == 'csv':
+                    # 金額以整數分儲存，CSV 輸出固定兩位小數的字串，不經過浮點數
+                    writer.writerows(row[:5] + (str(Money(row[5])),) + row[6:] for row in rows)
+                else:
+                    for row in rows:
+                        row = row[:5] + (to_amount(row[5]),) + row[6:]
+                        buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+    
+    if export_format == 'csv':
+        content_type = 'text/csv; charset=utf-8'
+        filename = 'transactions.csv'
+    else:
+        content_type = 'application/x-ndjson; charset=utf-8'
+        filename = 'transactions.ndjson'
+    
+    return Response(
+        generate(),
+        content_type=content_type,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@transaction_bp.route('/transactions/import', methods=['POST'])
+def import_transactions():
+    """匯入銀行/信用卡對帳單 CSV
+
+    表單欄位：file（CSV 檔）、mapping（JSON，系統欄位對應 CSV 標題）、date_format、
+    encoding（預設 utf-8-sig，台灣銀行常見 big5）、decimal_separator、thousands_separator、
+    negate_amounts、default_category
+    """
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False, 
+            "message": "請先登入"
+        }), 401
+    
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({"success": False, "message": "請上傳 CSV 檔案"}), 400
+    
+    try:
+        mapping = json.loads(request.form.get('mapping') or '{}')
+        if not isinstance(mapping, dict):
+            raise ValueError
+    except ValueError:
+        return jsonify({"success": False, "message": "mapping 必須是 JSON 物件"}), 400
+    
+    importer = StatementImporter(
+        mapping=mapping,
+        date_format=request.form.get('date_format', '%Y-%m-%d'),
+        decimal_separator=request.form.get('decimal_separator', '.'),
+        thousands_separator=request.form.get('thousands_separator', ','),
+        negate_amounts=request.form.get('negate_amounts', 'false').lower() == 'true',
+        default_category=request.form.get('default_category', '其他')
+    )
+    
+    try:
+        text_stream = io.TextIOWrapper(
+            upload.stream, encoding=request.form.get('encoding', 'utf-8-sig'), newline=''
+        )
+        result = importer.import_stream(user_id, text_stream)
+    except (ValueError, LookupError, UnicodeDecodeError) as e:
+        return jsonify({"success": False, "message": f"匯入失敗: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({'message': f'錯誤: {str(e)}', 'success': False}), 500
+    finally:
+        # 發生錯誤前已提交的批次也需要清除統計快取
+        invalidate_statistics(user_id)
+    
+    return jsonify({
+        'success': True,
+        'message': f"已匯入 {result['imported']} 筆交易",
+        **result
+    })
+
+@transaction_bp.route('/transactions/search', methods=['GET'])
+def search_transactions():
+    """全文搜尋交易記錄
+
+    參數：q（關鍵字，空白分隔為 AND）、category、min_amount、max_amount、
+    start_date、end_date、group_id、limit
+    """
+    user_id = require_login()
+    if not user_id:
+        return jsonify({
+            "success": False, 
+            "message": "請先登入"
+        }), 401
+    
+    group_id = request.args.get('group_id', type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    
+    db = get_db_connection()
+    
+    if group_id:
+        if get_member_role(db, user_id, group_id) is None:
+            db.close()
+            return jsonify({"success": False, "message": "您不是該群組成員"}), 403
+    
+    result = Transaction(db).search_transactions(
+        request.args.get('q', ''),
+        user_id=user_id,
+        group_id=group_id,
+        category=request.args.get('category'),
+        min_amount=request.args.get('min_amount', type=float),
+        max_amount=request.args.get('max_amount', type=float),
+        start_date=request.args.get('start_date'),
+        end_date=request.args.get('end_date'),
+        limit=limit
+    )
+    
+    db.close()
+    
+    if result['success']:
+        return jsonify(result), 200
+    else:
+        return jsonify(result), 400
+
 @transaction_bp.route('/transactions/<int:transaction_id>', methods=['PUT'])
 def update_transaction(transaction_id):
     """更新交易記錄"""
@@ -194,7 +586,7 @@ def update_transaction(transaction_id):
         cursor = db.cursor()
         
         # 檢查交易是否存在且屬於當前用戶
-        cursor.execute('SELECT * FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
+        cursor.execute('SELECT id, group_id FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
         transaction = cursor.fetchone()
         
         if not transaction:
@@ -210,8 +602,13 @@ def update_transaction(transaction_id):
             update_values.append(data['type'])
         
         if 'amount' in data:
+            try:
+                amount = Money.parse(data['amount']).cents
+            except ValueError as e:
+                db.close()
+                return jsonify({'message': str(e), 'success': False}), 400
             update_fields.append('amount = ?')
-            update_values.append(float(data['amount']))
+            update_values.append(amount)
         
         if 'category' in data:
             update_fields.append('category = ?')
@@ -228,12 +625,12 @@ def update_transaction(transaction_id):
         update_fields.append('updated_at = datetime("now")')
         update_values.append(transaction_id)
         
-        # 執行更新
+        # 執行更新（經由寫入佇列）
         update_sql = f'UPDATE transactions SET {", ".join(update_fields)} WHERE id = ?'
-        cursor.execute(update_sql, update_values)
+        execute_write(lambda conn: conn.execute(update_sql, update_values), db)
         
-        db.commit()
         db.close()
+        invalidate_statistics(user_id, [transaction[1]])
         
         return jsonify({
             'message': '交易記錄更新成功',
@@ -256,18 +653,19 @@ def delete_transaction(transaction_id):
         cursor = db.cursor()
         
         # 檢查交易是否存在且屬於當前用戶
-        cursor.execute('SELECT id FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
+        cursor.execute('SELECT id, group_id FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
         transaction = cursor.fetchone()
         
         if not transaction:
             db.close()
             return jsonify({'error': '交易記錄不存在'}), 404
         
-        # 刪除交易
-        cursor.execute('DELETE FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
+        # 刪除交易（經由寫入佇列）
+        execute_write(lambda conn: conn.execute('DELETE FROM transactions WHERE id = ? AND user_id = ?',
+                                                (transaction_id, user_id)), db)
         
-        db.commit()
         db.close()
+        invalidate_statistics(user_id, [transaction[1]])
         
         return jsonify({'message': '交易記錄刪除成功', 'success': True})
         
@@ -413,86 +811,6 @@ def add_group_member(group_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@transaction_bp.route('/statistics', methods=['GET'])
-def get_statistics():
-    """獲取統計資料"""
-    user_id = request.args.get('user_id', 1)  # 暫時使用固定用戶ID
-    
-    # 計算總收入和總支出
-    group_id = request.args.get("group_id")
-
-    income_query = db.session.query(db.func.sum(Transaction.amount))\
-                            .filter(Transaction.user_id == user_id, Transaction.type == 'income')
-    expense_query = db.session.query(db.func.sum(Transaction.amount))\
-                             .filter(Transaction.user_id == user_id, Transaction.type == 'expense')
-    category_expense_query = db.session.query(
-        Transaction.category,
-        db.func.sum(Transaction.amount).label('total')
-    ).filter(Transaction.user_id == user_id, Transaction.type == 'expense')\
-     .group_by(Transaction.category)
-
-    if group_id:
-        income_query = income_query.filter(Transaction.group_id == group_id)
-        expense_query = expense_query.filter(Transaction.group_id == group_id)
-        category_expense_query = category_expense_query.filter(Transaction.group_id == group_id)
-
-    total_income = income_query.scalar() or 0
-    total_expense = expense_query.scalar() or 0
-    balance = total_income - total_expense
-    
-    # 按分類統計支出
-    expense_by_category = category_expense_query.all()
-    
-    return jsonify({
-        'total_income': total_income,
-        'total_expense': total_expense,
-        'balance': balance,
-        'expense_by_category': [
-            {'category': cat, 'amount': float(amount)} 
-            for cat, amount in expense_by_category
-        ]
-    })
-
-@transaction_bp.route('/budgets', methods=['GET'])
-def get_budgets():
-    """獲取預算列表"""
-    user_id = request.args.get('user_id', 1)  # 暫時使用固定用戶ID
-    
-    budgets = Budget.query.filter_by(user_id=user_id).all()
-    
-    return jsonify({
-        'budgets': [budget.to_dict() for budget in budgets]
-    })
-
-@transaction_bp.route('/budgets', methods=['POST'])
-def create_budget():
-    """建立預算"""
-    data = request.get_json()
-    
-    try:
-        budget = Budget(
-            user_id=data.get('user_id', 1),  # 暫時使用固定用戶ID
-            category=data['category'],
-            amount=float(data['amount']),
-            period=data['period'],
-            start_date=datetime.strptime(data['start_date'], '%Y-%m-%d').date(),
-            end_date=datetime.strptime(data['end_date'], '%Y-%m-%d').date()
-        )
-        
-        db.session.add(budget)
-        db.session.commit()
-        
-        return jsonify({
-            'message': '預算建立成功',
-            'budget': budget.to_dict()
-        }), 201
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 400
-
-
-
 @transaction_bp.route("/groups/<int:group_id>/members/<int:user_id>", methods=["DELETE"])
 def remove_group_member(group_id, user_id):
     """移除群組成員"""
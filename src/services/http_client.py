@@ -0,0 +1,167 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    """令牌桶限流：每秒補充 rate 個令牌，最多累積 capacity 個（允許短暫突發）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個令牌，令牌不足時阻塞等待，回傳等待的秒數"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class HttpMetrics:
+    """上游 API 呼叫統計（次數、重試、失敗、延遲分位數）"""
+
+    def __init__(self, window=1000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+    def record(self, latency, retries, failed, throttled):
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            self.failures += 1 if failed else 0
+            self.throttled_seconds += throttled
+            self._latencies.append(latency)
+
+    def get_stats(self):
+        """獲取呼叫統計（延遲為包含重試的總耗時，單位 ms）"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(ratio):
+                if not latencies:
+                    return 0
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * ratio))] * 1000, 1)
+
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "latency_p50_ms": percentile(0.5),
+                "latency_p95_ms": percentile(0.95),
+                "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else 0
+            }
+
+
+class ResilientHttpClient:
+    """呼叫上游 API 用的 HTTP 用戶端
+
+    - 共用一個 requests.Session，連線池保持 keep-alive，不必每次重新 TCP/TLS 握手
+    - 連線錯誤、逾時與 5xx/429 回應以指數退避加隨機抖動（full jitter）重試
+    - 每個 rate_key（例如 app_id）一個令牌桶，限制對上游的請求速率
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, pool_size=10, max_retries=3, backoff_base=0.5, backoff_max=10.0,
+                 timeout=30, rate=5.0, burst=10):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.rate = rate
+        self.burst = burst
+        self.metrics = HttpMetrics()
+
+        # 重試由本類別處理（需要統計與限流），adapter 本身不重試
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, rate_key):
+        with self._lock:
+            if rate_key not in self._buckets:
+                self._buckets[rate_key] = TokenBucket(self.rate, self.burst)
+            return self._buckets[rate_key]
+
+    def _backoff(self, attempt, response=None):
+        """第 attempt 次重試前等待的秒數；429/503 帶 Retry-After 時以其為下限"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.backoff_max, int(retry_after)))
+        return delay
+
+    def post(self, url, data=None, rate_key=None):
+        """送出 POST，必要時重試；重試用盡時拋出最後一次的例外或 HTTPError"""
+        started = time.monotonic()
+        throttled = 0.0
+        attempt = 0
+
+        try:
+            while True:
+                if self.rate:
+                    throttled += self._bucket(rate_key).acquire()
+
+                try:
+                    response = self.session.post(url, data=data, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt >= self.max_retries:
+                        raise
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+
+                if response.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+                    time.sleep(self._backoff(attempt, response))
+                    response.close()
+                    attempt += 1
+                    continue
+
+                response.raise_for_status()
+                self.metrics.record(time.monotonic() - started, attempt, False, throttled)
+                return response
+        except Exception:
+            self.metrics.record(time.monotonic() - started, attempt, True, throttled)
+            raise
+
+    def close(self):
+        self.session.close()
+
+
+def create_http_client():
+    """依環境變數建立上游 API 用戶端"""
+    return ResilientHttpClient(
+        pool_size=int(os.environ.get('EINVOICE_HTTP_POOL_SIZE', 10)),
+        max_retries=int(os.environ.get('EINVOICE_HTTP_RETRIES', 3)),
+        backoff_base=float(os.environ.get('EINVOICE_HTTP_BACKOFF', 0.5)),
+        backoff_max=float(os.environ.get('EINVOICE_HTTP_BACKOFF_MAX', 10)),
+        timeout=float(os.environ.get('EINVOICE_HTTP_TIMEOUT', 30)),
+        rate=float(os.environ.get('EINVOICE_RATE_LIMIT', 5)),  # 每個 app_id 每秒請求數，0 為不限
+        burst=int(os.environ.get('EINVOICE_RATE_BURST', 10))
+    )
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models.invoice import InvoiceCarrier, SyncLog
+
+
+class InvoiceSyncRunner:
+    """多載具並行同步
+
+    以固定大小的執行緒池同時同步多個載具，使用者有多個載具時等待時間
+    取決於最慢的一個，而不是全部相加。每個上游主機另有並行上限（信號量），
+    不論有多少請求或排程同時進行，對同一個 API 主機的連線數都不會超過 per_host。
+    每個載具各自寫一筆 SyncLog，回傳值為全部載具的彙總。
+    """
+
+    def __init__(self, service, max_workers=4, per_host=2):
+        self.service = service
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def _host_limit(self, host):
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def sync_carrier(self, carrier, sync_type='manual', job_id=None, on_progress=None):
+        """同步單一載具並寫入 SyncLog，回傳該載具的結果
+
+        處理過程中的進度會寫入 SyncLog，並呼叫 on_progress()（例如延長工作租約）。
+        """
+        sync_log_id = SyncLog.create(carrier['user_id'], carrier['id'], sync_type, job_id)
+        started = time.monotonic()
+
+        def progress(done, total):
+            SyncLog.update_progress(sync_log_id, done, total)
+            if on_progress:
+                on_progress()
+
+        try:
+            host = self.service.carrier_host(carrier)
+            if host is None:
+                sync_result = self.service.sync_carrier_invoices(carrier, progress=progress)
+            else:
+                with self._host_limit(host):
+                    sync_result = self.service.sync_carrier_invoices(carrier, progress=progress)
+        except Exception as e:
+            sync_result = {'success': False, 'message': f'Sync failed: {str(e)}'}
+
+        SyncLog.update(
+            sync_log_id,
+            'success' if sync_result['success'] else 'failed',
+            sync_result['message'],
+            sync_result.get('invoices_found', 0),
+            sync_result.get('invoices_new', 0),
+            sync_result.get('invoices_updated', 0)
+        )
+
+        return {
+            'carrier_id': carrier['id'],
+            'user_id': carrier['user_id'],
+            'sync_log_id': sync_log_id,
+            'success': sync_result['success'],
+            'message': sync_result['message'],
+            'invoices_found': sync_result.get('invoices_found', 0),
+            'invoices_new': sync_result.get('invoices_new', 0),
+            'invoices_updated': sync_result.get('invoices_updated', 0),
+            'invoices_unchanged': sync_result.get('invoices_unchanged', 0),
+            'parse_failures': sync_result.get('parse_failures', 0),
+            'duration_ms': round((time.monotonic() - started) * 1000, 1)
+        }
+
+    def sync_carriers(self, carriers, sync_type='manual', job_id=None, on_progress=None):
+        """並行同步多個載具，回傳彙總結果（個別載具失敗不影響其他載具）"""
+        started = time.monotonic()
+        results = []
+
+        if carriers:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(carriers)),
+                                    thread_name_prefix='invoice-sync') as executor:
+                results = list(executor.map(
+                    lambda carrier: self.sync_carrier(carrier, sync_type, job_id, on_progress), carriers))
+
+        return {
+            'success': all(result['success'] for result in results),
+            'carriers': len(results),
+            'failed': sum(1 for result in results if not result['success']),
+            'invoices_found': sum(result['invoices_found'] for result in results),
+            'invoices_new': sum(result['invoices_new'] for result in results),
+            'invoices_updated': sum(result['invoices_updated'] for result in results),
+            'invoices_unchanged': sum(result['invoices_unchanged'] for result in results),
+            'duration_ms': round((time.monotonic() - started) * 1000, 1),
+            'results': results
+        }
+
+    def sync_user(self, user_id, sync_type='manual'):
+        """同步使用者的所有有效載具"""
+        return self.sync_carriers(InvoiceCarrier.get_by_user_id(user_id), sync_type)
+
+    def sync_all_users(self, sync_type='scheduled'):
+        """同步所有使用者的有效載具（每晚排程）"""
+        return self.sync_carriers(InvoiceCarrier.get_all_active(), sync_type)
+
+
+def create_sync_runner(service):
+    """依環境變數建立同步執行器"""
+    return InvoiceSyncRunner(
+        service,
+        max_workers=int(os.environ.get('INVOICE_SYNC_WORKERS', 4)),
+        per_host=int(os.environ.get('INVOICE_SYNC_PER_HOST', 2))
+    )
+
+
+if __name__ == '__main__':
+    # 每晚排程：cd src && python -m services.invoice_sync
+    from services.real_invoice_service import real_invoice_service
+
+    result = create_sync_runner(real_invoice_service).sync_all_users()
+    print(f"同步載具 {result['carriers']} 個（失敗 {result['failed']} 個），"
+          f"新增發票 {result['invoices_new']} 張，更新 {result['invoices_updated']} 張，"
+          f"耗時 {result['duration_ms']} ms")
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, jsonify, session
+
+from db import get_db_connection
+
+# 快取「不是成員」的結果時使用的標記，與 None（未命中）區分
+_NOT_MEMBER = object()
+
+
+class MembershipCache:
+    """群組成員角色快取（LRU + TTL）
+
+    以 (user_id, group_id) 為鍵，值為 active 成員的角色；非成員也會被快取。
+    成員異動（加入、離開、移除、刪除群組）時呼叫 invalidate() 清除；
+    TTL 用來限制多進程部署時其他進程快取的過期時間。
+    """
+
+    def __init__(self, max_size=4096, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id, group_id):
+        """讀取快取，未命中或已過期時回傳 None"""
+        key = (int(user_id), int(group_id))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, group_id, value):
+        """寫入快取，超過容量時淘汰最久未使用的項目"""
+        key = (int(user_id), int(group_id))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, group_id, user_ids=None):
+        """清除群組的成員快取；未指定 user_ids 時清除整個群組"""
+        group_id = int(group_id)
+        with self._lock:
+            if user_ids is None:
+                keys = [key for key in self._entries if key[1] == group_id]
+            else:
+                keys = [(int(user_id), group_id) for user_id in user_ids
+                        if (int(user_id), group_id) in self._entries]
+            for key in keys:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """獲取快取命中統計"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0,
+                "invalidations": self.invalidations
+            }
+
+
+# 全域快取實例
+membership_cache = MembershipCache(
+    max_size=int(os.environ.get('MEMBERSHIP_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('MEMBERSHIP_CACHE_TTL', 60))
+)
+
+
+def get_member_role(db, user_id, group_id):
+    """查詢用戶在群組中的角色（僅限 active 成員），非成員回傳 None"""
+    cached = membership_cache.get(user_id, group_id)
+    if cached is not None:
+        return None if cached is _NOT_MEMBER else cached
+
+    row = db.execute('''
+        SELECT role FROM group_members
+        WHERE group_id = ? AND user_id = ? AND status = 'active'
+    ''', (group_id, user_id)).fetchone()
+    role = row[0] if row else None
+    membership_cache.set(user_id, group_id, role if role is not None else _NOT_MEMBER)
+    return role
+
+
+def invalidate_membership(group_id, user_ids=None):
+    """成員異動提交後清除相關的角色快取"""
+    membership_cache.invalidate(group_id, user_ids)
+
+
+def require_group_member(roles=None, message="您不是該群組成員"):
+    """路由裝飾器：確認登入用戶是 URL 中 group_id 的成員，角色存入 g.group_role"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = session.get('user_id')
+            if not user_id:
+                return jsonify({
+                    "success": False,
+                    "message": "請先登入"
+                }), 401
+
+            role = get_member_role(get_db_connection(), user_id, kwargs['group_id'])
+            if role is None or (roles and role not in roles):
+                return jsonify({
+                    "success": False,
+                    "message": message
+                }), 403
+
+            g.group_role = role
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
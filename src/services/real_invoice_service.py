@@ -1,15 +1,22 @@
-import requests
 import sqlite3
 import json
 import hashlib
 import base64
 from datetime import datetime, timedelta, date
+from urllib.parse import urlparse
 from models.invoice import InvoiceCarrier, InvoiceRecord, SyncLog
+from services.http_client import create_http_client
 
 class RealInvoiceService:
     """真實發票 API 服務類別，支援財政部電子發票 API"""
     
-    def __init__(self):
+    # 增量同步時從上次水位往前重疊的天數（補抓上游延遲上傳的發票）
+    SYNC_OVERLAP_DAYS = 2
+    
+    # 可以向上游查詢發票的載具類型，其他類型同步時不查詢，也不推進同步水位
+    QUERYABLE_CARRIER_TYPES = ('mobile_barcode',)
+    
+    def __init__(self, http_client=None):
         # TODO: Replace with your actual APP ID and API Key from the Ministry of Finance
         # 請將以下替換為您從財政部取得的真實 APP ID 和 API Key
         self.app_id = "YOUR_APP_ID"
@@ -20,6 +27,9 @@ class RealInvoiceService:
         
         # 是否使用測試模式（設為 False 使用真實 API）
         self.test_mode = True
+        
+        # 共用 keep-alive 連線池，含重試退避與每個 app_id 的限流
+        self.http = http_client or create_http_client()
     
     def validate_carrier(self, carrier_type, carrier_id, verification_code=None):
         """驗證載具有效性"""
@@ -64,8 +74,7 @@ class RealInvoiceService:
                 'appID': self.app_id
             }
             
-            response = requests.post(url, data=data, timeout=30)
-            response.raise_for_status()
+            response = self.http.post(url, data=data, rate_key=self.app_id)
             
             result = response.json()
             
@@ -93,45 +102,78 @@ class RealInvoiceService:
             'message': 'Member card validation passed (demo mode)'
         }
     
-    def sync_carrier_invoices(self, carrier, days_back=30):
-        """同步載具的發票資料"""
+    def carrier_host(self, carrier):
+        """同步此載具時會呼叫的上游主機（用於並行限制），不需要呼叫 API 時回傳 None"""
+        if self.test_mode or carrier['carrier_type'] != 'mobile_barcode':
+            return None
+        return urlparse(self.base_url).netloc
+    
+    def sync_window(self, carrier, days_back=30, today=None):
+        """同步的查詢範圍 (start_date, end_date)
+
+        載具有同步水位時從水位往前 SYNC_OVERLAP_DAYS 天開始，否則（首次同步）查詢 days_back 天。
+        """
+        end_date = today or date.today()
+        watermark = carrier.get('last_synced_date')
+        if watermark:
+            start_date = datetime.strptime(watermark, '%Y-%m-%d').date() - timedelta(days=self.SYNC_OVERLAP_DAYS)
+            return min(start_date, end_date), end_date
+        return end_date - timedelta(days=days_back), end_date
+    
+    def sync_carrier_invoices(self, carrier, days_back=30, progress=None):
+        """同步載具的發票資料
+
+        只查詢上次成功同步後的範圍（見 sync_window），成功後推進載具的同步水位；
+        有發票解析失敗時不推進水位，下次同步會重新查詢同一範圍。
+        原始資料雜湊與資料庫相同的發票不重新寫入。
+        progress(done, total) 在查詢完成後與寫入完成後呼叫，用於回報進度。
+        """
         try:
             # 計算查詢日期範圍
-            end_date = date.today()
-            start_date = end_date - timedelta(days=days_back)
+            start_date, end_date = self.sync_window(carrier, days_back)
             
             # 查詢發票資料
             if self.test_mode:
-                invoices = self._generate_mock_invoices(start_date, end_date)
+                invoices, parse_failures = self._generate_mock_invoices(start_date, end_date), 0
+            elif carrier['carrier_type'] in self.QUERYABLE_CARRIER_TYPES:
+                invoices, parse_failures = self._query_carrier_invoices(carrier, start_date, end_date)
             else:
-                invoices = self._query_carrier_invoices(carrier, start_date, end_date)
+                return {
+                    'success': True,
+                    'message': f"Carrier type {carrier['carrier_type']} does not support invoice sync",
+                    'invoices_found': 0,
+                    'invoices_new': 0,
+                    'invoices_updated': 0,
+                    'invoices_unchanged': 0
+                }
             
             invoices_found = len(invoices)
-            invoices_new = 0
-            invoices_updated = 0
             
-            for invoice_data in invoices:
-                # 檢查發票是否已存在
-                existing_record_id = InvoiceRecord.exists_by_number(
-                    carrier['user_id'], 
-                    invoice_data['invoice_number']
-                )
-                
-                if existing_record_id:
-                    # 更新現有發票
-                    InvoiceRecord.update(existing_record_id, invoice_data)
-                    invoices_updated += 1
-                else:
-                    # 新增發票紀錄
-                    InvoiceRecord.create(carrier['user_id'], carrier['id'], invoice_data)
-                    invoices_new += 1
+            if progress:
+                progress(0, invoices_found)
+            
+            # 整批 upsert（單一交易），內容沒有變化的發票不寫入
+            counts = InvoiceRecord.upsert_many(carrier['user_id'], carrier['id'], invoices)
+            
+            if progress:
+                progress(invoices_found, invoices_found)
+            
+            if parse_failures:
+                # 解析失敗的發票沒有寫入，水位留在原處，下次同步重新查詢
+                message = (f'Sync completed with {parse_failures} unparsable invoices '
+                           f'({start_date} ~ {end_date}), watermark not advanced')
+            else:
+                InvoiceCarrier.mark_synced(carrier['id'], end_date)
+                message = f'Sync completed successfully ({start_date} ~ {end_date})'
             
             return {
                 'success': True,
-                'message': f'Sync completed successfully',
+                'message': message,
                 'invoices_found': invoices_found,
-                'invoices_new': invoices_new,
-                'invoices_updated': invoices_updated
+                'parse_failures': parse_failures,
+                'invoices_new': counts['new'],
+                'invoices_updated': counts['updated'],
+                'invoices_unchanged': counts['unchanged']
             }
         except Exception as e:
             return {
@@ -140,17 +182,17 @@ class RealInvoiceService:
             }
     
     def _query_carrier_invoices(self, carrier, start_date, end_date):
-        """查詢載具的發票資料（真實 API）"""
+        """查詢載具的發票資料（真實 API），回傳 (發票列表, 解析失敗張數)"""
         try:
             if carrier['carrier_type'] == 'mobile_barcode':
                 return self._query_mobile_barcode_invoices(carrier, start_date, end_date)
             else:
-                return []
+                return [], 0
         except Exception as e:
             raise Exception(f"Failed to query invoices: {str(e)}")
     
     def _query_mobile_barcode_invoices(self, carrier, start_date, end_date):
-        """查詢手機條碼的發票資料（真實 API）"""
+        """查詢手機條碼的發票資料（真實 API），回傳 (發票列表, 解析失敗張數)"""
         try:
             url = f"{self.base_url}/PB2CAPIVAN/invapp/InvApp"
             
@@ -171,20 +213,22 @@ class RealInvoiceService:
                 'appID': self.app_id
             }
             
-            # 發送請求
-            response = requests.post(url, data=data, timeout=30)
-            response.raise_for_status()
+            # 發送請求（暫時性錯誤會自動重試）
+            response = self.http.post(url, data=data, rate_key=self.app_id)
             
             result = response.json()
             
             if result.get('code') == 200:
                 # 解析發票資料
                 invoices = []
+                parse_failures = 0
                 for invoice_data in result.get('details', []):
                     parsed_invoice = self._parse_real_invoice_data(invoice_data)
                     if parsed_invoice:
                         invoices.append(parsed_invoice)
-                return invoices
+                    else:
+                        parse_failures += 1
+                return invoices, parse_failures
             else:
                 raise Exception(f"API Error: {result.get('msg', 'Unknown error')}")
                 
@@ -209,32 +253,30 @@ class RealInvoiceService:
             return None
     
     def _parse_invoice_items(self, items_data):
-        """解析發票明細項目"""
+        """解析發票明細項目（任一項目解析失敗時拋出例外，整張發票視為解析失敗）"""
         items = []
         for item_data in items_data:
-            try:
-                items.append({
-                    'name': item_data.get('description'),
-                    'quantity': float(item_data.get('quantity', 1)),
-                    'price': float(item_data.get('unitPrice', 0)),
-                    'amount': float(item_data.get('amount', 0))
-                })
-            except Exception as e:
-                print(f"Failed to parse item: {str(e)}")
-                continue
+            items.append({
+                'name': item_data.get('description'),
+                'quantity': float(item_data.get('quantity', 1)),
+                'price': float(item_data.get('unitPrice', 0)),
+                'amount': float(item_data.get('amount', 0))
+            })
         return items
     
     def _generate_mock_invoices(self, start_date, end_date):
         """生成模擬發票資料用於測試"""
         mock_invoices = []
         
-        # 生成一些模擬發票
+        # 生成一些模擬發票（日期固定往回排，只回傳查詢範圍內的，與真實 API 一致）
         for i in range(5):
-            invoice_date = start_date + timedelta(days=i * 3)
+            invoice_date = end_date - timedelta(days=i * 3)
+            if invoice_date < start_date:
+                break
             mock_invoices.append({
                 'invoice_number': f'AA{12345678 + i:08d}',
                 'invoice_date': invoice_date.strftime('%Y-%m-%d'),
-                'invoice_time': datetime.now().strftime('%H:%M:%S'),
+                'invoice_time': f'{10 + i:02d}:00:00',
                 'seller_name': f'測試商店 {i+1}',
                 'seller_id': '12345678',
                 'total_amount': 100 + i * 50,
@@ -272,3 +314,7 @@ class RealInvoiceService:
         self.test_mode = False
         print("Test mode disabled. Using real API.")
 
+
+# 全域服務實例：同一行程內的 API、同步 worker 與命令列共用一個 HTTP 用戶端，
+# 每個 app_id 的限流與 api_config 顯示的呼叫統計因此涵蓋整個行程
+real_invoice_service = RealInvoiceService()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from db import get_pool
+from models.recurring import RecurringRule
+
+
+class RecurringScheduler:
+    """週期性交易排程器
+
+    背景執行緒每 interval 秒執行一次 run_once()，把所有到期的規則產生為交易。
+    啟動時的第一次執行即為補跑（catch-up）：停機期間錯過的發生日會一次補齊。
+    產生交易時有唯一索引去重，重啟或多次執行都不會重複寫入。
+    """
+
+    def __init__(self, interval=3600, batch_size=100):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+
+    def run_once(self, today=None):
+        """產生所有到期的發生日，回傳 {"rules": ..., "created": ...}"""
+        conn = get_pool().acquire()
+        try:
+            result = RecurringRule(conn).materialise_due(today, self.batch_size)
+        finally:
+            conn.close()
+        self.last_run = time.time()
+        self.last_result = result
+        return result
+
+    def start(self):
+        """啟動背景執行緒（重複呼叫不會啟動第二個）"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='recurring-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                # 失敗時等下一輪重試，已提交的批次不受影響
+                self.last_error = str(e)
+            self._stop_event.wait(self.interval)
+
+
+if __name__ == '__main__':
+    # 手動補跑：cd src && python -m services.recurring_scheduler [YYYY-MM-DD]
+    import sys
+
+    result = RecurringScheduler().run_once(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"處理規則 {result['rules']} 條，新增交易 {result['created']} 筆")
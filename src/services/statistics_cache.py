@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class StatisticsCache:
+    """統計結果快取（LRU + TTL）
+
+    以 (scope, owner_id, months) 為鍵，scope 為 'user' 或 'group'。
+    交易寫入時呼叫 invalidate() 清除受影響用戶/群組的所有快取；
+    TTL 用來限制多進程部署時其他進程快取的過期時間。
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, scope, owner_id, months):
+        """讀取快取，不存在或已過期時回傳 None"""
+        key = (scope, int(owner_id), months)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, scope, owner_id, months, value):
+        """寫入快取，超過容量時淘汰最久未使用的項目"""
+        key = (scope, int(owner_id), months)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids=(), group_ids=()):
+        """清除指定用戶與群組的所有統計快取"""
+        targets = {('user', int(owner_id)) for owner_id in user_ids if owner_id is not None}
+        targets |= {('group', int(owner_id)) for owner_id in group_ids if owner_id is not None}
+        if not targets:
+            return
+        with self._lock:
+            for key in [key for key in self._entries if key[:2] in targets]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """獲取快取命中統計"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0,
+                "invalidations": self.invalidations
+            }
+
+
+# 全域快取實例
+statistics_cache = StatisticsCache(
+    max_size=int(os.environ.get('STATS_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('STATS_CACHE_TTL', 300))
+)
+
+
+def invalidate_statistics(user_id=None, group_ids=()):
+    """交易寫入後清除相關的統計快取"""
+    statistics_cache.invalidate(user_ids=(user_id,), group_ids=group_ids)
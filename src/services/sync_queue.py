@@ -0,0 +1,284 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from db import execute_write, get_pool
+from models.invoice import InvoiceCarrier, SyncLog
+
+JOB_COLUMNS = ('id', 'user_id', 'carrier_id', 'sync_type', 'status', 'attempts', 'max_attempts',
+               'worker_id', 'result', 'error', 'created_at', 'started_at', 'finished_at')
+
+FINISHED_STATUSES = ('succeeded', 'failed')
+
+
+class SyncJobQueue:
+    """SQLite 持久化的發票同步工作佇列（sync_jobs，見 migration 0011）
+
+    API 只負責 enqueue 並立即回傳 job id，實際同步由 SyncWorker 認領執行。
+    認領時設定租約，執行中透過 heartbeat() 延長；worker 當掉時租約過期，
+    工作會被重新認領，超過 max_attempts 次則標記為 failed。
+    """
+
+    def __init__(self, lease_seconds=300, retry_delay=30):
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        # 同一行程內有新工作時喚醒 worker，不必等到下一次輪詢
+        self.wakeup = threading.Event()
+
+    def enqueue(self, user_id=None, carrier_id=None, sync_type='manual'):
+        """加入同步工作，回傳 (job_id, created)
+
+        已有排隊中或執行中、且涵蓋這次請求的工作時直接回傳該工作，不重複加入：
+        同一個使用者／載具的工作、該使用者的全部載具工作 (carrier_id 為 NULL)，
+        或同步所有使用者的排程工作 (user_id 與 carrier_id 皆為 NULL)，
+        避免同一個載具同時被兩個工作同步。
+        """
+        def insert(conn):
+            existing = conn.execute('''
+                SELECT id FROM sync_jobs
+                WHERE status IN ('queued', 'running')
+                  AND ((user_id IS :user_id AND carrier_id IS :carrier_id)
+                       OR (user_id IS :user_id AND carrier_id IS NULL)
+                       OR (user_id IS NULL AND carrier_id IS NULL))
+                ORDER BY carrier_id IS NULL, user_id IS NULL, id
+                LIMIT 1
+            ''', {"user_id": user_id, "carrier_id": carrier_id}).fetchone()
+            if existing:
+                return existing[0], False
+
+            cursor = conn.execute('''
+                INSERT INTO sync_jobs (user_id, carrier_id, sync_type, available_at)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, carrier_id, sync_type, time.time()))
+            return cursor.lastrowid, True
+
+        job_id, created = execute_write(insert)
+        if created:
+            self.wakeup.set()
+        return job_id, created
+
+    def claim(self, worker_id):
+        """認領一個可執行的工作（排隊中已到時間，或租約已過期），沒有時回傳 None"""
+        def claim_next(conn):
+            now = time.time()
+            # 租約過期且已用完重試次數的工作不再認領
+            conn.execute('''
+                UPDATE sync_jobs
+                SET status = 'failed', error = COALESCE(error, 'Worker lease expired'),
+                    finished_at = CURRENT_TIMESTAMP, lease_expires_at = NULL
+                WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts
+            ''', (now,))
+
+            row = conn.execute('''
+                UPDATE sync_jobs
+                SET status = 'running', attempts = attempts + 1, worker_id = :worker_id,
+                    lease_expires_at = :lease, started_at = CURRENT_TIMESTAMP, error = NULL
+                WHERE id = (
+                    SELECT id FROM sync_jobs
+                    WHERE (status = 'queued' AND available_at <= :now)
+                       OR (status = 'running' AND lease_expires_at < :now)
+                    ORDER BY available_at, id
+                    LIMIT 1
+                )
+                RETURNING id, user_id, carrier_id, sync_type, attempts
+            ''', {"worker_id": worker_id, "lease": now + self.lease_seconds, "now": now}).fetchone()
+            return dict(zip(('id', 'user_id', 'carrier_id', 'sync_type', 'attempts'), row)) if row else None
+
+        return execute_write(claim_next)
+
+    def heartbeat(self, job_id, worker_id):
+        """延長租約，回傳 False 表示工作已被其他 worker 接手"""
+        def extend(conn):
+            return conn.execute('''
+                UPDATE sync_jobs SET lease_expires_at = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+            ''', (time.time() + self.lease_seconds, job_id, worker_id)).rowcount
+
+        return execute_write(extend) > 0
+
+    def complete(self, job_id, worker_id, result):
+        """標記工作完成，result 為同步彙總（以 JSON 儲存）"""
+        status = 'succeeded' if result.get('success') else 'failed'
+
+        def finish(conn):
+            conn.execute('''
+                UPDATE sync_jobs
+                SET status = ?, result = ?, lease_expires_at = NULL, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker_id = ?
+            ''', (status, json.dumps(result, ensure_ascii=False), job_id, worker_id))
+
+        execute_write(finish)
+
+    def fail(self, job_id, worker_id, error, result=None):
+        """工作失敗（例外或有載具同步失敗）：尚有重試次數時延遲後重新排隊，否則標記為 failed
+
+        result 為該次執行的同步彙總，保留下來讓呼叫端看到哪些載具失敗。
+        """
+        payload = json.dumps(result, ensure_ascii=False) if result is not None else None
+
+        def retry_or_fail(conn):
+            conn.execute('''
+                UPDATE sync_jobs
+                SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                    available_at = ? + ? * attempts,
+                    finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END,
+                    lease_expires_at = NULL, error = ?, result = COALESCE(?, result)
+                WHERE id = ? AND worker_id = ?
+            ''', (time.time(), self.retry_delay, error, payload, job_id, worker_id))
+
+        execute_write(retry_or_fail)
+
+    def get(self, job_id):
+        """獲取工作狀態與各載具的同步進度，不存在時回傳 None"""
+        conn = get_pool().acquire()
+        try:
+            row = conn.execute(f'''
+                SELECT {', '.join(JOB_COLUMNS)} FROM sync_jobs WHERE id = ?
+            ''', (job_id,)).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+
+        job = dict(zip(JOB_COLUMNS, row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['carriers'] = SyncLog.get_by_job_id(job_id)
+        job['progress'] = {
+            'done': sum(log['progress_done'] or 0 for log in job['carriers']),
+            'total': sum(log['progress_total'] or 0 for log in job['carriers'])
+        }
+        return job
+
+
+class SyncWorker:
+    """發票同步背景 worker
+
+    threads 個執行緒輪詢佇列，各自認領一個工作交給 InvoiceSyncRunner 執行，
+    同步進度寫入 SyncLog，每次進度更新時一併延長租約。
+    可在 Web 行程內啟動，也可用 python -m services.sync_queue 作為獨立行程執行。
+    """
+
+    def __init__(self, runner, queue, threads=2, poll_interval=5):
+        self.runner = runner
+        self.queue = queue
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.last_error = None
+
+    def _carriers_for(self, job):
+        if job['carrier_id'] is not None:
+            carrier = InvoiceCarrier.get_by_id(job['carrier_id'])
+            return [carrier] if carrier else []
+        if job['user_id'] is not None:
+            return InvoiceCarrier.get_by_user_id(job['user_id'])
+        return InvoiceCarrier.get_all_active()
+
+    def run_job(self, job):
+        """執行一個已認領的工作
+
+        runner 會吞掉個別載具的例外，因此以彙總中的 failed 判斷：有任何載具失敗就
+        交給 fail() 延遲重試。重試時整個工作重跑，已成功的載具依同步水位只查詢重疊的日期範圍。
+        """
+        def on_progress():
+            self.queue.heartbeat(job['id'], self.worker_id)
+
+        try:
+            result = self.runner.sync_carriers(self._carriers_for(job), job['sync_type'],
+                                               job['id'], on_progress)
+        except Exception as e:
+            self.queue.fail(job['id'], self.worker_id, str(e))
+            return
+
+        if result['failed']:
+            errors = '; '.join(f"carrier {item['carrier_id']}: {item['message']}"
+                               for item in result['results'] if not item['success'])
+            self.queue.fail(job['id'], self.worker_id,
+                            f"{result['failed']} of {result['carriers']} carriers failed: {errors}", result)
+        else:
+            self.queue.complete(job['id'], self.worker_id, result)
+
+    def run_once(self):
+        """認領並執行一個工作，沒有工作時回傳 False"""
+        job = self.queue.claim(self.worker_id)
+        if job is None:
+            return False
+        self.run_job(job)
+        return True
+
+    def start(self):
+        """啟動背景執行緒（重複呼叫不會重複啟動）"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop_event.clear()
+            for index in range(self.threads):
+                thread = threading.Thread(target=self._run, name=f'invoice-sync-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self.queue.wakeup.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.run_once():
+                    self.last_error = None
+                    continue
+            except Exception as e:
+                # 認領失敗（例如資料庫暫時鎖定）時等下一輪重試
+                self.last_error = str(e)
+            self.queue.wakeup.wait(self.poll_interval)
+            self.queue.wakeup.clear()
+
+
+def create_sync_queue():
+    """依環境變數建立同步工作佇列"""
+    return SyncJobQueue(
+        lease_seconds=int(os.environ.get('INVOICE_SYNC_LEASE', 300)),
+        retry_delay=int(os.environ.get('INVOICE_SYNC_RETRY_DELAY', 30))
+    )
+
+
+def create_sync_worker(runner, queue):
+    """依環境變數建立同步 worker"""
+    return SyncWorker(
+        runner, queue,
+        threads=int(os.environ.get('INVOICE_SYNC_QUEUE_THREADS', 2)),
+        poll_interval=float(os.environ.get('INVOICE_SYNC_POLL_INTERVAL', 5))
+    )
+
+
+if __name__ == '__main__':
+    # 獨立 worker 行程：cd src && python -m services.sync_queue
+    # 每晚排程加入同步所有使用者的工作：cd src && python -m services.sync_queue enqueue-all
+    import sys
+    from services.invoice_sync import create_sync_runner
+    from services.real_invoice_service import real_invoice_service
+
+    queue = create_sync_queue()
+    if len(sys.argv) > 1 and sys.argv[1] == 'enqueue-all':
+        job_id, created = queue.enqueue(sync_type='scheduled')
+        print(f"同步工作 #{job_id}{'已加入佇列' if created else '已在佇列中'}")
+    else:
+        worker = create_sync_worker(create_sync_runner(real_invoice_service), queue)
+        worker.start()
+        print(f"發票同步 worker {worker.worker_id} 已啟動（{worker.threads} 個執行緒）")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            worker.stop()
@@ -0,0 +1,192 @@
+import csv
+import re
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from db import execute_write, get_db_connection
+from models.money import Money
+
+# 預設欄位對應：系統欄位 -> CSV 標題
+DEFAULT_COLUMN_MAPPING = {
+    'date': 'date',
+    'amount': 'amount',
+    'description': 'description',
+    'category': 'category',
+}
+
+
+class _ExistingRows:
+    """匯入開始前資料庫中已存在的 (日期, 金額, 描述) 筆數
+
+    每個日期只在第一次出現時查詢一次，之後跨批次共用同一份計數，
+    每抵銷一筆匯入資料就減一，已存在的一筆交易最多只能抵銷一筆匯入資料。
+    """
+
+    # 每次 IN (...) 查詢的日期數上限
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, user_id, baseline_id):
+        self.user_id = user_id
+        self.baseline_id = baseline_id
+        self.remaining = Counter()
+        self.loaded_dates = set()
+
+    def load(self, conn, dates):
+        """載入尚未查詢過的日期"""
+        pending = sorted(set(dates) - self.loaded_dates)
+        for start in range(0, len(pending), self.LOOKUP_CHUNK):
+            batch = pending[start:start + self.LOOKUP_CHUNK]
+            self.remaining.update(conn.execute(f'''
+                SELECT date, amount, description FROM transactions
+                WHERE user_id = ? AND date IN ({', '.join('?' * len(batch))}) AND id <= ?
+            ''', [self.user_id] + batch + [self.baseline_id]))
+        self.loaded_dates.update(pending)
+
+    def take(self, key):
+        """key 仍有未抵銷的既有交易時抵銷一筆並回傳 True"""
+        if self.remaining[key] > 0:
+            self.remaining[key] -= 1
+            return True
+        return False
+
+
+class StatementImporter:
+    """銀行/信用卡對帳單 CSV 匯入
+
+    逐列讀取與驗證，每累積 chunk_size 筆有效資料就交給寫入佇列提交一次，
+    整份檔案不會載入記憶體。重複判斷以 (日期, 金額, 描述) 為鍵，
+    與匯入開始前資料庫中已存在的筆數相抵，因此同一份對帳單重複匯入不會產生重複交易，
+    而同一天同金額的多筆消費仍會全部匯入。
+
+    mapping 可用 debit/credit 兩欄取代 amount（金額 = credit - debit）。
+    date_format 為 strptime 格式，或 'roc' 表示民國年（例如 113/05/01）。
+    """
+
+    def __init__(self, mapping=None, date_format='%Y-%m-%d', decimal_separator='.',
+                 thousands_separator=',', negate_amounts=False, default_category='其他',
+                 chunk_size=1000, max_errors=100):
+        self.mapping = dict(DEFAULT_COLUMN_MAPPING, **(mapping or {}))
+        if 'debit' in self.mapping or 'credit' in self.mapping:
+            self.mapping.pop('amount', None)
+        self.date_format = date_format
+        self.decimal_separator = decimal_separator
+        self.thousands_separator = thousands_separator
+        self.negate_amounts = negate_amounts
+        self.default_category = default_category
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    def parse_date(self, value):
+        """將對帳單日期轉為 YYYY-MM-DD"""
+        value = value.strip()
+        if self.date_format == 'roc':
+            parts = re.split(r'[/.-]', value)
+            if len(parts) != 3:
+                raise ValueError(f'無法解析日期: {value}')
+            year, month, day = (int(part) for part in parts)
+            return datetime(year + 1911, month, day).strftime('%Y-%m-%d')
+        return datetime.strptime(value, self.date_format).strftime('%Y-%m-%d')
+
+    def parse_amount(self, value):
+        """解析金額，支援千分位、貨幣符號與括號表示的負數"""
+        text = (value or '').strip()
+        if not text:
+            return Decimal(0)
+
+        negative = text.startswith('(') and text.endswith(')')
+        if self.thousands_separator:
+            text = text.replace(self.thousands_separator, '')
+        if self.decimal_separator != '.':
+            text = text.replace(self.decimal_separator, '.')
+        text = re.sub(r'[^0-9.+-]', '', text)
+
+        try:
+            amount = Decimal(text)
+        except InvalidOperation:
+            raise ValueError(f'無法解析金額: {value}')
+        return -amount if negative else amount
+
+    def normalise_row(self, row):
+        """將一列 CSV 轉為 (date, amount, description, category)，amount 為整數分"""
+        date_value = row.get(self.mapping['date'])
+        if not date_value:
+            raise ValueError('缺少日期')
+        date = self.parse_date(date_value)
+
+        if 'amount' in self.mapping:
+            amount = self.parse_amount(row.get(self.mapping['amount']))
+        else:
+            amount = (self.parse_amount(row.get(self.mapping.get('credit')))
+                      - self.parse_amount(row.get(self.mapping.get('debit'))))
+        if self.negate_amounts:
+            amount = -amount
+        amount = Money.parse(amount).cents
+        if amount == 0:
+            raise ValueError('金額不能為 0')
+
+        description = (row.get(self.mapping['description']) or '').strip()
+        if not description:
+            raise ValueError('缺少描述')
+
+        category = (row.get(self.mapping['category']) or '').strip() or self.default_category
+        return date, amount, description, category
+
+    def import_stream(self, user_id, text_stream):
+        """從文字串流匯入交易，回傳匯入結果統計"""
+        reader = csv.DictReader(text_stream)
+        result = {'rows_read': 0, 'imported': 0, 'duplicates': 0, 'error_count': 0, 'errors': []}
+
+        missing = [column for column in self.mapping.values()
+                   if column not in (reader.fieldnames or []) and column != self.mapping.get('category')]
+        if missing:
+            raise ValueError(f'CSV 缺少欄位: {", ".join(missing)}')
+
+        # 只與匯入開始前的資料比對，避免同一份檔案前面批次寫入的資料被當成重複
+        conn = get_db_connection()
+        baseline_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM transactions').fetchone()[0]
+        conn.close()
+        existing = _ExistingRows(user_id, baseline_id)
+
+        chunk = []
+        for row in reader:
+            result['rows_read'] += 1
+            try:
+                chunk.append(self.normalise_row(row))
+            except ValueError as e:
+                result['error_count'] += 1
+                if len(result['errors']) < self.max_errors:
+                    result['errors'].append({'line': reader.line_num, 'message': str(e)})
+                continue
+
+            if len(chunk) >= self.chunk_size:
+                self._commit_chunk(user_id, chunk, existing, result)
+                chunk = []
+
+        if chunk:
+            self._commit_chunk(user_id, chunk, existing, result)
+        return result
+
+    def _commit_chunk(self, user_id, chunk, existing, result):
+        """去除重複後在單一交易中寫入一批資料（existing 為整份匯入共用的既有交易計數）"""
+        def write(conn):
+            existing.load(conn, [row[0] for row in chunk])
+
+            rows = []
+            duplicates = 0
+            for date, amount, description, category in chunk:
+                if existing.take((date, amount, description)):
+                    duplicates += 1
+                    continue
+                rows.append((user_id, 'income' if amount > 0 else 'expense', amount,
+                             category, description, date))
+
+            conn.executemany('''
+                INSERT INTO transactions (user_id, type, amount, category, description, date, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+            ''', rows)
+            return len(rows), duplicates
+
+        imported, duplicates = execute_write(write)
+        result['imported'] += imported
+        result['duplicates'] += duplicates
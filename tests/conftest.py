@@ -0,0 +1,51 @@
+"""測試共用設定：使用暫存資料庫初始化應用程式
+
+執行方式：在專案根目錄執行 python -m pytest -q
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix='expense-tracker-tests-')
+os.environ['DATABASE_PATH'] = os.path.join(_TMP_DIR, 'test.db')
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+# 發票 API 預設不註冊，測試時啟用；同步工作由測試直接呼叫 worker 執行
+os.environ['INVOICE_API_ENABLED'] = 'true'
+os.environ['INVOICE_SYNC_INLINE_WORKER'] = 'false'
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import main  # noqa: E402
+
+main.init_database()
+
+
+@pytest.fixture
+def app():
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _login(client, username, password):
+    response = client.post('/api/auth/login', json={'username_or_email': username, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    """以預設帳號 admin（id 1）登入的 test client"""
+    return _login(app.test_client(), 'admin', 'admin123')
+
+
+@pytest.fixture
+def demo_client(app):
+    """以預設帳號 demo（id 2）登入的 test client"""
+    return _login(app.test_client(), 'demo', 'demo123')
@@ -0,0 +1,53 @@
+import sqlite3
+
+from db import get_pool
+from db.fts import build_search_query
+
+
+def insert_transaction(conn, description, user_id=2):
+    conn.execute('''
+        INSERT INTO transactions (user_id, type, amount, category, description, date)
+        VALUES (?, 'expense', -5000, '餐飲', ?, '2001-02-03')
+    ''', (user_id, description))
+
+
+def search(client, q):
+    response = client.get('/api/transactions/search', query_string={'q': q})
+    assert response.status_code == 200, response.get_json()
+    return [txn['description'] for txn in response.get_json()['transactions']]
+
+
+def test_raw_connection_can_write_transactions(demo_client):
+    """觸發器只使用純 SQL，未經連接池的 sqlite3 連接也能寫入交易，並能透過搜尋找到"""
+    conn = sqlite3.connect(get_pool().database, timeout=5)
+    try:
+        insert_transaction(conn, '星巴克拿鐵')
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert '星巴克拿鐵' in search(demo_client, '星巴克')
+
+
+def test_search_matches_substrings_of_any_length(demo_client):
+    """trigram 以子字串比對；少於 3 個字元的詞改以 LIKE 在使用者範圍內比對"""
+    conn = sqlite3.connect(get_pool().database, timeout=5)
+    try:
+        insert_transaction(conn, '全聯福利中心 Coffee')
+        insert_transaction(conn, '全家便利商店')
+        insert_transaction(conn, '全聯福利中心 別人的', user_id=1)
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert search(demo_client, '福利') == ['全聯福利中心 Coffee']
+    assert search(demo_client, '利中心') == ['全聯福利中心 Coffee']
+    assert search(demo_client, 'coff 全聯') == ['全聯福利中心 Coffee']
+    assert set(search(demo_client, '全')) >= {'全聯福利中心 Coffee', '全家便利商店'}
+    assert search(demo_client, '100%') == []
+
+
+def test_build_search_query():
+    assert build_search_query('星巴克 拿鐵 _%') == ('"星巴克"', ['%拿鐵%', '%\\_\\%%'])
+    assert build_search_query('say "hi"') == ('"say" AND """hi"""', [])
+    assert build_search_query('  ** ') is None
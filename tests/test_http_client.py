@@ -0,0 +1,137 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import services.http_client as http_client
+from services.http_client import ResilientHttpClient, TokenBucket
+
+
+class StubUpstream:
+    """本機 http.server 上游：依序回傳 statuses 中的狀態碼，用完後一律回傳 200"""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.requests += 1
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                self.send_response(status)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    servers = []
+
+    def start(statuses=()):
+        servers.append(StubUpstream(statuses))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+class RecordingRandom:
+    """記錄退避的抖動範圍，固定取上限的一半"""
+
+    def __init__(self):
+        self.ranges = []
+
+    def uniform(self, low, high):
+        self.ranges.append((low, high))
+        return high / 2
+
+
+def test_retries_5xx_with_jittered_backoff(upstream, monkeypatch):
+    """5xx 以指數退避加隨機抖動重試，成功後回傳回應並記錄重試次數"""
+    server = upstream([503, 500])
+    jitter = RecordingRandom()
+    monkeypatch.setattr(http_client, 'random', jitter)
+    client = ResilientHttpClient(max_retries=3, backoff_base=0.01, rate=0)
+
+    response = client.post(server.url, data={'q': 1})
+
+    assert response.status_code == 200
+    assert server.requests == 3
+    assert jitter.ranges == [(0, 0.01), (0, 0.02)]
+    stats = client.metrics.get_stats()
+    assert (stats['requests'], stats['retries'], stats['failures']) == (1, 2, 0)
+    client.close()
+
+
+def test_gives_up_after_max_retries(upstream, monkeypatch):
+    """重試次數用完仍是 5xx 時拋出 HTTPError"""
+    server = upstream([502] * 5)
+    monkeypatch.setattr(http_client, 'random', RecordingRandom())
+    client = ResilientHttpClient(max_retries=2, backoff_base=0.01, rate=0)
+
+    with pytest.raises(requests.HTTPError):
+        client.post(server.url)
+
+    assert server.requests == 3
+    assert client.metrics.get_stats()['failures'] == 1
+    client.close()
+
+
+def test_does_not_retry_4xx(upstream):
+    """4xx 是請求本身的錯誤，不重試，直接拋出 HTTPError"""
+    server = upstream([400])
+    client = ResilientHttpClient(max_retries=3, backoff_base=0.01, rate=0)
+
+    with pytest.raises(requests.HTTPError):
+        client.post(server.url)
+
+    assert server.requests == 1
+    stats = client.metrics.get_stats()
+    assert (stats['retries'], stats['failures']) == (0, 1)
+    client.close()
+
+
+def test_token_bucket_throttles_after_burst(upstream):
+    """同一個 rate_key 超過突發額度後依速率等待，不同 rate_key 各自計算"""
+    server = upstream()
+    client = ResilientHttpClient(rate=20, burst=2)
+
+    started = time.monotonic()
+    for _ in range(5):
+        client.post(server.url, rate_key='app-a')
+    elapsed = time.monotonic() - started
+
+    # 前 2 個請求用掉突發額度，其餘 3 個各等 1/20 秒
+    # 請求本身的耗時也會補充令牌，因此只檢查總耗時的下限
+    assert elapsed >= 0.14
+    assert client.metrics.get_stats()['throttled_seconds'] > 0
+
+    throttled = client.metrics.throttled_seconds
+    client.post(server.url, rate_key='app-b')
+    assert client.metrics.throttled_seconds == throttled
+    assert server.requests == 6
+    client.close()
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=50, capacity=1)
+    assert bucket.acquire() == 0
+    waited = bucket.acquire()
+    assert 0 < waited <= 0.05
@@ -0,0 +1,79 @@
+from models.invoice import InvoiceCarrier
+from routes.invoice import sync_worker
+
+
+def run_queued_jobs():
+    while sync_worker.run_once():
+        pass
+
+
+def test_sync_job_status_and_events(demo_client, admin_client):
+    """同步請求回傳 202 與 job id，工作完成後可查詢狀態並收到 SSE 事件"""
+    carrier_id = InvoiceCarrier.create(2, 'mobile_barcode', '/ROUTE01')
+
+    response = demo_client.post(f'/api/invoice/sync/{carrier_id}')
+    assert response.status_code == 202, response.get_json()
+    data = response.get_json()['data']
+    job_id = data['job_id']
+    assert data['status_url'] == f'/api/invoice/jobs/{job_id}'
+
+    job = demo_client.get(data['status_url']).get_json()['data']
+    assert job['status'] == 'queued'
+
+    # 重複請求回傳同一個工作
+    response = demo_client.post(f'/api/invoice/sync/{carrier_id}')
+    assert response.get_json()['data']['job_id'] == job_id
+
+    # 其他使用者看不到這個工作
+    assert admin_client.get(data['status_url']).status_code == 404
+    assert admin_client.get(f'{data["status_url"]}/events').status_code == 404
+
+    run_queued_jobs()
+
+    job = demo_client.get(data['status_url']).get_json()['data']
+    assert job['status'] == 'succeeded', job
+    assert [log['carrier_id'] for log in job['carriers']] == [carrier_id]
+
+    response = demo_client.get(f'{data["status_url"]}/events')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.get_data(as_text=True).startswith('event: succeeded\ndata: ')
+
+
+def test_sync_all_requires_login(client, demo_client):
+    """未登入不能加入同步工作；登入後同步全部載具"""
+    assert client.post('/api/invoice/sync').status_code == 401
+
+    response = demo_client.post('/api/invoice/sync')
+    assert response.status_code == 202, response.get_json()
+
+    run_queued_jobs()
+
+    job = demo_client.get(response.get_json()['data']['status_url']).get_json()['data']
+    assert job['status'] == 'succeeded', job
+
+
+def test_api_status_reports_the_shared_http_client(demo_client):
+    """API 與同步 worker 共用同一個發票服務，/api/config/status 的呼叫統計來自同一個用戶端"""
+    from routes.invoice import sync_runner
+    from services.real_invoice_service import real_invoice_service
+
+    assert sync_runner.service is real_invoice_service
+    real_invoice_service.http.metrics.record(0.01, 1, False, 0)
+
+    response = demo_client.get('/api/config/status')
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['data']['http'] == real_invoice_service.http.metrics.get_stats()
+
+
+def test_invoice_reads_keep_request_connection_row_factory(app):
+    """發票模型以 Row 讀取時不改動請求共用連接的 row_factory"""
+    from db import get_db_connection
+
+    InvoiceCarrier.create(2, 'mobile_barcode', '/ROUTE02')
+    with app.test_request_context():
+        conn = get_db_connection()
+        carriers = InvoiceCarrier.get_by_user_id(2)
+        assert '/ROUTE02' in [carrier['carrier_id'] for carrier in carriers]
+        assert conn.row_factory is None
+        assert type(conn.execute('SELECT 1').fetchone()) is tuple
@@ -0,0 +1,84 @@
+import itertools
+from datetime import date, timedelta
+
+from models.invoice import InvoiceCarrier
+from services.real_invoice_service import RealInvoiceService
+
+
+class StubResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class StubHttpClient:
+    """取代 ResilientHttpClient，回傳固定的上游回應"""
+
+    def __init__(self, details):
+        self.details = details
+        self.calls = 0
+
+    def post(self, url, data=None, rate_key=None):
+        self.calls += 1
+        return StubResponse({'code': 200, 'details': self.details})
+
+
+def invoice_payload(number, amount='100'):
+    return {'invNum': number, 'invDate': date.today().isoformat(), 'amount': amount, 'details': []}
+
+
+def make_service(details):
+    service = RealInvoiceService(http_client=StubHttpClient(details))
+    service.test_mode = False
+    return service
+
+
+_carrier_codes = itertools.count(1)
+
+
+def make_carrier(carrier_type='mobile_barcode', watermark=None):
+    carrier_id = InvoiceCarrier.create(1, carrier_type, f'/WM{next(_carrier_codes):05d}')
+    if watermark:
+        InvoiceCarrier.mark_synced(carrier_id, watermark)
+    return InvoiceCarrier.get_by_id(carrier_id)
+
+
+def test_parse_failure_keeps_watermark():
+    """有發票解析失敗時不推進同步水位，修正後的下一次同步才推進"""
+    watermark = date.today() - timedelta(days=7)
+    carrier = make_carrier(watermark=watermark)
+
+    service = make_service([invoice_payload('WM00000001'), invoice_payload('WM00000002', amount='N/A')])
+    result = service.sync_carrier_invoices(carrier)
+
+    assert result['success']
+    assert result['parse_failures'] == 1
+    assert result['invoices_new'] == 1
+    assert InvoiceCarrier.get_by_id(carrier['id'])['last_synced_date'] == watermark.isoformat()
+
+    # 水位沒動，下一次仍查詢同一範圍，補上先前解析失敗的發票
+    assert service.sync_window(InvoiceCarrier.get_by_id(carrier['id']))[0] == \
+        watermark - timedelta(days=RealInvoiceService.SYNC_OVERLAP_DAYS)
+
+    service = make_service([invoice_payload('WM00000001'), invoice_payload('WM00000002')])
+    result = service.sync_carrier_invoices(InvoiceCarrier.get_by_id(carrier['id']))
+
+    assert result['parse_failures'] == 0
+    assert result['invoices_new'] == 1
+    assert result['invoices_unchanged'] == 1
+    assert InvoiceCarrier.get_by_id(carrier['id'])['last_synced_date'] == date.today().isoformat()
+
+
+def test_unqueryable_carrier_keeps_watermark():
+    """不支援查詢的載具類型不呼叫上游，也不推進同步水位"""
+    carrier = make_carrier(carrier_type='member_card')
+    service = make_service([invoice_payload('WM00000003')])
+
+    result = service.sync_carrier_invoices(carrier)
+
+    assert result['success']
+    assert result['invoices_found'] == 0
+    assert service.http.calls == 0
+    assert InvoiceCarrier.get_by_id(carrier['id'])['last_synced_date'] is None
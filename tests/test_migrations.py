@@ -0,0 +1,39 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from db.fts import connect
+from db.migrations import MigrationError, discover_migrations, get_current_version, migrate
+
+# 專案附帶的早期資料庫：transactions 沒有 group_id，金額仍為 REAL
+BUNDLED_DATABASE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database.db')
+
+
+def test_bundled_database_migrates_to_latest(tmp_path):
+    """專案附帶的 database.db 可以直接升級到最新版本"""
+    path = tmp_path / 'bundled.db'
+    shutil.copy(BUNDLED_DATABASE, path)
+
+    conn = connect(str(path))
+    try:
+        migrate(conn)
+        assert get_current_version(conn) == discover_migrations()[-1][0]
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(transactions)')}
+        assert 'group_id' in columns
+    finally:
+        conn.close()
+
+
+def test_failed_migration_names_the_migration(tmp_path):
+    """遷移失敗時拋出 MigrationError，訊息包含失敗的遷移檔，且該遷移已回滾"""
+    conn = sqlite3.connect(str(tmp_path / 'empty.db'))
+    try:
+        # 沒有任何資料表，第一個遷移建立索引時就會失敗
+        with pytest.raises(MigrationError, match='0001_hot_path_indexes') as excinfo:
+            migrate(conn)
+        assert isinstance(excinfo.value.__cause__, sqlite3.OperationalError)
+        assert get_current_version(conn) == 0
+    finally:
+        conn.close()
@@ -0,0 +1,53 @@
+import pytest
+
+from models.money import Money
+
+
+@pytest.mark.parametrize('value', ['abc', '', None, True, 'NaN', 'inf', '1e30', '1e17', 2 ** 62, 1e300])
+def test_parse_rejects_invalid_or_out_of_range(value):
+    """格式錯誤或超出 64 位元整數分範圍的金額一律拋出 ValueError"""
+    with pytest.raises(ValueError):
+        Money.parse(value)
+
+
+def test_parse_accepts_bounds():
+    assert Money.parse('92233720368547758.07').cents == Money.MAX_CENTS
+    assert Money.parse('-92233720368547758.07').cents == -Money.MAX_CENTS
+    assert Money.parse('0.005').cents == 1
+    assert Money.parse(12.34).cents == 1234
+
+
+@pytest.mark.parametrize('amount', ['1e30', '1e17'])
+def test_out_of_range_amount_returns_400(demo_client, amount):
+    """新增、更新交易與建立預算、週期規則時，超出範圍的金額回傳 400 而不是 500"""
+    response = demo_client.post('/api/transactions', json={
+        'type': 'expense', 'amount': amount, 'category': '餐飲', 'description': '超大', 'date': '2001-05-01'
+    })
+    assert response.status_code == 400, response.get_json()
+
+    response = demo_client.post('/api/transactions', json={
+        'type': 'expense', 'amount': -10, 'category': '餐飲', 'description': '正常', 'date': '2001-05-01'
+    })
+    transaction_id = response.get_json()['transaction_id']
+    response = demo_client.put(f'/api/transactions/{transaction_id}', json={'amount': amount})
+    assert response.status_code == 400, response.get_json()
+
+    response = demo_client.post('/api/budgets', json={'amount': amount, 'period': 'monthly'})
+    assert response.status_code == 400, response.get_json()
+
+    response = demo_client.post('/api/recurring-rules', json={
+        'amount': amount, 'category': '餐飲', 'description': '超大', 'frequency': 'monthly'
+    })
+    assert response.status_code == 400, response.get_json()
+
+
+def test_import_reports_out_of_range_amount_as_row_error():
+    """對帳單中超出範圍的金額記為該列錯誤，其他列照常匯入"""
+    import io
+    from services.transaction_import import StatementImporter
+
+    csv_text = 'date,amount,description\n2001-06-01,100000000000000000,超大\n2001-06-01,-10,正常\n'
+    result = StatementImporter().import_stream(2, io.StringIO(csv_text))
+
+    assert result['error_count'] == 1
+    assert result['imported'] == 1
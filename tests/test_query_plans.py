@@ -0,0 +1,43 @@
+import shutil
+
+from db import get_pool
+from db.fts import connect
+from db.migrations import migrate
+from db.query_plans import HOT_QUERIES, find_scans
+from test_migrations import BUNDLED_DATABASE
+
+
+def test_hot_queries_use_indexes():
+    """遷移後的測試資料庫中，所有熱門查詢都走索引，沒有退化成全表掃描"""
+    conn = get_pool().acquire()
+    try:
+        migrate(conn)
+        assert find_scans(conn) == {}
+    finally:
+        conn.close()
+
+
+def test_hot_queries_use_indexes_on_upgraded_database(tmp_path):
+    """由專案附帶的 database.db 升級後，熱門查詢同樣都走索引"""
+    path = tmp_path / 'bundled.db'
+    shutil.copy(BUNDLED_DATABASE, path)
+
+    conn = connect(str(path))
+    try:
+        migrate(conn)
+        assert find_scans(conn) == {}
+    finally:
+        conn.close()
+
+
+def test_find_scans_reports_full_table_scans():
+    """沒有索引可用的查詢會被回報"""
+    conn = get_pool().acquire()
+    try:
+        regressions = find_scans(conn, {
+            'transactions.by_description': ('SELECT id FROM transactions WHERE description = ?', ('x',)),
+            'transactions.count_by_user': HOT_QUERIES['transactions.count_by_user'],
+        })
+    finally:
+        conn.close()
+    assert list(regressions) == ['transactions.by_description']
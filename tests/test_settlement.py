@@ -0,0 +1,121 @@
+from datetime import datetime
+
+from db import execute_write
+
+
+def create_group_with_members(admin_client, app, name):
+    """admin 建立群組，demo 與新註冊的 carol 直接加入為一般成員，回傳 (group_id, carol_id)"""
+    response = admin_client.post('/api/groups', json={'name': name})
+    assert response.status_code == 201, response.get_json()
+    group_id = response.get_json()['group']['id']
+
+    username = f'carol_{group_id}'
+    response = app.test_client().post('/api/auth/register', json={
+        'username': username, 'email': f'{username}@example.com',
+        'full_name': 'Carol', 'password': 'carol123'
+    })
+    assert response.status_code in (200, 201), response.get_json()
+
+    def add_members(conn):
+        carol_id = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()[0]
+        for member_id in (2, carol_id):
+            conn.execute('''
+                INSERT INTO group_members (group_id, user_id, role, status, joined_at)
+                VALUES (?, ?, 'member', 'active', ?)
+            ''', (group_id, member_id, datetime.now()))
+        return carol_id
+
+    return group_id, execute_write(add_members)
+
+
+def test_member_cannot_record_payment_for_others(app, admin_client, demo_client):
+    """一般成員不能記錄其他兩位成員之間的還款"""
+    group_id, carol_id = create_group_with_members(admin_client, app, 'settle-forbidden')
+
+    response = demo_client.post(f'/api/groups/{group_id}/settlement/payments',
+                                json={'from_user_id': carol_id, 'to_user_id': 1, 'amount': 50})
+
+    assert response.status_code == 403
+    # 沒有寫入任何分帳明細，群組餘額仍為空
+    settlement = admin_client.get(f'/api/groups/{group_id}/settlement').get_json()
+    assert settlement['success']
+    assert settlement['balances'] == []
+
+
+def test_member_records_own_payment_and_admin_records_for_others(app, admin_client, demo_client):
+    """付款人本人可以記錄；群組管理員可以代其他成員記錄"""
+    group_id, carol_id = create_group_with_members(admin_client, app, 'settle-allowed')
+
+    response = demo_client.post(f'/api/groups/{group_id}/settlement/payments',
+                                json={'to_user_id': 1, 'amount': 50})
+    assert response.status_code == 201, response.get_json()
+
+    response = admin_client.post(f'/api/groups/{group_id}/settlement/payments',
+                                 json={'from_user_id': carol_id, 'to_user_id': 2, 'amount': 20})
+    assert response.status_code == 201, response.get_json()
+
+
+def test_record_payment_checks_recorder_role(app):
+    """模型層同樣檢查記錄者：非管理員不能代付款人記錄"""
+    from db import get_pool
+    from models.settlement import Settlement
+
+    with app.test_client() as client:
+        client.post('/api/auth/login', json={'username_or_email': 'admin', 'password': 'admin123'})
+        group_id, carol_id = create_group_with_members(client, app, 'settle-model')
+
+    conn = get_pool().acquire()
+    try:
+        result = Settlement(conn).record_payment(group_id, carol_id, 1, 10, recorded_by=2)
+        assert not result['success']
+
+        result = Settlement(conn).record_payment(group_id, carol_id, 1, 10, recorded_by=1)
+        assert result['success'], result
+    finally:
+        conn.close()
+
+
+def net_balances(client, group_id):
+    settlement = client.get(f'/api/groups/{group_id}/settlement').get_json()
+    return {balance['user_id']: balance['net'] for balance in settlement['balances']}
+
+
+def test_expense_turned_income_and_back_is_split_again(app, admin_client):
+    """群組支出改為收入再改回支出時，重新平均分攤"""
+    group_id, carol_id = create_group_with_members(admin_client, app, 'settle-resplit')
+
+    response = admin_client.post('/api/transactions', json={
+        'type': 'expense', 'amount': -300, 'category': '餐飲', 'description': '聚餐',
+        'date': '2001-07-01', 'group_id': group_id
+    })
+    assert response.status_code == 201, response.get_json()
+    transaction_id = response.get_json()['transaction_id']
+    assert net_balances(admin_client, group_id) == {1: 200, 2: -100, carol_id: -100}
+
+    assert admin_client.put(f'/api/transactions/{transaction_id}', json={'amount': 50}).status_code == 200
+    assert set(net_balances(admin_client, group_id).values()) == {0}
+
+    assert admin_client.put(f'/api/transactions/{transaction_id}', json={'amount': -50}).status_code == 200
+    assert net_balances(admin_client, group_id) == {1: 33.33, 2: -16.67, carol_id: -16.66}
+    assert admin_client.get(f'/api/groups/{group_id}/settlement').get_json()['transfers']
+
+
+def test_transaction_moved_into_group_is_split(app, admin_client):
+    """以 group_id 把個人支出移入群組時產生平均分攤"""
+    from db import get_db_connection
+    from models.transaction import Transaction
+
+    group_id, carol_id = create_group_with_members(admin_client, app, 'settle-move')
+    response = admin_client.post('/api/transactions', json={
+        'type': 'expense', 'amount': -90, 'category': '交通', 'description': '計程車', 'date': '2001-07-02'
+    })
+    transaction_id = response.get_json()['transaction_id']
+
+    conn = get_db_connection()
+    try:
+        result = Transaction(conn).update_transaction(transaction_id, group_id=group_id)
+        assert result['success'], result
+    finally:
+        conn.close()
+
+    assert net_balances(admin_client, group_id) == {1: 60, 2: -30, carol_id: -30}
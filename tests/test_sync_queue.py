@@ -0,0 +1,100 @@
+from db import execute_write
+from models.invoice import InvoiceCarrier
+from services.invoice_sync import InvoiceSyncRunner
+from services.sync_queue import SyncJobQueue, SyncWorker
+
+
+class FlakyService:
+    """前 failures 次同步拋出例外，之後成功"""
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def carrier_host(self, carrier):
+        return None
+
+    def sync_carrier_invoices(self, carrier, progress=None):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('upstream unavailable')
+        return {'success': True, 'message': 'ok'}
+
+
+def make_worker(service):
+    queue = SyncJobQueue(retry_delay=0)
+    return queue, SyncWorker(InvoiceSyncRunner(service), queue)
+
+
+def test_failed_carrier_requeues_job_until_it_succeeds():
+    """有載具同步失敗時工作重新排隊並保留失敗原因，重試成功後才標記為 succeeded"""
+    carrier_id = InvoiceCarrier.create(1, 'mobile_barcode', '/QUEUE01')
+    queue, worker = make_worker(FlakyService(failures=1))
+    job_id, _ = queue.enqueue(user_id=1, carrier_id=carrier_id)
+
+    assert worker.run_once()
+    job = queue.get(job_id)
+    assert job['status'] == 'queued'
+    assert job['attempts'] == 1
+    assert 'upstream unavailable' in job['error']
+    assert job['result']['failed'] == 1
+
+    assert worker.run_once()
+    job = queue.get(job_id)
+    assert job['status'] == 'succeeded'
+    assert job['attempts'] == 2
+    assert job['error'] is None
+
+
+def test_job_fails_after_max_attempts():
+    """每次都有載具失敗時，用完重試次數後標記為 failed"""
+    carrier_id = InvoiceCarrier.create(1, 'mobile_barcode', '/QUEUE02')
+    queue, worker = make_worker(FlakyService(failures=10))
+    job_id, _ = queue.enqueue(user_id=1, carrier_id=carrier_id)
+
+    while worker.run_once():
+        pass
+
+    job = queue.get(job_id)
+    assert job['status'] == 'failed'
+    assert job['attempts'] == job['max_attempts']
+    assert job['finished_at'] is not None
+
+
+def finish_jobs(*job_ids):
+    """測試結束時把工作標記為完成，避免被其他測試的 worker 認領"""
+    execute_write(lambda conn: conn.executemany(
+        "UPDATE sync_jobs SET status = 'succeeded' WHERE id = ?", [(job_id,) for job_id in job_ids]))
+
+
+def test_all_carriers_job_covers_single_carrier_request():
+    """使用者已有全部載具的同步工作時，單一載具的請求回傳同一個工作"""
+    carrier_id = InvoiceCarrier.create(1, 'mobile_barcode', '/QUEUE03')
+    queue = SyncJobQueue(retry_delay=0)
+    job_id, created = queue.enqueue(user_id=1)
+    other_id, other_created = queue.enqueue(user_id=2, carrier_id=carrier_id)
+    try:
+        assert created
+        assert queue.enqueue(user_id=1, carrier_id=carrier_id) == (job_id, False)
+        # 其他使用者的請求不受影響
+        assert other_created and other_id != job_id
+    finally:
+        finish_jobs(job_id, other_id)
+
+
+def test_inline_worker_starts_when_blueprint_is_registered(monkeypatch):
+    """INLINE_WORKER 為 true 時，註冊 blueprint 即啟動 worker，不必等第一次同步請求"""
+    from flask import Flask
+    import routes.invoice as invoice_routes
+
+    class RecordingWorker:
+        started = False
+
+        def start(self):
+            self.started = True
+
+    for inline in (False, True):
+        worker = RecordingWorker()
+        monkeypatch.setattr(invoice_routes, 'INLINE_WORKER', inline)
+        monkeypatch.setattr(invoice_routes, 'sync_worker', worker)
+        Flask(__name__).register_blueprint(invoice_routes.invoice_bp, url_prefix='/api/invoice')
+        assert worker.started is inline
@@ -0,0 +1,39 @@
+import io
+
+from db import execute_write, get_db_connection
+from services.transaction_import import StatementImporter
+
+
+def count_transactions(user_id, date, description):
+    conn = get_db_connection()
+    try:
+        return conn.execute('''
+            SELECT COUNT(*) FROM transactions WHERE user_id = ? AND date = ? AND description = ?
+        ''', (user_id, date, description)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_existing_row_offsets_only_one_row_across_chunks():
+    """既有的一筆交易只抵銷一筆匯入資料，即使相同的資料分散在多個批次"""
+    execute_write(lambda conn: conn.execute('''
+        INSERT INTO transactions (user_id, type, amount, category, description, date)
+        VALUES (2, 'expense', -12000, '餐飲', '午餐', '2001-01-05')
+    '''))
+
+    csv_text = 'date,amount,description\n' + '2001-01-05,-120,午餐\n' * 5
+    importer = StatementImporter(chunk_size=2)
+
+    result = importer.import_stream(2, io.StringIO(csv_text))
+
+    assert result['rows_read'] == 5
+    assert result['duplicates'] == 1
+    assert result['imported'] == 4
+    assert count_transactions(2, '2001-01-05', '午餐') == 5
+
+    # 同一份對帳單再匯入一次，五筆全部視為重複
+    result = importer.import_stream(2, io.StringIO(csv_text))
+
+    assert result['duplicates'] == 5
+    assert result['imported'] == 0
+    assert count_transactions(2, '2001-01-05', '午餐') == 5
@@ -0,0 +1,59 @@
+def create_expenses(client, count):
+    for index in range(count):
+        response = client.post('/api/transactions', json={
+            'type': 'expense', 'amount': 10 + index, 'category': '餐飲',
+            'description': f'分頁 {index}', 'date': '2001-03-01'
+        })
+        assert response.status_code == 201, response.get_json()
+
+
+def test_per_page_is_clamped(demo_client):
+    """per_page 小於 1 時視為 1；只有 cursor 模式限制上限為 100"""
+    create_expenses(demo_client, 2)
+
+    response = demo_client.get('/api/transactions?cursor=&per_page=0')
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()
+    assert len(data['transactions']) == 1
+    assert data['has_more']
+
+    response = demo_client.get('/api/transactions?cursor=&per_page=-5')
+    assert response.status_code == 200
+    assert len(response.get_json()['transactions']) == 1
+
+    create_expenses(demo_client, 101)
+    data = demo_client.get('/api/transactions?cursor=&per_page=100000').get_json()
+    assert len(data['transactions']) == 100
+    assert data['has_more']
+
+    # page/per_page 模式維持原本的行為，不設上限
+    data = demo_client.get('/api/transactions?per_page=100000').get_json()
+    assert data['pages'] == 1
+    assert len(data['transactions']) == data['total'] > 100
+
+
+def test_invalid_pagination_returns_400(demo_client):
+    """page/per_page 不是整數、page 小於 1 或游標無效時回傳 400"""
+    for query in ('per_page=abc', 'page=abc', 'page=0', 'cursor=&per_page=1.5', 'cursor=not-a-cursor'):
+        response = demo_client.get(f'/api/transactions?{query}')
+        assert response.status_code == 400, query
+        assert not response.get_json()['success']
+
+
+def test_update_with_malformed_amount_returns_400(demo_client):
+    """更新交易時金額格式錯誤回傳 400，原交易不變"""
+    response = demo_client.post('/api/transactions', json={
+        'type': 'expense', 'amount': -80, 'category': '餐飲', 'description': '更新金額', 'date': '2001-04-01'
+    })
+    transaction_id = response.get_json()['transaction_id']
+
+    for amount in ('abc', None, 'NaN'):
+        response = demo_client.put(f'/api/transactions/{transaction_id}', json={'amount': amount})
+        assert response.status_code == 400, amount
+        assert not response.get_json()['success']
+
+    response = demo_client.put(f'/api/transactions/{transaction_id}', json={'amount': -95.5})
+    assert response.status_code == 200, response.get_json()
+
+    transactions = demo_client.get('/api/transactions?per_page=100').get_json()['transactions']
+    assert [txn['amount'] for txn in transactions if txn['id'] == transaction_id] == [-95.5]
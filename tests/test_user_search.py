@@ -0,0 +1,48 @@
+from db import get_db_connection
+from models.user import User
+
+
+def create_users(*users):
+    conn = get_db_connection()
+    try:
+        model = User(conn)
+        for username, full_name in users:
+            model.create_user(username, f'{username}@example.com', full_name, 'secret123')
+    finally:
+        conn.close()
+
+
+def search(query):
+    conn = get_db_connection()
+    try:
+        return [user['full_name'] for user in User(conn).search_users_by_name(query)]
+    finally:
+        conn.close()
+
+
+def test_search_matches_full_name_only():
+    """只比對姓名，帳號相符不算"""
+    create_users(('wangxm', '王曉明'), ('lin_ming', '林小明'), ('jolin', 'Jolin Tsai'))
+
+    assert search('曉明') == []           # 少於 3 個字元時比對姓名開頭
+    assert search('王曉') == ['王曉明']
+    assert search('王曉明') == ['王曉明']
+    assert search('jo') == ['Jolin Tsai']  # 不分大小寫
+    assert search('olin tsai') == ['Jolin Tsai']
+    assert search('wangxm') == []
+    assert search('_') == []
+
+
+def test_resolve_short_names_by_exact_or_prefix_match():
+    """兩個字的姓名：完全相符優先，其次為姓名以其開頭的最早註冊用戶"""
+    create_users(('zhou1', '周杰倫'), ('zhou2', '周杰'), ('chen1', '陳奕迅'))
+
+    conn = get_db_connection()
+    try:
+        resolved = User(conn).resolve_users_by_names(['周杰', '陳奕', '奕迅'])
+    finally:
+        conn.close()
+
+    assert resolved['周杰']['username'] == 'zhou2'
+    assert resolved['陳奕']['username'] == 'chen1'
+    assert '奕迅' not in resolved
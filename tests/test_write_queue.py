@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db import ConnectionPool, WriteQueue, execute_write, get_db_connection, get_write_queue
+from models.transaction import Transaction
+
+
+@pytest.fixture
+def write_queue(tmp_path):
+    """獨立資料庫上的寫入佇列，外鍵延遲到 COMMIT 才檢查"""
+    pool = ConnectionPool(str(tmp_path / 'writer.db'), pragmas={'journal_mode': 'WAL', 'foreign_keys': 'ON'})
+    conn = pool.acquire()
+    conn.executescript('''
+        CREATE TABLE items (name TEXT NOT NULL);
+        CREATE TABLE parents (id INTEGER PRIMARY KEY);
+        CREATE TABLE children (
+            parent_id INTEGER REFERENCES parents (id) DEFERRABLE INITIALLY DEFERRED
+        );
+    ''')
+    conn.close()
+
+    writer = WriteQueue(pool)
+    yield pool, writer
+    writer.stop(5)
+    pool.close_all()
+
+
+def submit_batch(writer, fns):
+    """先以一個阻塞的工作卡住寫入者，讓 fns 累積在佇列中、由同一個交易提交"""
+    started, release = threading.Event(), threading.Event()
+    blocker = writer.submit(lambda conn: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    futures = [writer.submit(fn) for fn in fns]
+    release.set()
+    blocker.result(5)
+    for future in futures:
+        future.exception(5)
+    return futures
+
+
+def insert(name):
+    return lambda conn: conn.execute('INSERT INTO items (name) VALUES (?)', (name,)).lastrowid
+
+
+def insert_then_fail(conn):
+    insert('rolled back')(conn)
+    raise ValueError('job failed')
+
+
+def item_names(pool):
+    conn = pool.acquire()
+    try:
+        return [row[0] for row in conn.execute('SELECT name FROM items ORDER BY rowid')]
+    finally:
+        conn.close()
+
+
+def test_failed_job_rolls_back_to_its_savepoint(write_queue):
+    """單筆工作失敗只回滾到它的 SAVEPOINT，同批其他工作照常提交"""
+    pool, writer = write_queue
+    commits = writer.stats['commits']
+    first, failed, last = submit_batch(writer, [insert('first'), insert_then_fail, insert('last')])
+
+    # 阻塞工作自己一次提交，三筆工作在下一次一起提交
+    assert writer.stats['commits'] - commits == 2
+
+    assert first.result() and last.result()
+    with pytest.raises(ValueError, match='job failed'):
+        failed.result()
+    assert item_names(pool) == ['first', 'last']
+
+
+def test_commit_failure_reaches_every_job_in_the_batch(write_queue):
+    """COMMIT 失敗時整批回滾，同批每個呼叫端都收到例外"""
+    pool, writer = write_queue
+    orphan = lambda conn: conn.execute('INSERT INTO children (parent_id) VALUES (999)')
+    futures = submit_batch(writer, [insert('first'), orphan, insert('last')])
+
+    for future in futures:
+        with pytest.raises(sqlite3.IntegrityError, match='FOREIGN KEY'):
+            future.result()
+    assert item_names(pool) == []
+
+    # 失敗後寫入者仍可繼續處理下一批
+    assert writer.execute(insert('after'), 5)
+    assert item_names(pool) == ['after']
+
+
+def test_request_connection_reads_its_own_write(app):
+    """經由 execute_write 寫入後，請求的連接馬上讀得到該筆交易"""
+    assert get_write_queue() is not None
+
+    with app.test_request_context():
+        conn = get_db_connection()
+        model = Transaction(conn)
+        # 寫入前先在同一個連接上讀取
+        assert model.get_transaction_by_id(-1) is None
+
+        transaction_id = execute_write(lambda write_conn: write_conn.execute('''
+            INSERT INTO transactions (user_id, type, amount, category, description, date)
+            VALUES (2, 'expense', -1200, '餐飲', '寫入後讀取', '2001-03-04')
+        ''').lastrowid)
+
+        transaction = model.get_transaction_by_id(transaction_id)
+        assert transaction is not None
+        assert transaction['描述'] == '寫入後讀取'